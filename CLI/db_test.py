@@ -1,23 +1,31 @@
 from colorama.ansi import clear_screen
-import mysql.connector
 from mysql.connector import Error
 from getpass import getpass
 import hashlib
 import bcrypt
 import os 
+import sys
+import csv
+import json
+import argparse
+from itertools import islice
 import colorama
+from pathlib import Path
 from colorama import Fore, Style
 from ascii import login_ascii, principale_ascii, register_ascii
 
+# Les modules partagés avec l'interface graphique se trouvent dans GUI/
+sys.path.append(str(Path(__file__).resolve().parent.parent / "GUI"))
+from data_access import UserRepository, connecter
+from hashing import PasswordHasher, calibrer_cout, doit_rehacher
+from sessions import SessionManager
+
+# Jeton de la dernière connexion, pour ne pas redemander le mot de passe au prochain lancement
+FICHIER_SESSION = Path.home() / ".guardia_session"
+
 def connect_to_db():
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="db"
-        )
-        return connection
+        return connecter()
     except Error as e:
         print(f"Erreur de connexion à la base de données: {e}")
         return None
@@ -27,7 +35,35 @@ def interface(connection):
     os.system("cls or clear")
     
 
-def principale(connection):
+def lire_jeton():
+    try:
+        return FICHIER_SESSION.read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+
+
+def enregistrer_jeton(jeton):
+    try:
+        fd = os.open(FICHIER_SESSION, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(jeton)
+    except OSError as e:
+        print(f"Impossible d'enregistrer la session: {e}")
+
+
+def reprendre_session(connection, sessions):
+    """Reprend la session enregistrée si son jeton est encore valide, sans bcrypt"""
+    jeton = lire_jeton()
+    session = sessions.verifier(jeton) if jeton else None
+    if session is None:
+        return False
+    print(f"\nSession reprise. Bienvenue, {session['username']} !")
+    while principale(connection, sessions, jeton):
+        pass
+    return True
+
+
+def principale(connection, sessions=None, jeton=None):
     while True:
 
         principale_ascii()
@@ -41,6 +77,9 @@ def principale(connection):
         if choix == '1':
             print("\nFonctionnalité en cours de développement...")
         elif choix == '2':
+            if sessions and jeton:
+                sessions.revoquer(jeton)
+                FICHIER_SESSION.unlink(missing_ok=True)
             print("\nDéconnexion réussie.")
             return False  # Retourne au menu de connexion
         elif choix == '3':
@@ -49,24 +88,33 @@ def principale(connection):
         else:
             print("\nOption invalide. Veuillez réessayer.")
 
-def login_user(connection):
+def login_user(connection, sessions=None):
     try:
         login_ascii()
 
         username = input("Nom d'utilisateur: ")
         password = getpass("Mot de passe: ")
         
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT id, username, password_hash FROM users WHERE username = %s",
-            (username,)
-        )
-        user = cursor.fetchone()
+        utilisateurs = UserRepository(connection)
+        user = utilisateurs.charger(username)
         
         if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
             print(f"\nConnexion réussie ! Bienvenue, {user['username']} !")
+            # Mettre le hash au coût calibré pour cette machine
+            cout = calibrer_cout()
+            if doit_rehacher(user['password_hash'], cout):
+                hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cout))
+                utilisateurs.modifier_hash(user['id'], hashed.decode('utf-8'))
+            jeton = None
+            if sessions:
+                try:
+                    jeton = sessions.creer(user['id'], user['username'])
+                    enregistrer_jeton(jeton)
+                except Error as e:
+                    # Le mot de passe est vérifié: seule la reprise de session au prochain lancement est perdue
+                    print(f"Session non enregistrée: {e}")
             # Boucle tant que l'utilisateur ne se déconnecte pas
-            while principale(connection):
+            while principale(connection, sessions, jeton):
                 pass
             return True
         else:
@@ -76,9 +124,6 @@ def login_user(connection):
     except Error as e:
         print(f"Erreur lors de la connexion: {e}")
         return False
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
 
 def add_user(connection):
     try:
@@ -89,32 +134,100 @@ def add_user(connection):
         password = getpass("Nouveau mot de passe: ")
         
         #Vérifier si l'utilisateur existe déjà
-        cursor = connection.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        if cursor.fetchone():
+        utilisateurs = UserRepository(connection)
+        if utilisateurs.existe(username):
             print("Erreur: Ce nom d'utilisateur est déjà pris.")
             return
             
         # Hachage du mot de passe avec bcrypt
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=calibrer_cout()))
         
-        cursor.execute(
-            "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
-            (username, hashed.decode('utf-8'))
-        )
-        connection.commit()
+        utilisateurs.creer(username, hashed.decode('utf-8'))
         print("\nUtilisateur ajouté avec succès!")
         
     except Error as e:
         print(f"Erreur lors de l'ajout de l'utilisateur: {e}")
         connection.rollback()
+
+def _couple(user):
+    """Renvoie (username, password) d'une ligne lue; ValueError si l'un manque ou est vide"""
+    if not isinstance(user, dict):
+        raise ValueError("objet attendu")
+    manquants = [champ for champ in ('username', 'password')
+                 if not isinstance(user.get(champ), str) or not user[champ]]
+    if manquants:
+        raise ValueError(f"{', '.join(manquants)} manquant")
+    return user['username'], user['password']
+
+
+def lire_utilisateurs(chemin, rejets=None):
+    """Lit les couples (username, password) d'un fichier CSV ou JSONL
+
+    Une ligne illisible ou sans username ou password est signalée et
+    ignorée, sans interrompre l'import; son numéro et la raison sont
+    ajoutés à rejets.
+    """
+    def rejeter(numero, raison):
+        print(f"Ligne {numero} ignorée: {raison}")
+        if rejets is not None:
+            rejets.append((numero, raison))
+
+    with open(chemin, 'r', newline='', encoding='utf-8') as f:
+        if chemin.endswith(('.jsonl', '.json')):
+            for numero, ligne in enumerate(f, 1):
+                if not ligne.strip():
+                    continue
+                try:
+                    yield _couple(json.loads(ligne))
+                except ValueError as e:
+                    rejeter(numero, e)
+        else:
+            lecteur = csv.DictReader(f)
+            for row in lecteur:
+                try:
+                    yield _couple(row)
+                except ValueError as e:
+                    rejeter(lecteur.line_num, e)
+
+
+def import_users(connection, chemin, taille_lot=1000, workers=None):
+    """Importe en masse les utilisateurs d'un fichier CSV ou JSONL"""
+    hasher = PasswordHasher(mode='process', workers=workers, cout=calibrer_cout())
+    rejets = []
+    utilisateurs = lire_utilisateurs(chemin, rejets)
+    depot = UserRepository(connection)
+    ajoutes = 0
+    doublons = []
+    try:
+        while True:
+            lot = list(islice(utilisateurs, taille_lot))
+            if not lot:
+                break
+            hashes = hasher.hacher_lot([password for _, password in lot])
+            ajoutes_lot, doublons_lot = depot.creer_lot([
+                (username, password_hash) for (username, _), password_hash in zip(lot, hashes)
+            ])
+            ajoutes += ajoutes_lot
+            doublons += doublons_lot
+            print(f"{ajoutes} utilisateurs importés...")
+    except Error as e:
+        print(f"Erreur lors de l'import des utilisateurs: {e}")
     finally:
-        if 'cursor' in locals():
-            cursor.close()
+        hasher.fermer()
 
+    print(f"\nImport terminé: {ajoutes} utilisateurs ajoutés, {len(doublons)} doublons ignorés, "
+          f"{len(rejets)} lignes invalides ignorées.")
+    for username in doublons:
+        print(f"Doublon: {username}")
+    return ajoutes, doublons
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Gestion simple d'utilisateurs")
+    parser.add_argument('--import', dest='fichier', help="fichier CSV ou JSONL d'utilisateurs à importer")
+    parser.add_argument('--taille-lot', type=int, default=1000, help="utilisateurs par transaction")
+    args = parser.parse_args()
+
     print("=== Gestion simple d'utilisateurs ===\n")
     
     # Connexion à la base de données
@@ -123,6 +236,13 @@ def main():
         return
     
     try:
+        if args.fichier:
+            import_users(connection, args.fichier, args.taille_lot)
+            return
+
+        sessions = SessionManager(connection)
+        reprendre_session(connection, sessions)
+
         while True:
             print("\nOptions:")
             print("1. Inscription")
@@ -133,7 +253,7 @@ def main():
             choice = input("\nVotre choix (1-4): ")
             
             if choice == '2':
-                login_user(connection)
+                login_user(connection, sessions)
             elif choice == '1':
                 add_user(connection)
             elif choice == '3':
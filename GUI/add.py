@@ -1,42 +1,300 @@
 from flask import *
-import csv
-from maincreatorcsv import read_csv
+import json
+import os
+import threading
+import time
+from functools import wraps
+from itertools import chain
+from pathlib import Path
+from data_access import UserRepository, creer_pool
+from hashing import PasswordHasher
+from maincreatorcsv import iter_csv, iter_csv_chunks
+from metrics import metriques
+from product_db import stockage_configure
+from product_store import CHAMPS_PRODUIT, ProductStore, convertir_entier, convertir_prix
+from sessions import SessionManager
 
 
 
 app = Flask(__name__)
 
+BASE_PATH = Path(__file__).parent
+
+# Superviseur MySQL commun aux sessions et, avec STOCKAGE_PRODUITS=mysql, aux produits;
+# le pool n'est créé qu'à la première requête
+_base = None
+_base_lock = threading.Lock()
+
+
+def superviseur_base():
+    """Renvoie le superviseur de la base MySQL, créé au premier appel"""
+    global _base
+    with _base_lock:
+        if _base is None:
+            from db_pool import ConnectionSupervisor
+
+            _base = ConnectionSupervisor(creer_pool)
+    return _base
+
+
+def ouvrir_store():
+    """Ouvre le stockage des produits choisi par STOCKAGE_PRODUITS, comme l'application de bureau"""
+    if stockage_configure() == 'mysql':
+        from mysql.connector import Error
+        from db_pool import BaseIndisponible, est_panne
+        from product_db import MySQLProductStore
+
+        @app.errorhandler(Error)
+        def base_indisponible(e):
+            # Serveur injoignable ou disjoncteur ouvert: 503; une requête refusée reste une erreur 500
+            if isinstance(e, BaseIndisponible) or est_panne(e):
+                return str(e), 503
+            raise e
+
+        return MySQLProductStore(superviseur_base())
+    # Même journal de produits que l'application de bureau, sauf si PRODUITS_LOG en désigne un autre
+    return ProductStore(
+        os.environ.get("PRODUITS_LOG", BASE_PATH / "produits.log"),
+        source_csv=BASE_PATH / "caca.csv"
+    )
+
+
+store = ouvrir_store()
+
+# Utilisateurs et sessions dans MySQL, connecté au premier appel de /session
+hasher = PasswordHasher()
+_sessions = None
+_sessions_lock = threading.Lock()
+
+# Réponses JSON déjà sérialisées pour la version courante du catalogue
+_cache = {}
+_cache_version = None
+_cache_lock = threading.Lock()
+TAILLE_CACHE = 256
+
+
+def non_modifie(etag):
+    """Renvoie un 304 si le client possède déjà cette version, sinon None"""
+    if etag in request.if_none_match:
+        reponse = Response(status=304)
+        reponse.set_etag(etag)
+        return reponse
+    return None
+
+
+def reponse_json(cle, construire):
+    """Renvoie une réponse JSON mise en cache par version, avec ETag
+
+    Un client qui renvoie l'ETag courant dans If-None-Match reçoit un 304
+    sans que rien ne soit relu ni sérialisé.
+    """
+    global _cache_version
+    version = store.version
+    etag = f"{store.instance}-{version}"
+    reponse = non_modifie(etag)
+    if reponse is not None:
+        return reponse
+
+    with _cache_lock:
+        if _cache_version != version:
+            _cache.clear()
+            _cache_version = version
+        corps = _cache.get(cle)
+    if corps is None:
+        donnees = construire()
+        if donnees is None:
+            abort(404)
+        corps = json.dumps(donnees, ensure_ascii=False)
+        with _cache_lock:
+            if _cache_version == version and len(_cache) < TAILLE_CACHE:
+                _cache[cle] = corps
+
+    reponse = Response(corps, mimetype='application/json')
+    reponse.set_etag(etag)
+    return reponse
+
+
+def reponse_flux(morceaux, mimetype):
+    """Envoie le catalogue complet morceau par morceau, sans le garder en mémoire"""
+    etag = f"{store.instance}-{store.version}"
+    reponse = non_modifie(etag)
+    if reponse is not None:
+        return reponse
+    reponse = Response(stream_with_context(morceaux), mimetype=mimetype)
+    reponse.set_etag(etag)
+    return reponse
+
+
+def flux_json(produits):
+    yield '['
+    for i, produit in enumerate(produits):
+        yield (',' if i else '') + json.dumps(produit, ensure_ascii=False)
+    yield ']'
+
+
+def gestionnaire_sessions():
+    """Renvoie le gestionnaire de sessions, créé avec son superviseur MySQL au premier appel"""
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = SessionManager(superviseur_base())
+    return _sessions
+
+
+def session_requise(vue):
+    """Exige un jeton valide dans l'en-tête Authorization: Bearer; la session est dans g.session"""
+    @wraps(vue)
+    def verifier(*args, **kwargs):
+        entete = request.headers.get('Authorization', '')
+        jeton = entete[len('Bearer '):] if entete.startswith('Bearer ') else None
+        g.session = gestionnaire_sessions().verifier(jeton) if jeton else None
+        if g.session is None:
+            abort(401)
+        g.jeton = jeton
+        return vue(*args, **kwargs)
+    return verifier
+
+
+@app.before_request
+def rafraichir_store():
+    g.debut_requete = time.perf_counter()
+    # Prendre en compte les écritures de l'application de bureau avant de calculer l'ETag
+    store.rafraichir()
+
+
+@app.after_request
+def mesurer_requete(reponse):
+    # Pour une réponse diffusée, seule la préparation est comptée, pas l'envoi
+    if metriques.actif and 'debut_requete' in g:
+        metriques.enregistrer(f"http.{request.endpoint}", time.perf_counter() - g.debut_requete)
+        metriques.incrementer(f"http.statut.{reponse.status_code}")
+    return reponse
+
+
+@app.route('/metrics')
+def exporter_metriques():
+    """Durées et compteurs au format Prometheus, ou en JSON avec ?format=json"""
+    if request.args.get('format') == 'json':
+        return jsonify(metriques.resume())
+    return Response(metriques.texte_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/session', methods=['POST'])
+def ouvrir_session():
+    """Vérifie le mot de passe une fois et renvoie un jeton pour les requêtes suivantes"""
+    from mysql.connector import Error
+
+    donnees = request.get_json(silent=True) or {}
+    username, password = donnees.get('username'), donnees.get('password')
+    if not username or not password:
+        abort(400, "username et password sont requis")
+    sessions = gestionnaire_sessions()
+    try:
+        user = UserRepository(sessions.stockage).charger(username)
+    except Error as e:
+        abort(503, str(e))
+    if not user or not hasher.verifier(user['password_hash'], password).result():
+        abort(401)
+    try:
+        jeton = sessions.creer(user['id'], user['username'])
+    except Error as e:
+        abort(503, str(e))
+    return jsonify(dict(sessions.verifier(jeton), token=jeton)), 201
+
+@app.route('/session', methods=['GET'])
+@session_requise
+def lire_session():
+    return jsonify(g.session)
+
+@app.route('/session', methods=['DELETE'])
+@session_requise
+def fermer_session():
+    gestionnaire_sessions().revoquer(g.jeton)
+    return '', 204
+
 @app.route('/')
 def welcome():
     return render_template('index_flask.html')
 
-@app.route('/product')
-def product():
-    rows = read_csv('caca.csv')
-    html = '<br>'.join([','.join(row) for row in rows])
-    return html
-
 @app.route('/product', methods=['GET'])
-def method():
-    if request.method == 'GET':
-        print("succesful")
-    else:
-        print("Fail")
-
-@app.route('/product/id', methods=['GET'])
-def method1():
-    if request.method == 'GET':
-        print("succesful")
-    else:
-        print("Fail")
+def liste_produits():
+    args = request.args
+    # Le catalogue complet est diffusé ligne par ligne plutôt que mis en cache
+    if args.get('format') == 'csv':
+        lignes = ([p[champ] for champ in CHAMPS_PRODUIT] for p in store.iterer())
+        return reponse_flux(iter_csv_chunks(chain([CHAMPS_PRODUIT], lignes)), 'text/csv')
+    if not args:
+        return reponse_flux(flux_json(store.iterer()), 'application/json')
 
-@app.route('/product', methods=['POST'])
-def method2():
-    if request.method == 'POST':
-        print("succesful")
-    else:
-        print("Fail")
+    filtres = {}
+    if 'categorie' in args:
+        filtres['categorie'] = (args['categorie'], args['categorie'])
+    for champ, conversion in (('prix', float), ('quantite', int)):
+        minimum = args.get(f'{champ}_min', type=conversion)
+        maximum = args.get(f'{champ}_max', type=conversion)
+        if minimum is not None or maximum is not None:
+            filtres[champ] = (minimum, maximum)
+
+    def construire():
+        try:
+            return store.requeter(
+                args.get('offset', 0, type=int),
+                args.get('limit', 50, type=int),
+                filtres,
+                args.get('tri', 'id'),
+                args.get('decroissant', 'false').lower() in ('1', 'true')
+            )
+        except ValueError as e:
+            abort(400, str(e))
 
-app.run(host='localhost', port=8080)
+    return reponse_json(request.query_string.decode(), construire)
+
+@app.route('/product/recherche', methods=['GET'])
+def rechercher_produits():
+    requete = request.args.get('q', '')
+    limit = request.args.get('limit', 20, type=int)
+    return reponse_json(f'recherche/{limit}/{requete}', lambda: store.rechercher(requete, limit))
+
+@app.route('/product/agregats', methods=['GET'])
+def agregats_produits():
+    """Totaux d'inventaire par catégorie; ?recalculer=1 force une reconstruction complète"""
+    if request.args.get('recalculer', 'false').lower() in ('1', 'true'):
+        return jsonify(store.agregats(recalculer=True))
+    return reponse_json('agregats', store.agregats)
+
+@app.route('/fournisseur')
+def fichier_fournisseur():
+    """Diffuse le fichier fournisseur brut, quelle que soit sa taille"""
+    chemin = BASE_PATH / "caca.csv"
+    if not chemin.exists():
+        abort(404)
+    return Response(stream_with_context(iter_csv_chunks(iter_csv(chemin))), mimetype='text/csv')
+
+@app.route('/product/<int:id_produit>', methods=['GET'])
+def get_produit(id_produit):
+    return reponse_json(f'produit/{id_produit}', lambda: store.get(id_produit))
+
+@app.route('/product', methods=['POST'])
+@session_requise
+def ajouter_produit():
+    donnees = request.get_json(silent=True) or {}
+    try:
+        produit = store.creer(
+            donnees['nom'],
+            convertir_prix(donnees['prix']),
+            convertir_entier(donnees['quantite'], 'quantite'),
+            donnees.get('categorie', "")
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        abort(400, f"Produit invalide: {e}")
+    return jsonify(produit), 201
 
+@app.route('/product/<int:id_produit>', methods=['DELETE'])
+@session_requise
+def supprimer_produit(id_produit):
+    if not store.supprimer(id_produit):
+        abort(404)
+    return '', 204
 
+if __name__ == "__main__":
+    app.run(host='localhost', port=8080)
@@ -0,0 +1,152 @@
+from functools import lru_cache
+
+
+# En dessous, la boucle Python est plus rapide que l'import et la conversion NumPy
+SEUIL_NUMPY = 10000
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """Importe NumPy au premier gros recalcul; None s'il n'est pas installé"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def resumer(categories):
+    """Met en forme les totaux par catégorie et le total général
+
+    categories associe chaque catégorie à (nombre, quantite, valeur, prix_min, prix_max).
+    """
+    resume = {'nombre': 0, 'quantite': 0, 'valeur': 0.0, 'categories': {}}
+    for categorie, (nombre, quantite, valeur, prix_min, prix_max) in sorted(categories.items()):
+        resume['nombre'] += nombre
+        resume['quantite'] += quantite
+        resume['valeur'] += valeur
+        resume['categories'][categorie] = {
+            'nombre': nombre,
+            'quantite': quantite,
+            'valeur': round(valeur, 2),
+            'prix_min': prix_min,
+            'prix_max': prix_max
+        }
+    resume['valeur'] = round(resume['valeur'], 2)
+    return resume
+
+
+class InventoryAggregates:
+    """Totaux d'inventaire par catégorie: nombre, quantité, valeur du stock, prix min et max
+
+    ajouter et retirer mettent les sommes à jour en temps constant. Retirer
+    le prix minimal ou maximal d'une catégorie la marque seulement comme
+    périmée: son min et son max sont recalculés à la lecture, à partir des
+    seuls produits de cette catégorie. reconstruire repart de zéro, en
+    vectorisé avec NumPy s'il est installé et que le catalogue est grand.
+    """
+
+    def __init__(self):
+        # categorie -> [nombre, quantite, valeur, prix_min, prix_max]
+        self._categories = {}
+        self._perimes = set()
+
+    def ajouter(self, categorie, prix, quantite):
+        totaux = self._categories.get(categorie)
+        if totaux is None:
+            self._categories[categorie] = [1, quantite, prix * quantite, prix, prix]
+            return
+        totaux[0] += 1
+        totaux[1] += quantite
+        totaux[2] += prix * quantite
+        if prix < totaux[3]:
+            totaux[3] = prix
+        if prix > totaux[4]:
+            totaux[4] = prix
+
+    def retirer(self, categorie, prix, quantite):
+        totaux = self._categories[categorie]
+        totaux[0] -= 1
+        if totaux[0] == 0:
+            del self._categories[categorie]
+            self._perimes.discard(categorie)
+            return
+        totaux[1] -= quantite
+        totaux[2] -= prix * quantite
+        if prix == totaux[3] or prix == totaux[4]:
+            self._perimes.add(categorie)
+
+    def perimes(self):
+        """Renvoie les catégories dont le prix min ou max est à recalculer"""
+        return list(self._perimes)
+
+    def recalculer(self, categorie, prix):
+        """Recalcule le prix min et max d'une catégorie à partir de ses prix"""
+        prix = list(prix)
+        totaux = self._categories[categorie]
+        totaux[3] = min(prix)
+        totaux[4] = max(prix)
+        self._perimes.discard(categorie)
+
+    def reconstruire(self, valeurs):
+        """Recalcule tous les totaux à partir de tuples (categorie, prix, quantite)"""
+        self._perimes.clear()
+        valeurs = list(valeurs)
+        np = _numpy() if len(valeurs) >= SEUIL_NUMPY else None
+        if np is None:
+            self._categories = {}
+            for categorie, prix, quantite in valeurs:
+                self.ajouter(categorie, prix, quantite)
+            return
+        self._categories = self._reconstruire_numpy(np, valeurs)
+
+    def reconstruire_colonnes(self, categories, codes, prix, quantites):
+        """Recalcule tous les totaux à partir de colonnes, sans tuple par produit
+
+        codes donne pour chaque produit l'indice de sa catégorie dans
+        categories; codes, prix et quantites peuvent être des array, lus par
+        NumPy sans copie.
+        """
+        np = _numpy() if len(codes) >= SEUIL_NUMPY else None
+        if np is None:
+            self.reconstruire(zip((categories[code] for code in codes), prix, quantites))
+            return
+        self._perimes.clear()
+        # Seules les catégories encore utilisées forment un groupe
+        presents, groupes = np.unique(np.asarray(codes), return_inverse=True)
+        self._categories = self._totaux_numpy(
+            np,
+            np.array(categories, dtype=object)[presents],
+            groupes,
+            np.asarray(prix, dtype=np.float64),
+            np.asarray(quantites, dtype=np.int64)
+        )
+
+    @classmethod
+    def _reconstruire_numpy(cls, np, valeurs):
+        categories, prix, quantites = zip(*valeurs)
+        noms, groupes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        return cls._totaux_numpy(
+            np, noms, groupes, np.array(prix, dtype=np.float64), np.array(quantites, dtype=np.int64)
+        )
+
+    @staticmethod
+    def _totaux_numpy(np, noms, groupes, prix, quantites):
+        nombres = np.bincount(groupes, minlength=len(noms))
+        totaux_quantite = np.bincount(groupes, weights=quantites, minlength=len(noms))
+        totaux_valeur = np.bincount(groupes, weights=prix * quantites, minlength=len(noms))
+        # Prix triés par groupe: chaque groupe est une tranche contiguë
+        prix_groupes = prix[np.argsort(groupes, kind='stable')]
+        debuts = np.concatenate(([0], np.cumsum(nombres)[:-1]))
+        minimums = np.minimum.reduceat(prix_groupes, debuts)
+        maximums = np.maximum.reduceat(prix_groupes, debuts)
+
+        return {
+            nom: [int(n), int(q), float(v), float(mini), float(maxi)]
+            for nom, n, q, v, mini, maxi in zip(
+                noms.tolist(), nombres, totaux_quantite, totaux_valeur, minimums, maximums
+            )
+        }
+
+    def resume(self):
+        return resumer({categorie: tuple(totaux) for categorie, totaux in self._categories.items()})
@@ -0,0 +1,443 @@
+"""Mesures de performance du journal de produits, de l'authentification et de l'API Flask
+
+Chaque mesure produit un résultat JSON (débit et latences p50/p95), écrit
+sur la sortie standard ou dans --sortie. Avec --repetitions, toutes les
+mesures sont refaites et chaque valeur retenue est la médiane des exécutions.
+Avec --reference, les résultats sont comparés à une exécution précédente et
+le script échoue si un débit a baissé de plus de --tolerance. Seules les
+mesures d'au moins ECHANTILLONS_MIN échantillons sont comparées: un import
+chronométré une seule fois varie trop pour servir de seuil. Une référence
+mesurée sur une autre machine (nombre de processeurs, version de Python)
+n'est pas comparée. Le script échoue aussi si une latence p95 dépasse son
+plafond dans LATENCES_MAX_MS, comme la recherche à chaque frappe.
+
+    python benchmark.py --tailles 1000 100000 1000000 --sortie bench.json
+    python benchmark.py --reference bench.json --repetitions 5
+    python benchmark.py --mysql   # authentification contre le MySQL local
+
+L'intégration continue compare chaque exécution à benchmark_reference.json,
+qui doit donc être produit sur ses machines: après un changement de
+performance voulu, lancer le workflow Build à la main avec l'option
+reference et committer l'artefact benchmark_reference obtenu.
+"""
+import argparse
+import csv
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from data_access import UserRepository, creer_pool
+from hashing import PasswordHasher, _hacher
+from product_catalog import csv_vers_catalogue
+from product_store import CHAMPS_PRODUIT, ProductStore
+from sessions import SessionManager
+
+
+GRAINE = 42
+CATEGORIES = ['épicerie', 'boissons', 'crèmerie', 'boulangerie', 'fruits et légumes', 'hygiène']
+SYLLABES = ['ca', 'fé', 'ra', 'bi', 'to', 'mè', 'lé', 'pa', 'cho', 'co', 'lat', 'fro', 'ma', 'ge', 'pom', 'vin']
+# Latence p95 maximale en millisecondes, vérifiée à chaque exécution quelle que soit la référence:
+# la recherche est relancée à chaque frappe dans l'interface
+LATENCES_MAX_MS = {
+    ('store', 'rechercher_produits'): 5.0,
+    ('store', 'rechercher_frappe'): 5.0,
+}
+# Nombre minimal d'échantillons (opérations × répétitions) pour qu'un débit soit comparé
+ECHANTILLONS_MIN = 5
+
+
+def _resultat(groupe, operation, taille, durees, duree_totale=None):
+    """Résume une série de durées en secondes: débit, latences médiane et p95"""
+    durees = sorted(durees)
+    duree_totale = duree_totale if duree_totale is not None else sum(durees)
+    return {
+        'groupe': groupe,
+        'operation': operation,
+        'taille': taille,
+        'operations': len(durees),
+        'duree_s': round(duree_totale, 4),
+        'ops_par_s': round(len(durees) / duree_totale, 1) if duree_totale else None,
+        'p50_ms': round(statistics.median(durees) * 1000, 3),
+        'p95_ms': round(durees[math.ceil(len(durees) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def _chronometrer(fonction, arguments):
+    durees = []
+    for argument in arguments:
+        debut = time.perf_counter()
+        fonction(argument)
+        durees.append(time.perf_counter() - debut)
+    return durees
+
+
+def ecrire_catalogue(chemin, taille, graine=GRAINE):
+    """Écrit un CSV de taille produits reproductible, au format de charger_produits"""
+    alea = random.Random(graine)
+    with open(chemin, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CHAMPS_PRODUIT)
+        for i in range(1, taille + 1):
+            nom = ' '.join(
+                ''.join(alea.choice(SYLLABES) for _ in range(alea.randint(1, 3)))
+                for _ in range(alea.randint(1, 3))
+            )
+            writer.writerow([
+                i, nom.capitalize(), round(alea.uniform(0.5, 500), 2), alea.randint(0, 200),
+                alea.choice(CATEGORIES), "2024-01-01 00:00:00"
+            ])
+
+
+def mesurer_store(taille, operations=1000):
+    """Chargement, lecture complète, ajout, suppression, page et recherche sur taille produits"""
+    dossier = Path(tempfile.mkdtemp())
+    source = dossier / f"catalogue_{taille}.csv"
+    journal = dossier / f"produits_{taille}.log"
+    ecrire_catalogue(source, taille)
+    alea = random.Random(GRAINE)
+    resultats = []
+
+    debut = time.perf_counter()
+    store = ProductStore(journal, source_csv=source)
+    resultats.append(_resultat('store', 'import_csv', taille, [time.perf_counter() - debut]))
+    store.fermer()
+
+    binaire = dossier / f"catalogue_{taille}.bin"
+    csv_vers_catalogue(source, binaire)
+    debut = time.perf_counter()
+    ProductStore(dossier / f"produits_{taille}_binaire.log", source_csv=binaire).fermer()
+    resultats.append(_resultat('store', 'import_binaire', taille, [time.perf_counter() - debut]))
+
+    debut = time.perf_counter()
+    store = ProductStore(journal)
+    resultats.append(_resultat('store', 'ouverture', taille, [time.perf_counter() - debut]))
+    try:
+        # Une lecture complète coûte de l'ordre de la taille: moins de répétitions pour les gros catalogues
+        repetitions = max(1, min(20, 100000 // taille))
+        resultats.append(_resultat(
+            'store', 'charger_produits', taille,
+            _chronometrer(lambda _: store.tous(), range(repetitions))
+        ))
+
+        crees = []
+        resultats.append(_resultat(
+            'store', 'ajouter_produit', taille,
+            _chronometrer(
+                lambda i: crees.append(store.creer(f"Produit {i}", 9.99, 3, alea.choice(CATEGORIES))),
+                range(operations)
+            )
+        ))
+        store.synchroniser().result()
+
+        ids = alea.sample(range(1, taille + 1), min(operations, taille))
+        resultats.append(_resultat(
+            'store', 'supprimer_produit', taille, _chronometrer(store.supprimer, ids)
+        ))
+
+        resultats.append(_resultat(
+            'store', 'requeter_produits', taille,
+            _chronometrer(
+                lambda categorie: store.requeter(0, 50, {'categorie': (categorie, categorie)}, 'prix'),
+                [alea.choice(CATEGORIES) for _ in range(operations)]
+            )
+        ))
+        resultats.append(_resultat(
+            'store', 'rechercher_produits', taille,
+            _chronometrer(
+                lambda requete: store.rechercher(requete, 20),
+                [alea.choice(SYLLABES)[:alea.randint(1, 2)] for _ in range(operations)]
+            )
+        ))
+        # Une requête de deux mots tapée lettre par lettre: une recherche par frappe
+        frappes = []
+        while len(frappes) < operations:
+            requete = ' '.join(''.join(alea.choice(SYLLABES) for _ in range(2)) for _ in range(2))
+            frappes += [requete[:fin] for fin in range(1, len(requete) + 1)]
+        resultats.append(_resultat(
+            'store', 'rechercher_frappe', taille,
+            _chronometrer(lambda requete: store.rechercher(requete, 20), frappes[:operations])
+        ))
+        resultats.append(_resultat(
+            'store', 'agregats', taille, _chronometrer(lambda _: store.agregats(), range(operations))
+        ))
+    finally:
+        store.fermer()
+        shutil.rmtree(dossier, ignore_errors=True)
+    return resultats
+
+
+class _PoolMemoire:
+    """Remplace le pool MySQL: la table users est un dictionnaire en mémoire"""
+
+    connection_id = 1
+
+    def __init__(self, utilisateurs):
+        self.utilisateurs = utilisateurs
+
+    @contextmanager
+    def connexion(self):
+        yield self
+
+    def cursor(self, dictionary=False, prepared=False):
+        return _CurseurMemoire(self.utilisateurs)
+
+
+class _CurseurMemoire:
+    def __init__(self, utilisateurs):
+        self.utilisateurs = utilisateurs
+        self.ligne = None
+
+    def execute(self, requete, parametres):
+        self.ligne = self.utilisateurs.get(parametres[0])
+
+    def fetchall(self):
+        return [self.ligne] if self.ligne else []
+
+    def close(self):
+        pass
+
+
+def mesurer_authentification(connexions=64, mysql=False, mode='thread'):
+    """Débit de connexions simultanées: lecture de l'utilisateur puis vérification bcrypt"""
+    hasher = PasswordHasher(mode)
+    username, password = "bench_utilisateur", "monmotdepasse123"
+    hachage = _hacher(password, hasher.cout)
+    if mysql:
+        pool = creer_pool(5)
+        with pool.connexion() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "REPLACE INTO users (username, password_hash) VALUES (%s, %s)", (username, hachage)
+            )
+            cursor.close()
+    else:
+        pool = _PoolMemoire({username: {'id': 1, 'username': username, 'password_hash': hachage}})
+
+    utilisateurs = UserRepository(pool)
+
+    def authentifier(_):
+        # Même chemin que WebViewApp.authenticate_user: requête dans l'appelant, bcrypt dans le pool
+        user = utilisateurs.charger(username)
+        return hasher.verifier(user['password_hash'], password).result()
+
+    try:
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as clients:
+            durees = list(clients.map(lambda i: _chronometrer(authentifier, [i])[0], range(connexions)))
+        duree = time.perf_counter() - debut
+    finally:
+        hasher.fermer()
+        if mysql:
+            utilisateurs.supprimer(username)
+    resultat = _resultat('auth', 'authenticate_user', connexions, durees, duree)
+    resultat['backend'] = 'mysql' if mysql else 'memoire'
+    resultat['cout_bcrypt'] = hasher.cout
+
+    # Une navigation ou une requête Flask authentifiée ne vérifie plus qu'un jeton de session
+    sessions = SessionManager(secret=b"benchmark")
+    jeton = sessions.creer(1, username)
+    durees = _chronometrer(sessions.verifier, [jeton] * max(connexions, 1000))
+    return [resultat, _resultat('auth', 'verifier_session', 1, durees)]
+
+
+def mesurer_http(taille=10000, requetes=500, concurrence=8):
+    """Charge HTTP concurrente sur les routes de add.py, servies par un serveur werkzeug local"""
+    dossier = Path(tempfile.mkdtemp())
+    source = dossier / "catalogue_http.csv"
+    ecrire_catalogue(source, taille)
+    ProductStore(dossier / "produits_http.log", source_csv=source).fermer()
+    os.environ["PRODUITS_LOG"] = str(dossier / "produits_http.log")
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import add
+    if add.store.chemin != dossier / "produits_http.log":
+        # Répétition: l'exécution précédente a fermé le journal de l'application
+        add = importlib.reload(add)
+    # Sessions en mémoire pour les routes qui modifient le catalogue: la mesure ne dépend pas de MySQL
+    add._sessions = SessionManager(secret=b"benchmark")
+    jeton = add._sessions.creer(1, "bench_utilisateur")
+
+    class SansJournal(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    serveur = make_server('127.0.0.1', 0, add.app, threaded=True, request_handler=SansJournal)
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{serveur.server_port}"
+    alea = random.Random(GRAINE)
+
+    def appeler(requete):
+        debut = time.perf_counter()
+        with urllib.request.urlopen(requete) as reponse:
+            reponse.read()
+        return time.perf_counter() - debut
+
+    def creation(i):
+        return urllib.request.Request(
+            f"{base}/product", method='POST',
+            headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {jeton}"},
+            data=json.dumps({'nom': f"Produit {i}", 'prix': 9.99, 'quantite': 1}).encode('utf-8')
+        )
+
+    scenarios = [
+        ('GET /product?limit=50', [f"{base}/product?limit=50&offset={alea.randrange(taille)}" for _ in range(requetes)]),
+        ('GET /product/<id>', [f"{base}/product/{alea.randint(1, taille)}" for _ in range(requetes)]),
+        ('GET /product/recherche', [f"{base}/product/recherche?q={urllib.parse.quote(alea.choice(SYLLABES))}" for _ in range(requetes)]),
+        ('GET /product/agregats', [f"{base}/product/agregats" for _ in range(requetes)]),
+        ('POST /product', [creation(i) for i in range(requetes)]),
+        ('GET /product', [f"{base}/product" for _ in range(max(1, requetes // 50))]),
+    ]
+    resultats = []
+    try:
+        for operation, liste in scenarios:
+            debut = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrence) as clients:
+                durees = list(clients.map(appeler, liste))
+            resultat = _resultat('http', operation, taille, durees, time.perf_counter() - debut)
+            resultat['concurrence'] = concurrence
+            resultats.append(resultat)
+    finally:
+        serveur.shutdown()
+        add.store.fermer()
+        add.hasher.fermer()
+        shutil.rmtree(dossier, ignore_errors=True)
+    return resultats
+
+
+def medianes(executions):
+    """Combine plusieurs exécutions complètes en une: médiane de chaque valeur, mesure par mesure"""
+    series = {}
+    for resultats in executions:
+        for resultat in resultats:
+            series.setdefault((resultat['groupe'], resultat['operation'], resultat['taille']), []).append(resultat)
+    combines = []
+    for serie in series.values():
+        resultat = dict(serie[0])
+        for cle in ('duree_s', 'ops_par_s', 'p50_ms', 'p95_ms'):
+            valeurs = [r[cle] for r in serie if r[cle] is not None]
+            resultat[cle] = round(statistics.median(valeurs), 4) if valeurs else None
+        resultat['repetitions'] = len(serie)
+        combines.append(resultat)
+    return combines
+
+
+def _echantillons(resultat):
+    return resultat['operations'] * resultat.get('repetitions', 1)
+
+
+def meme_machine(reference):
+    """Vrai si la référence a été mesurée sur une machine comparable à celle-ci"""
+    return (reference.get('cpu') == os.cpu_count()
+            and reference.get('python', '').split('.')[:2] == platform.python_version().split('.')[:2])
+
+
+def comparer(resultats, reference, tolerance):
+    """Renvoie les mesures dont le débit a baissé de plus de tolerance par rapport à la référence"""
+    anciens = {(r['groupe'], r['operation'], r['taille']): r for r in reference['resultats']}
+    regressions = []
+    for resultat in resultats:
+        ancien = anciens.get((resultat['groupe'], resultat['operation'], resultat['taille']))
+        if not ancien or not ancien['ops_par_s'] or not resultat['ops_par_s']:
+            continue
+        if min(_echantillons(resultat), _echantillons(ancien)) < ECHANTILLONS_MIN:
+            continue
+        rapport = resultat['ops_par_s'] / ancien['ops_par_s']
+        if rapport < 1 - tolerance:
+            regressions.append(
+                f"{resultat['groupe']} {resultat['operation']} ({resultat['taille']}): "
+                f"{ancien['ops_par_s']} -> {resultat['ops_par_s']} ops/s ({rapport:.0%})"
+            )
+    return regressions
+
+
+def verifier_latences(resultats, latences_max=LATENCES_MAX_MS):
+    """Renvoie les mesures dont la latence p95 dépasse son plafond absolu"""
+    return [
+        f"{r['groupe']} {r['operation']} ({r['taille']}): p95 {r['p95_ms']} ms > {latences_max[cle]} ms"
+        for r in resultats
+        if (cle := (r['groupe'], r['operation'])) in latences_max and r['p95_ms'] > latences_max[cle]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de performance de l'application")
+    parser.add_argument('--tailles', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="tailles de catalogue pour les mesures du journal")
+    parser.add_argument('--operations', type=int, default=1000, help="opérations par mesure du journal")
+    parser.add_argument('--connexions', type=int, default=64, help="connexions simultanées à authentifier")
+    parser.add_argument('--mysql', action='store_true', help="authentifier contre le MySQL local")
+    parser.add_argument('--taille-http', type=int, default=10000, help="taille du catalogue servi par Flask")
+    parser.add_argument('--requetes', type=int, default=500, help="requêtes HTTP par route")
+    parser.add_argument('--concurrence', type=int, default=8, help="clients HTTP simultanés")
+    parser.add_argument('--sans', nargs='+', default=[], choices=['store', 'auth', 'http'],
+                        help="groupes de mesures à ignorer")
+    parser.add_argument('--sortie', help="fichier JSON où écrire les résultats")
+    parser.add_argument('--reference', help="résultats JSON précédents à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="baisse de débit tolérée (0.2 = 20%%)")
+    parser.add_argument('--repetitions', type=int, default=1,
+                        help="exécutions complètes dont la médiane est retenue")
+    args = parser.parse_args()
+
+    executions = []
+    for repetition in range(1, args.repetitions + 1):
+        resultats = []
+        if 'store' not in args.sans:
+            for taille in args.tailles:
+                print(f"[{repetition}/{args.repetitions}] Journal de produits: {taille} produits...", file=sys.stderr)
+                resultats += mesurer_store(taille, args.operations)
+        if 'auth' not in args.sans:
+            print(f"[{repetition}/{args.repetitions}] Authentification...", file=sys.stderr)
+            resultats += mesurer_authentification(args.connexions, args.mysql)
+        if 'http' not in args.sans:
+            print(f"[{repetition}/{args.repetitions}] Routes Flask...", file=sys.stderr)
+            resultats += mesurer_http(args.taille_http, args.requetes, args.concurrence)
+        executions.append(resultats)
+    resultats = medianes(executions)
+
+    rapport = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plateforme': platform.platform(),
+        'cpu': os.cpu_count(),
+        'repetitions': args.repetitions,
+        'resultats': resultats,
+    }
+    texte = json.dumps(rapport, ensure_ascii=False, indent=2)
+    if args.sortie:
+        Path(args.sortie).write_text(texte, encoding='utf-8')
+    else:
+        print(texte)
+
+    echecs = verifier_latences(resultats)
+    for echec in echecs:
+        print(f"LATENCE: {echec}", file=sys.stderr)
+    if args.reference:
+        reference = json.loads(Path(args.reference).read_text(encoding='utf-8'))
+        if not meme_machine(reference):
+            print(f"AVERTISSEMENT: référence mesurée sur une autre machine ({reference.get('cpu')} processeurs, "
+                  f"Python {reference.get('python')}), débits non comparés", file=sys.stderr)
+            reference = {'resultats': []}
+        regressions = comparer(resultats, reference, args.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION: {regression}", file=sys.stderr)
+        echecs += regressions
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+from contextlib import contextmanager
+
+
+# Base locale partagée par l'interface, l'API Flask, la CLI et les scripts
+CONFIG_DB = {
+    'host': "localhost",
+    'user': "root",
+    'password': "",
+    'database': "db",
+    'charset': 'utf8mb4',
+    'collation': 'utf8mb4_unicode_ci',
+}
+
+ERREUR_DOUBLON = 1062
+
+# mysql.connector et db_pool ne sont importés qu'à la première connexion:
+# l'application de bureau importe ce module avant d'afficher sa fenêtre
+
+
+def connecter(**options):
+    """Ouvre une connexion MySQL directe avec la configuration partagée"""
+    import mysql.connector
+
+    return mysql.connector.connect(**dict(CONFIG_DB, **options))
+
+
+def creer_pool(taille=5, **options):
+    """Crée un pool de connexions avec la configuration partagée, en autocommit"""
+    from db_pool import ConnectionPool
+
+    return ConnectionPool(taille=taille, **dict(CONFIG_DB, connection_timeout=5, autocommit=True, **options))
+
+
+@contextmanager
+def connexion(stockage):
+    """Emprunte une connexion à un pool ou à un superviseur, ou utilise une connexion directe"""
+    if hasattr(stockage, 'connexion'):
+        with stockage.connexion() as connection:
+            yield connection
+    else:
+        yield stockage
+
+
+def curseur_prepare(connection, requete):
+    """Renvoie le curseur préparé de requete pour cette connexion, créé au premier appel
+
+    Le serveur analyse la requête une seule fois par connexion: les
+    exécutions suivantes n'envoient que les paramètres. Les curseurs sont
+    gardés sur la connexion sous-jacente, qui survit aux emprunts du pool,
+    et oubliés quand elle a été rouverte.
+    """
+    cnx = getattr(connection, '_cnx', connection)
+    curseurs = getattr(cnx, '_curseurs_prepares', None)
+    if curseurs is None or curseurs[0] != cnx.connection_id:
+        # Nouvelle session serveur: les instructions préparées de l'ancienne sont perdues
+        curseurs = cnx._curseurs_prepares = (cnx.connection_id, {})
+    curseur = curseurs[1].get(requete)
+    if curseur is None:
+        curseur = curseurs[1][requete] = cnx.cursor(prepared=True, dictionary=True)
+    return curseur
+
+
+def executer(connection, requete, parametres=()):
+    """Exécute une requête par son curseur préparé et renvoie le curseur"""
+    curseur = curseur_prepare(connection, requete)
+    curseur.execute(requete, parametres)
+    return curseur
+
+
+def iterer(connection, requete, parametres=(), taille_lot=1000):
+    """Parcourt un grand résultat par lots de taille_lot lignes, sans le charger en entier
+
+    Le curseur n'est pas bufferisé: les lignes arrivent du serveur au fil
+    de la lecture, et la connexion reste occupée jusqu'à la fin du parcours.
+    """
+    curseur = connection.cursor(dictionary=True, buffered=False)
+    try:
+        curseur.execute(requete, parametres)
+        lignes = curseur.fetchmany(taille_lot)
+        while lignes:
+            try:
+                yield from lignes
+            except GeneratorExit:
+                # Parcours interrompu: le reste du résultat doit être lu avant de réutiliser la connexion
+                while curseur.fetchmany(taille_lot):
+                    pass
+                raise
+            lignes = curseur.fetchmany(taille_lot)
+    finally:
+        curseur.close()
+
+
+class UserRepository:
+    """Requêtes sur la table users, par curseurs préparés réutilisés
+
+    stockage est un pool ou un superviseur (méthode connexion()), ou une
+    connexion MySQL directe comme celle de la CLI.
+    """
+
+    CHARGER = "SELECT id, username, password_hash FROM users WHERE username = %s"
+    EXISTE = "SELECT id FROM users WHERE username = %s"
+    CREER = "INSERT INTO users (username, password_hash) VALUES (%s, %s)"
+    MODIFIER_HASH = "UPDATE users SET password_hash = %s WHERE id = %s"
+    SUPPRIMER = "DELETE FROM users WHERE username = %s"
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+
+    def charger(self, username):
+        """Renvoie l'utilisateur (id, username, password_hash), ou None"""
+        with connexion(self.stockage) as connection:
+            lignes = executer(connection, self.CHARGER, (username,)).fetchall()
+        return lignes[0] if lignes else None
+
+    def existe(self, username):
+        with connexion(self.stockage) as connection:
+            return bool(executer(connection, self.EXISTE, (username,)).fetchall())
+
+    def creer(self, username, password_hash):
+        """Insère un utilisateur et renvoie son id"""
+        with connexion(self.stockage) as connection:
+            curseur = executer(connection, self.CREER, (username, password_hash))
+            connection.commit()
+            return curseur.lastrowid
+
+    def modifier_hash(self, user_id, password_hash):
+        with connexion(self.stockage) as connection:
+            executer(connection, self.MODIFIER_HASH, (password_hash, user_id))
+            connection.commit()
+
+    def supprimer(self, username):
+        with connexion(self.stockage) as connection:
+            executer(connection, self.SUPPRIMER, (username,))
+            connection.commit()
+
+    @staticmethod
+    def _debuter(connection):
+        # Les connexions du pool sont en autocommit: sans transaction explicite,
+        # chaque ligne serait validée aussitôt et rollback() n'annulerait rien.
+        # Une connexion directe déjà dans une transaction implicite la garde.
+        if not connection.in_transaction:
+            connection.start_transaction()
+
+    def creer_lot(self, lot):
+        """Insère des couples (username, password_hash) dans une transaction
+
+        Renvoie (ajoutes, doublons). Si la contrainte UNIQUE sur username
+        rejette le lot, il est annulé puis rejoué ligne par ligne, dans une
+        nouvelle transaction, pour isoler les doublons.
+        """
+        from mysql.connector import Error
+
+        with connexion(self.stockage) as connection:
+            cursor = connection.cursor()
+            try:
+                try:
+                    self._debuter(connection)
+                    cursor.executemany(self.CREER, lot)
+                    connection.commit()
+                    return len(lot), []
+                except Error as e:
+                    connection.rollback()
+                    if e.errno != ERREUR_DOUBLON:
+                        raise
+            finally:
+                cursor.close()
+
+            ajoutes = 0
+            doublons = []
+            # Un doublon n'annule que sa propre instruction, pas la transaction
+            self._debuter(connection)
+            for username, password_hash in lot:
+                try:
+                    executer(connection, self.CREER, (username, password_hash))
+                    ajoutes += 1
+                except Error as e:
+                    if e.errno != ERREUR_DOUBLON:
+                        connection.rollback()
+                        raise
+                    doublons.append(username)
+            connection.commit()
+            return ajoutes, doublons
+
+    def iterer(self, taille_lot=1000):
+        """Parcourt tous les utilisateurs (id, username, created_at) sans les charger en mémoire"""
+        with connexion(self.stockage) as connection:
+            yield from iterer(
+                connection,
+                "SELECT id, username, created_at FROM users ORDER BY id",
+                taille_lot=taille_lot
+            )
@@ -0,0 +1,334 @@
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from mysql.connector import Error, InterfaceError
+from mysql.connector.errors import OperationalError, PoolError
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
+
+from metrics import metriques
+
+
+class ConnectionPool(MySQLConnectionPool):
+    """Pool de connexions MySQL borné et partagé entre threads
+
+    Contrairement à MySQLConnectionPool, une connexion rendue récemment est
+    prêtée sans ping: le serveur n'est interrogé que si elle est restée
+    inactive plus de verif_apres secondes ou si sa dernière utilisation a
+    échoué. Au-delà de inactivite_max secondes, la connexion est évincée et
+    rouverte avant d'être prêtée. Quand toutes les connexions sont prises,
+    l'emprunt attend jusqu'à attente secondes au lieu d'échouer aussitôt.
+    """
+
+    def __init__(self, taille=5, attente=5.0, verif_apres=30.0, inactivite_max=300.0,
+                 pool_name="guardia", **config):
+        self.attente = attente
+        self.verif_apres = verif_apres
+        self.inactivite_max = inactivite_max
+        self._stats_lock = threading.Lock()
+        self._rendu = {}
+        self._a_verifier = set()
+        self._stats = {
+            'emprunts': 0,
+            'attentes': 0,
+            'expirations': 0,
+            'verifications': 0,
+            'reconnexions': 0,
+            'evictions': 0,
+            'attente_totale_ms': 0.0,
+        }
+        # Pas de reset de session au retour: les connexions sont en autocommit
+        super().__init__(pool_name=pool_name, pool_size=taille, pool_reset_session=False, **config)
+
+    def _compter(self, cle, valeur=1):
+        with self._stats_lock:
+            self._stats[cle] += valeur
+
+    def _queue_connection(self, cnx):
+        self._rendu[id(cnx)] = time.monotonic()
+        super()._queue_connection(cnx)
+
+    def get_connection(self):
+        """Emprunte une connexion, en attendant qu'une se libère si besoin"""
+        debut = time.monotonic()
+        try:
+            cnx = self._cnx_queue.get(block=False)
+        except queue.Empty:
+            self._compter('attentes')
+            try:
+                cnx = self._cnx_queue.get(timeout=self.attente)
+            except queue.Empty as err:
+                self._compter('expirations')
+                raise PoolError("Aucune connexion disponible dans le pool") from err
+        maintenant = time.monotonic()
+        self._compter('emprunts')
+        self._compter('attente_totale_ms', (maintenant - debut) * 1000)
+
+        inactif = maintenant - self._rendu.pop(id(cnx), maintenant)
+        try:
+            if self._config_version != cnx.pool_config_version:
+                cnx.config(**self._cnx_config)
+                cnx.reconnect()
+                cnx.pool_config_version = self._config_version
+            elif inactif > self.inactivite_max:
+                self._compter('evictions')
+                cnx.reconnect()
+            elif inactif > self.verif_apres or id(cnx) in self._a_verifier:
+                self._compter('verifications')
+                if not cnx.is_connected():
+                    self._compter('reconnexions')
+                    cnx.reconnect()
+        except InterfaceError:
+            # Reconnexion impossible: la connexion reste dans le pool, à vérifier
+            self._a_verifier.add(id(cnx))
+            super()._queue_connection(cnx)
+            raise
+        self._a_verifier.discard(id(cnx))
+        return PooledMySQLConnection(self, cnx)
+
+    @contextmanager
+    def connexion(self):
+        """Emprunte une connexion et la rend au pool en sortie de bloc
+
+        La durée du bloc, attente comprise, est mesurée sous db.requete.
+        """
+        with metriques.mesurer('db.requete'):
+            connection = self.get_connection()
+            cnx = connection._cnx
+            try:
+                yield connection
+            except Error:
+                # La connexion sera vérifiée avant son prochain prêt
+                self._a_verifier.add(id(cnx))
+                raise
+            finally:
+                connection.close()
+
+    def statistiques(self):
+        """Renvoie les compteurs du pool et le nombre de connexions libres"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['taille'] = self.pool_size
+        stats['disponibles'] = self._cnx_queue.qsize()
+        stats['en_cours'] = self.pool_size - stats['disponibles']
+        return stats
+
+
+class BaseIndisponible(Error):
+    """Levée sans toucher au serveur tant que le disjoncteur est ouvert"""
+
+
+def est_panne(erreur):
+    """Indique si une erreur MySQL signale un serveur injoignable plutôt qu'une requête refusée"""
+    # Les erreurs client 2xxx (2003, 2006, 2013...) sont des pertes de connexion
+    return isinstance(erreur, (InterfaceError, OperationalError)) or 2000 <= (erreur.errno or 0) < 3000
+
+
+class ConnectionSupervisor:
+    """Disjoncteur devant le pool: échoue aussitôt tant que la base est en panne
+
+    La santé de la base se lit sur les requêtes réelles, sans ping
+    périodique. Après seuil_echecs pannes consécutives (ou dès la première
+    si le pool n'a jamais pu être créé), le disjoncteur s'ouvre: connexion()
+    lève BaseIndisponible sans attendre le serveur. Un seul essai est tenté
+    à l'échéance, par un minuteur ou par la première requête venue; chaque
+    échec double le délai, jusqu'à delai_max, avec une part aléatoire pour
+    que les postes ne se reconnectent pas tous en même temps. notifier est
+    appelé avec etat() à chaque changement d'état.
+    """
+
+    FERME, OUVERT, SEMI_OUVERT = 'ferme', 'ouvert', 'semi_ouvert'
+
+    # pywebview parcourt les attributs de js_api: le superviseur ne doit pas être exposé
+    _serializable = False
+
+    def __init__(self, fabrique, seuil_echecs=3, delai_min=1.0, delai_max=60.0, notifier=None):
+        self.fabrique = fabrique
+        self.seuil_echecs = seuil_echecs
+        self.delai_min = delai_min
+        self.delai_max = delai_max
+        self.notifier = notifier
+        self.pool = None
+        self.etat_disjoncteur = self.FERME
+        self.derniere_erreur = None
+        self._lock = threading.Lock()
+        self._creation = threading.Lock()
+        self._echecs = 0
+        self._ouvertures = 0
+        self._prochain_essai = 0.0
+        self._minuteur = None
+        self._ferme = False
+        self._stats = {'ouvertures': 0, 'rejets': 0, 'essais': 0}
+
+    def _autoriser(self):
+        """Laisse passer une requête, ou lève BaseIndisponible si le disjoncteur est ouvert
+
+        Renvoie True si la requête sert d'essai de reconnexion.
+        """
+        with self._lock:
+            if self.etat_disjoncteur == self.FERME:
+                return False
+            if self.etat_disjoncteur == self.OUVERT and time.monotonic() >= self._prochain_essai:
+                # Une seule requête sert d'essai; les autres échouent pendant ce temps
+                self.etat_disjoncteur = self.SEMI_OUVERT
+                self._stats['essais'] += 1
+                changement = True
+            else:
+                self._stats['rejets'] += 1
+                changement = False
+                if self.etat_disjoncteur == self.SEMI_OUVERT:
+                    message = "Reconnexion à la base de données en cours"
+                else:
+                    attente = max(self._prochain_essai - time.monotonic(), 0)
+                    message = f"Base de données indisponible, nouvel essai dans {attente:.0f} s"
+        if changement:
+            self._notifier()
+            return True
+        metriques.incrementer('db.rejets')
+        raise BaseIndisponible(msg=message)
+
+    def _succes(self):
+        with self._lock:
+            self._echecs = 0
+            if self.etat_disjoncteur == self.FERME:
+                return
+            self.etat_disjoncteur = self.FERME
+            self._ouvertures = 0
+            self.derniere_erreur = None
+        self._notifier()
+
+    def _abandonner(self):
+        """Rend la place de l'essai interrompu sans verdict: la requête suivante le refait"""
+        with self._lock:
+            if self.etat_disjoncteur != self.SEMI_OUVERT:
+                return
+            self.etat_disjoncteur = self.OUVERT
+            self._prochain_essai = time.monotonic()
+        self._notifier()
+
+    def _echec(self, erreur, sans_pool=False):
+        with self._lock:
+            self.derniere_erreur = str(erreur)
+            self._echecs += 1
+            if self.etat_disjoncteur == self.OUVERT:
+                # Requête partie avant l'ouverture: l'échéance est déjà fixée
+                return
+            if (self.etat_disjoncteur == self.FERME and not sans_pool
+                    and self._echecs < self.seuil_echecs):
+                return
+            # Backoff exponentiel, tiré entre la moitié et la totalité du délai
+            delai = min(self.delai_max, self.delai_min * 2 ** self._ouvertures)
+            delai *= random.uniform(0.5, 1.0)
+            self._ouvertures += 1
+            self._stats['ouvertures'] += 1
+            self.etat_disjoncteur = self.OUVERT
+            self._prochain_essai = time.monotonic() + delai
+            self._planifier(delai)
+        metriques.incrementer('db.disjoncteur.ouvert')
+        print(f"Base de données indisponible ({erreur}), nouvel essai dans {delai:.1f} s")
+        self._notifier()
+
+    def _planifier(self, delai):
+        """Programme l'essai suivant, pour que l'interface apprenne le retour de la base"""
+        if self._minuteur:
+            self._minuteur.cancel()
+        if self._ferme:
+            return
+        self._minuteur = threading.Timer(delai, self.verifier)
+        self._minuteur.daemon = True
+        self._minuteur.start()
+
+    def _notifier(self):
+        if self.notifier:
+            try:
+                self.notifier(self.etat())
+            except Exception as e:
+                print(f"Erreur lors de la notification de l'état de la base: {e}")
+
+    def _pool(self):
+        if self.pool is None:
+            with self._creation:
+                if self.pool is None:
+                    self.pool = self.fabrique()
+        return self.pool
+
+    @contextmanager
+    def connexion(self):
+        """Emprunte une connexion du pool, en échouant aussitôt si la base est en panne
+
+        Seules les pannes de serveur comptent pour le disjoncteur: une
+        requête refusée (doublon, syntaxe) prouve que la base répond. Un
+        essai interrompu par une autre exception ne laisse pas le disjoncteur
+        semi-ouvert: sa place est rendue.
+        """
+        essai = self._autoriser()
+        try:
+            try:
+                pool = self._pool()
+            except Error as e:
+                self._echec(e, sans_pool=True)
+                raise
+            try:
+                with pool.connexion() as connection:
+                    yield connection
+            except Error as e:
+                if est_panne(e):
+                    self._echec(e)
+                else:
+                    self._succes()
+                raise
+        except Error:
+            raise
+        except BaseException:
+            # Erreur de l'appelant, interruption ou générateur fermé: rien n'est appris de la base
+            if essai:
+                self._abandonner()
+            raise
+        self._succes()
+
+    def verifier(self):
+        """Tente un emprunt de connexion; renvoie True si la base répond"""
+        try:
+            with self.connexion():
+                return True
+        except Error:
+            return False
+
+    def disponible(self):
+        """Indique, sans toucher au serveur, si les requêtes sont laissées passer"""
+        return self.etat_disjoncteur == self.FERME
+
+    def etat(self):
+        """Renvoie l'état du disjoncteur sous une forme envoyable à la page"""
+        with self._lock:
+            etat = self.etat_disjoncteur
+            attente = max(self._prochain_essai - time.monotonic(), 0)
+            erreur = self.derniere_erreur
+        if etat == self.FERME:
+            return {'etat': 'connecte', 'message': "Base de données connectée"}
+        if etat == self.SEMI_OUVERT:
+            return {'etat': 'connexion', 'message': "Reconnexion à la base de données..."}
+        return {
+            'etat': 'erreur',
+            'message': f"Base de données injoignable, nouvel essai dans {attente:.0f} s",
+            'erreur': erreur,
+            'prochain_essai_s': round(attente, 1)
+        }
+
+    def statistiques(self):
+        """Renvoie l'état du disjoncteur et, une fois créé, les compteurs du pool"""
+        with self._lock:
+            stats = dict(self._stats, disjoncteur=self.etat_disjoncteur, echecs_consecutifs=self._echecs)
+        if self.pool is not None:
+            stats['pool'] = self.pool.statistiques()
+        return stats
+
+    def fermer(self):
+        """Annule l'essai programmé"""
+        with self._lock:
+            self._ferme = True
+            if self._minuteur:
+                self._minuteur.cancel()
+                self._minuteur = None
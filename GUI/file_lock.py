@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """Verrou exclusif partagé entre processus, posé sur un fichier annexe
+
+    Utilise flock sous POSIX et msvcrt.locking sous Windows. Le verrou est
+    consultatif: seuls les processus qui le prennent sont coordonnés. Un
+    verrou de thread réentrant le double, car le verrou système est porté
+    par le descripteur et ne sépare pas les threads d'un même processus.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._thread_lock = threading.RLock()
+        self._profondeur = 0
+        self._fichier = open(chemin, 'a+b')
+
+    def _verrouiller(self):
+        if os.name == 'nt':
+            self._fichier.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._fichier.fileno(), msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    time.sleep(0.001)
+        fcntl.flock(self._fichier.fileno(), fcntl.LOCK_EX)
+
+    def _deverrouiller(self):
+        if os.name == 'nt':
+            self._fichier.seek(0)
+            msvcrt.locking(self._fichier.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._fichier.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def exclusif(self):
+        """Garde le verrou pour la durée du bloc, en attendant qu'il se libère"""
+        with self._thread_lock:
+            if self._profondeur == 0:
+                self._verrouiller()
+            self._profondeur += 1
+            try:
+                yield
+            finally:
+                self._profondeur -= 1
+                if self._profondeur == 0:
+                    self._deverrouiller()
+
+    def fermer(self):
+        self._fichier.close()
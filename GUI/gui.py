@@ -1,28 +1,123 @@
+import time
+# Référence du temps de démarrage, avant les imports coûteux
+DEBUT = time.perf_counter()
+
 import webview
 from pathlib import Path
-import mysql.connector
-from mysql.connector import Error
-import bcrypt
-import threading
-import time
 import json
 import csv
-import os
-from flask import Flask, render_template_string, request, jsonify
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from product_store import ProductStore, convertir_entier, convertir_prix
+from hashing import PasswordHasher
+from template_cache import TemplateCache
+from data_access import ERREUR_DOUBLON, UserRepository, creer_pool
+from metrics import metriques
+from sessions import SessionManager
+
+# mysql.connector, db_pool et product_db ne sont importés qu'au premier besoin,
+# hors du chemin d'affichage de la fenêtre
+
+
+class StoreDiffere:
+    """Stockage des produits ouvert en arrière-plan, attendu au premier usage"""
+
+    # pywebview parcourt les attributs de js_api: il ne doit pas attendre ni exposer le stockage
+    _serializable = False
+
+    def __init__(self, ouverture):
+        self._ouverture = ouverture
+
+    def __getattr__(self, nom):
+        return getattr(self._ouverture.result(), nom)
+
+    def __len__(self):
+        return len(self._ouverture.result())
+
+    def __contains__(self, id_produit):
+        return id_produit in self._ouverture.result()
+
+    def cible(self):
+        """Renvoie le stockage réel, une fois ouvert"""
+        return self._ouverture.result()
+
 
 class WebViewApp:
-    def __init__(self):
+    def __init__(self, hash_mode='thread', hash_workers=None, recharger_templates=False, stockage='fichier'):
+        if stockage not in ('fichier', 'mysql'):
+            raise ValueError(f"Stockage inconnu: {stockage}")
         self.window = None
         self.base_path = Path(__file__).parent
-        self.css_path = self.base_path / "style.css"
-        self.css_text = self.css_path.read_text(encoding="utf-8") if self.css_path.exists() else ""
+        # Pages compilées une fois; recharger_templates suit les modifications sur disque
+        self.templates = TemplateCache(self.base_path, verifier_mtime=recharger_templates)
         self.current_page = "login"
-        self.connection = self.connect_to_db()
+        # Les calculs bcrypt s'exécutent hors du thread de l'API JavaScript
+        self.hasher = PasswordHasher(hash_mode, hash_workers)
         self.produits_file = self.base_path / "caca.csv"
         self.ensure_produits_file()
-        self._stop_event = threading.Event()
-        self._check_thread = None
+
+        # Connexion MySQL et ouverture du journal en arrière-plan: la fenêtre
+        # s'affiche sans les attendre
+        self.db = None
+        # Session ouverte par la dernière connexion réussie; privés, donc hors de js_api
+        self._sessions = None
+        self._jeton = None
+        self._utilisateurs = None
+        self.etat_db = {'etat': 'connexion', 'message': "Connexion à la base de données..."}
+        self._demarrage = ThreadPoolExecutor(max_workers=2, thread_name_prefix='demarrage')
+        self._connexion = self._demarrage.submit(self._connecter)
+        self.store = StoreDiffere(self._demarrage.submit(self._ouvrir_store, stockage))
+    
+    def _ouvrir_store(self, stockage):
+        if stockage == 'mysql':
+            from product_db import MySQLProductStore
+
+            # Table products partagée entre postes, derrière le disjoncteur. Base
+            # indisponible: les appels échouent (BaseIndisponible) et l'état est
+            # affiché par etat_connexion pendant que le superviseur réessaie; pas de
+            # repli silencieux sur un journal local qui divergerait du catalogue partagé
+            db = self._connexion.result()
+            if not db.disponible():
+                print("Base de données indisponible: les produits seront accessibles à la reconnexion")
+            return MySQLProductStore(db)
+        # Journal des produits, initialisé depuis le CSV au premier lancement
+        return ProductStore(self.base_path / "produits.log", source_csv=self.produits_file)
+    
+    def _connecter(self):
+        """Première connexion, faite en arrière-plan; l'état est envoyé à la page"""
+        from db_pool import ConnectionSupervisor
+
+        db = ConnectionSupervisor(self.connect_to_db, notifier=self._changer_etat_db)
+        self.db = db
+        self._utilisateurs = UserRepository(db)
+        self._sessions = SessionManager(db)
+        with metriques.mesurer('demarrage.connexion_db'):
+            if db.verifier():
+                self._sessions.purger()
+        self._changer_etat_db(db.etat())
+        return db
+    
+    def _changer_etat_db(self, etat):
+        self.etat_db = etat
+        self._envoyer_etat_db()
+    
+    def _envoyer_etat_db(self):
+        if not self.window:
+            # La page lira l'état avec etat_connexion() une fois chargée
+            return
+        try:
+            self.window.evaluate_js(
+                f"window.afficherEtatBase && window.afficherEtatBase({json.dumps(self.etat_db)})"
+            )
+        except Exception as e:
+            print(f"Impossible d'envoyer l'état de la base à la page: {e}")
+    
+    def etat_connexion(self):
+        """Appelé depuis JavaScript: état de la connexion MySQL, mis à jour à chaque changement"""
+        return self.etat_db
+    
+    def _base(self):
+        """Attend la fin de la connexion du démarrage et renvoie le superviseur"""
+        return self._connexion.result()
     
     def ensure_produits_file(self):
         """Crée le fichier CSV s'il n'existe pas"""
@@ -31,71 +126,31 @@ class WebViewApp:
                 writer = csv.writer(f)
                 writer.writerow(['id', 'nom', 'prix', 'quantite', 'categorie', 'date_ajout'])
     
-    def is_connection_alive(self, connection):
-        """Vérifie si la connexion à la base de données est toujours active"""
-        try:
-            if connection is None or not connection.is_connected():
-                return False
-            # Exécuter une requête simple pour vérifier la connexion
-            cursor = connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            cursor.close()
-            return True
-        except (Error, mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError):
-            return False
+    def connect_to_db(self, pool_size=5):
+        """Crée le pool de connexions MySQL, en une seule tentative
 
-    def connect_to_db(self, max_retries=3, retry_delay=2):
-        """Établit une connexion à la base de données MySQL avec gestion des tentatives"""
-        last_error = None
-        for attempt in range(max_retries):
-            try:
-                connection = mysql.connector.connect(
-                    host="localhost",
-                    user="root",
-                    password="",
-                    database="db",
-                    connection_timeout=5,
-                    charset='utf8mb4',
-                    collation='utf8mb4_unicode_ci',
-                    autocommit=True
-                )
-                
-                if connection.is_connected():
-                    print(f"Connexion à la base de données réussie (tentative {attempt + 1}/{max_retries})")
-                    return connection
-                
-            except Error as e:
-                last_error = e
-                print(f"Tentative de connexion {attempt + 1}/{max_retries} échouée: {str(e)}")
-                if attempt < max_retries - 1:  # Ne pas attendre après la dernière tentative
-                    import time
-                    time.sleep(retry_delay)
-        
-        # Si on arrive ici, toutes les tentatives ont échoué
-        error_msg = f"Impossible de se connecter à la base de données après {max_retries} tentatives"
-        if last_error:
-            error_msg += f": {str(last_error)}"
-        print(error_msg)
-        
-        # Afficher un message à l'utilisateur
-        if hasattr(self, 'window') and self.window:
-            try:
-                self.window.evaluate_js(f"""
-                    alert('Erreur de connexion à la base de données. Assurez-vous que MySQL est en cours d\'exécution et que les paramètres de connexion sont corrects.\n\nDétails: {error_msg}');
-                """)
-            except:
-                pass
-                
-        return None
+        Les nouvelles tentatives, espacées par un backoff exponentiel, sont
+        gérées par le ConnectionSupervisor.
+        """
+        pool = creer_pool(pool_size)
+        print("Connexion à la base de données réussie")
+        return pool
 
     def hash_password(self, password):
         """Hash le mot de passe avec bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return self.hash_password_async(password).result()
+
+    def hash_password_async(self, password):
+        """Renvoie un Future résolu avec le hash bcrypt du mot de passe"""
+        return self.hasher.hacher(password)
 
     def verify_password(self, stored_password, provided_password):
         """Vérifie si le mot de passe fourni correspond au hash stocké"""
-        return bcrypt.checkpw(provided_password.encode('utf-8'), stored_password.encode('utf-8'))
+        return self.verify_password_async(stored_password, provided_password).result()
+
+    def verify_password_async(self, stored_password, provided_password):
+        """Renvoie un Future résolu avec le résultat de la vérification bcrypt"""
+        return self.hasher.verifier(stored_password, provided_password)
     
     def main_window(self):
         """Crée et affiche la fenêtre principale"""
@@ -110,11 +165,40 @@ class WebViewApp:
             def supprimer_produit(self, id_produit):
                 return self.app.supprimer_produit(id_produit)
             
+            def get_produit(self, id_produit):
+                return self.app.get_produit(id_produit)
+            
             def charger_produits(self):
                 return self.app.charger_produits()
             
+            def changements_depuis(self, version=None):
+                return self.app.changements_depuis(version)
+            
+            def agregats(self, recalculer=False):
+                return self.app.agregats(recalculer)
+            
+            def rechercher_produits(self, requete, limit=20):
+                return self.app.rechercher_produits(requete, limit)
+            
+            def requeter_produits(self, offset=0, limit=50, categorie=None, prix_min=None, prix_max=None,
+                                  quantite_min=None, quantite_max=None, tri='id', decroissant=False):
+                return self.app.requeter_produits(offset, limit, categorie, prix_min, prix_max,
+                                                  quantite_min, quantite_max, tri, decroissant)
+            
             def sauvegarder_produits(self, produits):
                 return self.app.sauvegarder_produits(produits)
+            
+            def ajouter_produits(self, produits):
+                return self.app.ajouter_produits(produits)
+            
+            def supprimer_produits(self, ids):
+                return self.app.supprimer_produits(ids)
+            
+            def modifier_produits(self, modifications):
+                return self.app.modifier_produits(modifications)
+            
+            def diagnostics(self):
+                return self.app.diagnostics()
         
         # Créer l'instance de l'API
         api = API(self)
@@ -133,310 +217,305 @@ class WebViewApp:
         webview.start(debug=True)
     
     # Méthodes pour la gestion des produits
+    @metriques.chronometre('api.ajouter_produit')
     def ajouter_produit(self, nom, prix, quantite, categorie=""):
-        """Ajoute un nouveau produit au fichier CSV"""
-        produits = self.charger_produits()
-        nouveau_produit = {
-            'id': len(produits) + 1,
-            'nom': nom,
-            'prix': float(prix),
-            'quantite': int(quantite),
-            'categorie': categorie,
-            'date_ajout': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        produits.append(nouveau_produit)
-        self.sauvegarder_produits(produits)
-        return nouveau_produit
+        """Ajoute un nouveau produit au journal des produits"""
+        return self.store.creer(nom, prix, quantite, categorie)
     
+    @metriques.chronometre('api.supprimer_produit')
     def supprimer_produit(self, id_produit):
-        """Supprime un produit par son ID"""
-        produits = self.charger_produits()
-        produits = [p for p in produits if p['id'] != id_produit]
-        return self.sauvegarder_produits(produits)
+        """Supprime un produit par son ID, renvoie False s'il n'existe pas"""
+        return self.store.supprimer(int(id_produit))
+    
+    @metriques.chronometre('api.get_produit')
+    def get_produit(self, id_produit):
+        """Renvoie un produit par son ID, ou None s'il n'existe pas"""
+        return self.store.get(int(id_produit))
     
+    @metriques.chronometre('api.charger_produits')
     def charger_produits(self):
-        """Charge tous les produits depuis le fichier CSV"""
-        if not self.produits_file.exists():
-            return []
-        
-        with open(self.produits_file, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            return [{
-                'id': int(row['id']),
-                'nom': row['nom'],
-                'prix': float(row['prix']),
-                'quantite': int(row['quantite']),
-                'categorie': row['categorie'],
-                'date_ajout': row.get('date_ajout', '')
-            } for row in reader]
+        """Charge tous les produits, convertis en dictionnaires depuis la table du store"""
+        return self.store.tous()
+    
+    @metriques.chronometre('api.changements_depuis')
+    def changements_depuis(self, version=None):
+        """Renvoie les produits ajoutés, modifiés ou supprimés depuis une version
+
+        Sans version, ou si elle est trop ancienne, la réponse contient tout le
+        catalogue avec 'complet': True; le client garde 'version' pour l'appel suivant.
+        """
+        return self.store.changements_depuis(None if version is None else int(version))
+    
+    @metriques.chronometre('api.rechercher_produits')
+    def rechercher_produits(self, requete, limit=20):
+        """Recherche des produits par début de mots du nom ou de la catégorie, sans tenir compte des accents"""
+        return self.store.rechercher(str(requete), int(limit))
+    
+    @metriques.chronometre('api.agregats')
+    def agregats(self, recalculer=False):
+        """Renvoie les totaux d'inventaire (nombre, quantité, valeur du stock) par catégorie"""
+        return self.store.agregats(bool(recalculer))
+    
+    @metriques.chronometre('api.requeter_produits')
+    def requeter_produits(self, offset=0, limit=50, categorie=None, prix_min=None, prix_max=None,
+                          quantite_min=None, quantite_max=None, tri='id', decroissant=False):
+        """Renvoie une page de produits filtrés et triés, avec le nombre total de résultats"""
+        filtres = {}
+        if categorie:
+            filtres['categorie'] = (categorie, categorie)
+        if prix_min is not None or prix_max is not None:
+            filtres['prix'] = (
+                None if prix_min is None else float(prix_min),
+                None if prix_max is None else float(prix_max)
+            )
+        if quantite_min is not None or quantite_max is not None:
+            filtres['quantite'] = (
+                None if quantite_min is None else int(quantite_min),
+                None if quantite_max is None else int(quantite_max)
+            )
+        try:
+            return self.store.requeter(int(offset), int(limit), filtres, tri, bool(decroissant))
+        except ValueError as e:
+            print(f"Erreur lors de la requête des produits: {e}")
+            return {'total': 0, 'produits': []}
     
+    @metriques.chronometre('api.sauvegarder_produits')
     def sauvegarder_produits(self, produits):
-        """Sauvegarde la liste des produits dans le fichier CSV"""
+        """Remplace l'ensemble des produits du journal"""
         try:
-            with open(self.produits_file, 'w', newline='', encoding='utf-8') as f:
-                if produits:
-                    champs = list(produits[0].keys())
-                    writer = csv.DictWriter(f, fieldnames=champs)
-                    writer.writeheader()
-                    writer.writerows(produits)
+            self.store.remplacer(produits)
             return True
         except Exception as e:
             print(f"Erreur lors de la sauvegarde: {e}")
             return False
     
+    @staticmethod
+    def _valider_champs(donnees, obligatoires):
+        """Convertit les champs modifiables d'un produit venu de JavaScript"""
+        manquants = [champ for champ in obligatoires if champ not in donnees]
+        if manquants:
+            raise ValueError(f"Champs manquants: {', '.join(manquants)}")
+        champs = {}
+        if 'nom' in donnees:
+            champs['nom'] = str(donnees['nom']).strip()
+            if not champs['nom']:
+                raise ValueError("Le nom est vide")
+        if 'prix' in donnees:
+            champs['prix'] = convertir_prix(donnees['prix'])
+        if 'quantite' in donnees:
+            champs['quantite'] = convertir_entier(donnees['quantite'], 'quantite')
+        if 'categorie' in donnees:
+            champs['categorie'] = str(donnees['categorie'] or '')
+        return champs
+    
+    def _appliquer_lot(self, elements, valider, appliquer):
+        """Valide chaque élément, applique les valides en une seule écriture
+        et renvoie un résultat {'ok': ..., 'produit' ou 'erreur': ...} par élément"""
+        resultats = [None] * len(elements)
+        valides = []
+        for position, element in enumerate(elements):
+            try:
+                valides.append((position, valider(element)))
+            except (KeyError, TypeError, ValueError) as e:
+                resultats[position] = {'ok': False, 'erreur': str(e)}
+        try:
+            sorties = appliquer([valeur for _, valeur in valides]) if valides else []
+        except Exception as e:
+            print(f"Erreur lors de l'écriture groupée: {e}")
+            sorties = [e] * len(valides)
+        for (position, _), sortie in zip(valides, sorties):
+            if isinstance(sortie, Exception):
+                resultats[position] = {'ok': False, 'erreur': str(sortie)}
+            elif sortie is None:
+                resultats[position] = {'ok': False, 'erreur': "Produit introuvable"}
+            else:
+                resultats[position] = {'ok': True, 'produit': sortie}
+        return resultats
+    
+    @metriques.chronometre('api.ajouter_produits')
+    def ajouter_produits(self, produits):
+        """Crée plusieurs produits en une seule écriture, avec un résultat par produit"""
+        return self._appliquer_lot(
+            produits,
+            lambda p: self._valider_champs(p, ('nom', 'prix', 'quantite')),
+            self.store.creer_lot
+        )
+    
+    @metriques.chronometre('api.supprimer_produits')
+    def supprimer_produits(self, ids):
+        """Supprime plusieurs produits en une seule écriture, avec un résultat par ID"""
+        def supprimer(ids):
+            return [{'id': i} if ok else None for i, ok in zip(ids, self.store.supprimer_lot(ids))]
+        return self._appliquer_lot(ids, int, supprimer)
+    
+    @metriques.chronometre('api.modifier_produits')
+    def modifier_produits(self, modifications):
+        """Modifie plusieurs produits en une seule écriture, avec un résultat par modification"""
+        return self._appliquer_lot(
+            modifications,
+            lambda m: dict(self._valider_champs(m, ('id',)), id=convertir_entier(m['id'], 'id')),
+            self.store.modifier_lot
+        )
+    
     def register_user(self, username, password):
         """Enregistre un nouvel utilisateur dans MySQL"""
-        if not self.connection:
-            return False, "Erreur de connexion à la base de données"
+        self._base()
+        from mysql.connector import Error
             
         try:
-            cursor = self.connection.cursor()
-            
             # Vérifier si l'utilisateur existe déjà
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
+            if self._utilisateurs.existe(username):
                 return False, "Ce nom d'utilisateur est déjà pris"
             
-            # Hachage du mot de passe
+            # Hachage du mot de passe, sans garder de connexion empruntée pendant bcrypt
             hashed_password = self.hash_password(password)
-            
-            # Insérer le nouvel utilisateur
-            cursor.execute(
-                "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
-                (username, hashed_password)
-            )
-            
-            self.connection.commit()
+            self._utilisateurs.creer(username, hashed_password)
             return True, "Compte créé avec succès"
             
         except Error as e:
-            self.connection.rollback()
+            if e.errno == ERREUR_DOUBLON:
+                # Inscrit entre-temps depuis un autre poste
+                return False, "Ce nom d'utilisateur est déjà pris"
             return False, f"Erreur lors de l'enregistrement: {str(e)}"
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
     
-    def check_connection(self):
-        """Vérifie périodiquement la connexion à la base de données"""
-        if not self.is_connection_alive(self.connection):
-            print("Vérification de la connexion: reconnexion nécessaire")
-            self.connection = self.connect_to_db()
-        return self.connection is not None
-        
-    def _check_connection_loop(self, interval=60):
-        """Boucle de vérification de la connexion dans un thread séparé"""
-        while not self._stop_event.is_set():
-            self.check_connection()
-            # Attendre l'intervalle spécifié ou jusqu'à ce qu'on nous dise d'arrêter
-            self._stop_event.wait(interval)
-    
-    def start_connection_check(self, interval=60):
-        """Démarre la vérification périodique de la connexion"""
-        # Arrêter le thread précédent s'il existe
-        self.stop_connection_check()
-        
-        # Démarrer un nouveau thread de vérification
-        self._stop_event.clear()
-        self._check_thread = threading.Thread(
-            target=self._check_connection_loop,
-            args=(interval,),
-            daemon=True
-        )
-        self._check_thread.start()
+    def diagnostics(self):
+        """Renvoie les durées et compteurs mesurés, l'état du pool et du journal"""
+        return {
+            'metriques': metriques.resume(),
+            'pool': self.statistiques_db(),
+            'store': {
+                'produits': len(self.store),
+                'version': self.store.version,
+                'type': type(self.store.cible()).__name__
+            }
+        }
+    
+    def statistiques_db(self):
+        """Renvoie les statistiques du pool de connexions, ou None sans base"""
+        return self.db.statistiques() if self.db else None
     
-    def stop_connection_check(self):
-        """Arrête la vérification périodique de la connexion"""
-        if hasattr(self, '_stop_event'):
-            self._stop_event.set()
-        if hasattr(self, '_check_thread') and self._check_thread:
-            self._check_thread.join(timeout=1.0)
-            self._check_thread = None
+    def check_connection(self):
+        """Vérifie la connexion à la base de données à la demande
+
+        Tant que le disjoncteur est ouvert, renvoie False sans toucher au serveur.
+        """
+        if not self._connexion.done():
+            # La connexion du démarrage est encore en cours
+            return False
+        return self._base().verifier()
     
     def authenticate_user(self, username, password):
         """Authentifie un utilisateur avec MySQL"""
-        cursor = None
-        try:
-            # Vérifier si la connexion est toujours active
-            if not self.is_connection_alive(self.connection):
-                print("La connexion à la base de données est perdue, tentative de reconnexion...")
-                self.connection = self.connect_to_db()
-                if not self.connection:
-                    return False, "Impossible de se connecter à la base de données"
-
-            cursor = self.connection.cursor(dictionary=True)
-            
-            # Récupérer l'utilisateur
-            cursor.execute(
-                "SELECT id, username, password_hash FROM users WHERE username = %s",
-                (username,)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                return False, "Nom d'utilisateur ou mot de passe incorrect"
-            
-            # Vérifier le mot de passe
+        return self.authenticate_user_async(username, password).result()
+
+    def _charger_utilisateur(self, username):
+        """Récupère un utilisateur par son nom, renvoie (utilisateur, erreur)"""
+        self._base()
+        from mysql.connector import Error
+        from db_pool import BaseIndisponible, est_panne
+
+        # Une seconde tentative suffit: le pool vérifie la connexion qui a échoué
+        for attempt in range(2):
+            try:
+                return self._utilisateurs.charger(username), None
+            except BaseIndisponible as e:
+                # Disjoncteur ouvert: inutile d'attendre le serveur
+                return None, str(e)
+            except Error as e:
+                print(f"Erreur d'authentification: {e}")
+                if not est_panne(e):
+                    break
+        return None, "Erreur de connexion à la base de données"
+
+    def authenticate_user_async(self, username, password):
+        """Authentifie un utilisateur, renvoie un Future résolu en (succès, message)
+
+        La lecture de l'utilisateur se fait dans le thread appelant; seule la
+        vérification bcrypt est confiée au pool de hachage.
+        """
+        resultat = Future()
+        user, erreur = self._charger_utilisateur(username)
+        if erreur:
+            resultat.set_result((False, erreur))
+            return resultat
+        if not user:
+            resultat.set_result((False, "Nom d'utilisateur ou mot de passe incorrect"))
+            return resultat
+
+        def terminer(verification):
             try:
-                if not self.verify_password(user['password_hash'], password):
-                    return False, "Nom d'utilisateur ou mot de passe incorrect"
+                if not verification.result():
+                    resultat.set_result((False, "Nom d'utilisateur ou mot de passe incorrect"))
+                    return
+                # Les navigations suivantes vérifient ce jeton au lieu de refaire bcrypt
+                self._jeton = self._sessions.creer(user['id'], user['username'])
             except Exception as e:
                 print(f"Erreur lors de la vérification du mot de passe: {e}")
-                return False, "Erreur d'authentification"
-            
-            return True, "Connexion réussie"
-            
-        except Error as e:
-            print(f"Erreur d'authentification: {e}")
-            # Tenter de se reconnecter une fois
+                resultat.set_result((False, "Erreur d'authentification"))
+                return
+            resultat.set_result((True, "Connexion réussie"))
+            # La connexion est acquise: un échec de la mise à niveau du hash ne la remet pas en cause
             try:
-                self.connection = self.connect_to_db()
-                if self.connection:
-                    return self.authenticate_user(username, password)  # Réessayer une fois
-            except Exception as e2:
-                print(f"Échec de la reconnexion: {e2}")
-            return False, "Erreur de connexion à la base de données"
-        finally:
-            if cursor:
-                cursor.close()
+                if self.hasher.doit_rehacher(user['password_hash']):
+                    self._rehacher(user['id'], password)
+            except Exception as e:
+                print(f"Erreur lors de la mise à jour du hash: {e}")
+
+        self.verify_password_async(user['password_hash'], password).add_done_callback(terminer)
+        return resultat
     
+    def _rehacher(self, user_id, password):
+        """Recalcule en arrière-plan le hash d'un utilisateur au coût calibré"""
+        def enregistrer(hachage):
+            try:
+                self._utilisateurs.modifier_hash(user_id, hachage.result())
+            except Exception as e:
+                print(f"Erreur lors de la mise à jour du hash: {e}")
+
+        self.hash_password_async(password).add_done_callback(enregistrer)
+    
+    def session_courante(self):
+        """Renvoie la session de l'utilisateur connecté, ou None"""
+        if self._jeton is None:
+            return None
+        return self._sessions.verifier(self._jeton)
+    
+    @metriques.chronometre('api.utilisateur_courant')
+    def utilisateur_courant(self):
+        """Appelé depuis JavaScript: nom de l'utilisateur connecté, ou None"""
+        session = self.session_courante()
+        return session['username'] if session else None
+    
+    @metriques.chronometre('api.deconnexion')
+    def deconnexion(self):
+        """Appelé depuis JavaScript: révoque la session et revient à la page de connexion"""
+        jeton, self._jeton = self._jeton, None
+        if jeton:
+            self._sessions.revoquer(jeton)
+        if self.window:
+            self.navigate('login')
+        return {"success": True}
+    
+    @metriques.chronometre('template.load')
     def load_template(self, template_name):
-        """Charge un template HTML et injecte le CSS"""
-        template_path = self.base_path / f"{template_name}.html"
-        html_text = template_path.read_text(encoding="utf-8")
-        
-        # Ajouter le code JavaScript directement dans le HTML
-        js_code = """
-        <script>
-        // Gestion des clics sur les liens
-        document.addEventListener('DOMContentLoaded', function() {
-            // Gestion de la soumission du formulaire d'inscription
-            const registerForm = document.getElementById('registerForm');
-            if (registerForm) {
-                registerForm.addEventListener('submit', function(e) {
-                    e.preventDefault();
-                    const username = document.getElementById('username').value;
-                    const password = document.getElementById('password').value;
-                    
-                    window.pywebview.api.handle_register(username, password).then(function(response) {
-                        const messageDiv = document.getElementById('message');
-                        messageDiv.textContent = response.message;
-                        messageDiv.className = response.success ? 'success' : 'error';
-                        messageDiv.style.display = 'block';
-                        
-                        if (response.success) {
-                            // Rediriger vers la page de connexion après un court délai
-                            setTimeout(function() {
-                                window.pywebview.api.navigate('login');
-                            }, 1500);
-                        }
-                    });
-                });
-            }
-            
-            // Gestion de la soumission du formulaire de connexion
-            const loginForm = document.getElementById('loginForm');
-            if (loginForm) {
-                loginForm.addEventListener('submit', function(e) {
-                    e.preventDefault();
-                    const username = document.getElementById('username').value;
-                    const password = document.getElementById('password').value;
-                    const loginBtn = document.getElementById('loginBtn');
-                    const progress = document.getElementById('progress');
-                    
-                    loginBtn.disabled = true;
-                    loginBtn.textContent = 'Connexion...';
-                    progress.style.display = 'block';
-                    
-                    window.pywebview.api.handle_login(username, password).then(function(response) {
-                        const messageDiv = document.getElementById('message');
-                        messageDiv.textContent = response.message;
-                        messageDiv.style.color = response.success ? 'green' : 'red';
-                        messageDiv.style.display = 'block';
-                        
-                        loginBtn.disabled = false;
-                        loginBtn.textContent = 'Se connecter';
-                        progress.style.display = 'none';
-                        
-                        if (response.success) {
-                            // Rediriger vers la page d'accueil après connexion réussie
-                            setTimeout(function() {
-                                window.pywebview.api.navigate('dashboard');
-                            }, 1000);
-                        }
-                    }).catch(function(error) {
-                        const messageDiv = document.getElementById('message');
-                        messageDiv.textContent = 'Erreur lors de la connexion';
-                        messageDiv.style.color = 'red';
-                        messageDiv.style.display = 'block';
-                        
-                        loginBtn.disabled = false;
-                        loginBtn.textContent = 'Se connecter';
-                        progress.style.display = 'none';
-                        console.error('Login error:', error);
-                    });
-                });
-            }
-            
-            // Gestion des clics sur les liens de navigation
-            document.addEventListener('click', function(e) {
-                if (e.target.tagName === 'A') {
-                    e.preventDefault();
-                    const href = e.target.getAttribute('href');
-                    if (href.includes('login.html')) {
-                        window.pywebview.api.navigate('login');
-                    } else if (href.includes('template.html')) {
-                        window.pywebview.api.navigate('template');
-                    }
-                }
-            });
-        });
-        </script>
-        """
-        
-        # Remplacer le placeholder CSS et ajouter le JavaScript
-        html = html_text.replace(
-            "<!-- INJECT_CSS -->", 
-            f"<style>\n{self.css_text}\n</style>"
-        )
-        
-        # Ajouter un div pour les messages s'il n'existe pas
-        if '<main' in html and 'id="message"' not in html:
-            html = html.replace(
-                '<main',
-                '<div id="message" style="margin: 10px 0; padding: 10px; border-radius: 4px; display: none;"></div><main'
-            )
-        
-        # Insérer le JavaScript juste avant la fermeture du body
-        if "</body>" in html:
-            html = html.replace("</body>", f"{js_code}\n</body>")
-        else:
-            html += js_code
-            
-        return html
+        """Renvoie un template HTML avec le CSS et le JavaScript injectés"""
+        return self.templates.get(template_name)
     
+    @metriques.chronometre('api.handle_register')
     def handle_register(self, username, password):
         """Gère l'inscription d'un nouvel utilisateur"""
         success, message = self.register_user(username, password)
         return {"success": success, "message": message}
     
+    @metriques.chronometre('api.handle_login')
     def handle_login(self, username, password):
         """Gère la connexion d'un utilisateur"""
         try:
-            # Vérifier si la connexion est toujours active
-            if not self.is_connection_alive(self.connection):
-                print("La connexion à la base de données est perdue, tentative de reconnexion...")
-                self.connection = self.connect_to_db()
-                if not self.connection:
-                    return {"success": False, "message": "Impossible de se connecter à la base de données"}
-
             # Authentifier l'utilisateur
             success, message = self.authenticate_user(username, password)
             
             if success:
                 print(f"Utilisateur {username} connecté avec succès")
-                # Démarrer la vérification périodique de la connexion
-                if self.window:
-                    self.start_connection_check()
                 return {"success": True, "message": message, "redirect": "dashboard"}
             else:
                 print(f"Échec de la connexion pour {username}: {message}")
@@ -447,13 +526,17 @@ class WebViewApp:
             print(error_msg)
             return {"success": False, "message": "Une erreur est survenue lors de la connexion"}
     
+    @metriques.chronometre('api.navigate')
     def navigate(self, page):
         """Appelé depuis JavaScript pour changer de page"""
+        if page == 'dashboard' and self.session_courante() is None:
+            # Session absente, expirée ou révoquée
+            page = 'login'
         if page != self.current_page:
             self.current_page = page
             try:
                 # Charger le template avec le code JavaScript injecté
-                if page == 'dashboard':
+                if page == 'dashboard' and page not in self.templates:
                     dashboard_path = self.base_path / "dashboard.html"
                     if not dashboard_path.exists():
                         # Créer un tableau de bord par défaut si le fichier n'existe pas
@@ -510,14 +593,13 @@ class WebViewApp:
         self.window.set_title(f"Guardia — {titles.get(page, 'Application')}")
 
 def main():
-    app = WebViewApp()
-    
-    # Vérifier la connexion à la base de données
-    if not app.connection:
-        print("Impossible de se connecter à la base de données. Vérifiez vos paramètres de connexion.")
-        # On continue quand même pour permettre à l'utilisateur de voir l'interface
+    from product_db import stockage_configure
+
+    # STOCKAGE_PRODUITS=mysql: catalogue partagé avec les autres postes et Flask
+    app = WebViewApp(stockage=stockage_configure())
     
-    # Créer la fenêtre webview avec la page de connexion par défaut
+    # Créer la fenêtre webview avec la page de connexion par défaut; la base
+    # de données se connecte en parallèle et la page affiche son état
     app.window = webview.create_window(
         "Guardia — Connexion",
         html=app.load_template('login'),
@@ -525,15 +607,28 @@ def main():
         js_api=app  # Expose l'instance de l'application à JavaScript
     )
     
+    def fenetre_chargee():
+        # Seul le premier chargement mesure le démarrage
+        app.window.events.loaded -= fenetre_chargee
+        duree = time.perf_counter() - DEBUT
+        metriques.enregistrer('demarrage.fenetre', duree)
+        print(f"Fenêtre affichée en {duree * 1000:.0f} ms")
+    
+    app.window.events.loaded += fenetre_chargee
+    # Compiler les autres pages pendant l'affichage, pour que la navigation ne touche pas le disque
+    app._demarrage.submit(app.templates.prechauffer, ['template', 'dashboard'])
+    
     try:
-        # Démarrer la vérification périodique de la connexion
-        app.start_connection_check(interval=60)  # Vérification toutes les 60 secondes
-        
         # Démarrer l'application avec l'API exposée
         webview.start(debug=True, http_server=False)
     finally:
-        # S'assurer que le thread de vérification est bien arrêté
-        app.stop_connection_check()
+        # Annuler le prochain essai de reconnexion programmé
+        if app.db:
+            app.db.fermer()
+        app._demarrage.shutdown(wait=False)
+        app.hasher.fermer(attendre=False)
+        # Rendre durables les dernières écritures de produits
+        app.store.fermer()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import math
+import os
+import statistics
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import bcrypt
+
+from metrics import metriques
+
+
+COUT_MIN = 10
+COUT_MAX = 16
+# Écart de calibration toléré avant de refaire un hash: la mesure varie d'un cran
+# d'un démarrage ou d'un poste à l'autre
+MARGE_REHACHAGE = 1
+
+
+def _hacher(password, cout=12):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cout)).decode('utf-8')
+
+
+def _verifier(stored_password, provided_password):
+    return bcrypt.checkpw(provided_password.encode('utf-8'), stored_password.encode('utf-8'))
+
+
+def _duree_hachage(cout):
+    debut = time.perf_counter()
+    bcrypt.hashpw(b"calibrage", bcrypt.gensalt(rounds=cout))
+    return time.perf_counter() - debut
+
+
+@lru_cache(maxsize=None)
+def calibrer_cout(cible_ms=250, minimum=COUT_MIN, maximum=COUT_MAX):
+    """Choisit le coût bcrypt dont la durée sur cette machine approche cible_ms
+
+    Chaque unité de coût double la durée: on mesure un coût bas, on
+    extrapole, puis on corrige d'un cran d'après une mesure au coût retenu.
+    Le résultat est mis en cache pour la durée du processus.
+    """
+    reference = 8
+    duree = _duree_hachage(reference)
+    cout = reference + round(math.log2(max(cible_ms / 1000 / duree, 1e-9)))
+    cout = min(max(cout, minimum), maximum)
+
+    duree = _duree_hachage(cout) * 1000
+    if duree > cible_ms * math.sqrt(2) and cout > minimum:
+        cout -= 1
+    elif duree < cible_ms / math.sqrt(2) and cout < maximum:
+        cout += 1
+    return cout
+
+
+def cout_du_hash(stored_password):
+    """Renvoie le coût d'un hash bcrypt, par exemple 10 pour $2y$10$..."""
+    return int(stored_password.split('$')[2])
+
+
+def doit_rehacher(stored_password, cout, marge=MARGE_REHACHAGE):
+    """Indique si un hash doit être recalculé au format $2b$ ou au coût calibré
+
+    Un hash dont le coût s'écarte de plus de marge du coût calibré est
+    refait, dans un sens comme dans l'autre: trop faible, il protège mal;
+    trop élevé, par exemple venu d'un poste plus rapide, chaque connexion
+    paie des centaines de millisecondes de trop. Une calibration qui oscille
+    d'un cran ne fait pas réécrire le hash à chaque connexion.
+    """
+    return not stored_password.startswith('$2b$') or abs(cout_du_hash(stored_password) - cout) > marge
+
+
+class PasswordHasher:
+    """Exécute le hachage et la vérification bcrypt dans un pool de workers
+
+    En mode 'thread', bcrypt relâche le GIL et les calculs s'exécutent en
+    parallèle dans des threads; le mode 'process' isole le calcul dans des
+    processus séparés. Les méthodes renvoient des Future, sans bloquer
+    l'appelant. Sans coût explicite, le coût est calibré sur la machine pour
+    qu'une vérification dure environ cible_ms millisecondes; la calibration
+    tourne dans le pool dès la création et n'est attendue qu'au premier
+    hachage.
+    """
+
+    # pywebview parcourt les attributs de js_api: il ne doit pas attendre la calibration du coût
+    _serializable = False
+
+    def __init__(self, mode='thread', workers=None, cout=None, cible_ms=250):
+        workers = workers or os.cpu_count() or 1
+        if mode == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        else:
+            raise ValueError(f"Mode de hachage inconnu: {mode}")
+        self.mode = mode
+        self.workers = workers
+        if cout:
+            self._cout = Future()
+            self._cout.set_result(cout)
+        else:
+            self._cout = self._executor.submit(calibrer_cout, cible_ms)
+
+    @property
+    def cout(self):
+        return self._cout.result()
+
+    def hacher(self, password):
+        """Renvoie un Future résolu avec le hash bcrypt du mot de passe"""
+        return metriques.suivre('bcrypt.hacher', self._executor.submit(_hacher, password, self.cout))
+
+    def hacher_lot(self, passwords, chunksize=16):
+        """Hache une liste de mots de passe en parallèle, dans l'ordre donné"""
+        cout = [self.cout] * len(passwords)
+        return list(self._executor.map(_hacher, passwords, cout, chunksize=chunksize))
+
+    def verifier(self, stored_password, provided_password):
+        """Renvoie un Future résolu avec True si le mot de passe correspond"""
+        return metriques.suivre('bcrypt.verifier', self._executor.submit(_verifier, stored_password, provided_password))
+
+    def doit_rehacher(self, stored_password):
+        """Indique si un hash stocké s'écarte nettement du coût calibré"""
+        return doit_rehacher(stored_password, self.cout)
+
+    def fermer(self, attendre=True):
+        self._executor.shutdown(wait=attendre)
+
+
+def mesurer(hasher, connexions=64):
+    """Mesure débit et latence de connexions simultanées sur un même hash"""
+    stored = _hacher("monmotdepasse123", hasher.cout)
+    latences = []
+
+    def noter(debut):
+        return lambda f: latences.append(time.perf_counter() - debut)
+
+    debut = time.perf_counter()
+    futures = []
+    for _ in range(connexions):
+        future = hasher.verifier(stored, "monmotdepasse123")
+        future.add_done_callback(noter(time.perf_counter()))
+        futures.append(future)
+    wait(futures)
+    duree = time.perf_counter() - debut
+
+    latences.sort()
+    return {
+        'mode': hasher.mode,
+        'workers': hasher.workers,
+        'cout': hasher.cout,
+        'connexions': connexions,
+        'debit_par_s': round(connexions / duree, 1),
+        'latence_p50_ms': round(statistics.median(latences) * 1000, 1),
+        'latence_p95_ms': round(latences[int(len(latences) * 0.95) - 1] * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    for mode, workers in [('thread', 1), ('thread', None), ('process', None)]:
+        hasher = PasswordHasher(mode, workers)
+        try:
+            print(mesurer(hasher))
+        finally:
+            hasher.fermer()
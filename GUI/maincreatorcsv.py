@@ -1,4 +1,8 @@
 import csv
+import io
+
+
+TAILLE_TAMPON = 64 * 1024
 
 
 def read_csv(file_name):
@@ -10,7 +14,34 @@ def read_csv(file_name):
     return data
 
 
+def iter_csv(file_name, buffer_size=TAILLE_TAMPON, encoding='utf-8'):
+    """Parcourt les lignes d'un fichier CSV une à une, sans tout charger"""
+    with open(file_name, mode='r', newline='', encoding=encoding, buffering=buffer_size) as file:
+        yield from csv.reader(file)
+
+
+def iter_csv_chunks(rows, buffer_size=TAILLE_TAMPON):
+    """Sérialise des lignes en morceaux de texte CSV d'environ buffer_size caractères"""
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+    for row in rows:
+        writer.writerow(row)
+        if tampon.tell() >= buffer_size:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    if tampon.tell():
+        yield tampon.getvalue()
+
+
 def create_csv(file_name, data):
     with open(file_name, mode='w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerows(data)
\ No newline at end of file
+        writer.writerows(data)
+
+
+def write_csv_stream(file_name, rows, buffer_size=TAILLE_TAMPON, encoding='utf-8'):
+    """Écrit des lignes CSV au fil de l'eau depuis un itérable, sans tout garder en mémoire"""
+    with open(file_name, mode='w', newline='', encoding=encoding, buffering=buffer_size) as file:
+        for chunk in iter_csv_chunks(rows, buffer_size):
+            file.write(chunk)
@@ -0,0 +1,151 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Bornes supérieures des classes de durée, en secondes
+BORNES = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+          0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogramme:
+    """Nombre, somme, maximum et répartition par classes de durées en secondes"""
+
+    def __init__(self):
+        self.nombre = 0
+        self.somme = 0.0
+        self.maximum = 0.0
+        # Une classe de plus pour les durées au-delà de la dernière borne
+        self.classes = [0] * (len(BORNES) + 1)
+
+    def ajouter(self, duree):
+        self.nombre += 1
+        self.somme += duree
+        if duree > self.maximum:
+            self.maximum = duree
+        self.classes[bisect.bisect_left(BORNES, duree)] += 1
+
+    def quantile(self, q):
+        """Estime un quantile par la borne supérieure de la classe qui le contient"""
+        rang = q * self.nombre
+        cumul = 0
+        for borne, effectif in zip(BORNES, self.classes):
+            cumul += effectif
+            if cumul >= rang:
+                return min(borne, self.maximum)
+        return self.maximum
+
+    def resume(self):
+        return {
+            'nombre': self.nombre,
+            'total_ms': round(self.somme * 1000, 3),
+            'moyenne_ms': round(self.somme / self.nombre * 1000, 3) if self.nombre else 0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.maximum * 1000, 3),
+        }
+
+
+class Metrics:
+    """Durées et compteurs des chemins critiques, gardés en mémoire
+
+    Désactivé, chaque point de mesure se réduit à un test de actif, sans
+    appel d'horloge ni verrou.
+    """
+
+    def __init__(self, actif=True):
+        self.actif = actif
+        self._lock = threading.Lock()
+        self._durees = {}
+        self._compteurs = {}
+
+    def enregistrer(self, nom, duree):
+        with self._lock:
+            histogramme = self._durees.get(nom)
+            if histogramme is None:
+                histogramme = self._durees[nom] = Histogramme()
+            histogramme.ajouter(duree)
+
+    def incrementer(self, nom, valeur=1):
+        if not self.actif:
+            return
+        with self._lock:
+            self._compteurs[nom] = self._compteurs.get(nom, 0) + valeur
+
+    @contextmanager
+    def mesurer(self, nom):
+        """Enregistre la durée du bloc sous nom, et compte nom.erreurs s'il lève"""
+        if not self.actif:
+            yield
+            return
+        debut = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incrementer(f"{nom}.erreurs")
+            raise
+        finally:
+            self.enregistrer(nom, time.perf_counter() - debut)
+
+    def chronometre(self, nom):
+        """Décorateur: enregistre la durée de chaque appel de la fonction sous nom"""
+        def decorer(fonction):
+            @functools.wraps(fonction)
+            def enveloppe(*args, **kwargs):
+                if not self.actif:
+                    return fonction(*args, **kwargs)
+                # Sans passer par mesurer(): un gestionnaire de contexte coûte plus que l'horloge
+                debut = time.perf_counter()
+                try:
+                    return fonction(*args, **kwargs)
+                except Exception:
+                    self.incrementer(f"{nom}.erreurs")
+                    raise
+                finally:
+                    self.enregistrer(nom, time.perf_counter() - debut)
+            return enveloppe
+        return decorer
+
+    def suivre(self, nom, future):
+        """Enregistre sous nom le temps écoulé jusqu'à la résolution d'un Future"""
+        if self.actif:
+            debut = time.perf_counter()
+            future.add_done_callback(lambda f: self.enregistrer(nom, time.perf_counter() - debut))
+        return future
+
+    def resume(self):
+        with self._lock:
+            return {
+                'durees': {nom: h.resume() for nom, h in sorted(self._durees.items())},
+                'compteurs': dict(sorted(self._compteurs.items())),
+            }
+
+    def texte_prometheus(self, prefixe="guardia"):
+        """Exporte les histogrammes et compteurs au format texte de Prometheus"""
+        lignes = [f"# TYPE {prefixe}_duree_secondes histogram"]
+        with self._lock:
+            for nom, histogramme in sorted(self._durees.items()):
+                cumul = 0
+                for borne, effectif in zip(BORNES, histogramme.classes):
+                    cumul += effectif
+                    lignes.append(f'{prefixe}_duree_secondes_bucket{{operation="{nom}",le="{borne}"}} {cumul}')
+                lignes.append(f'{prefixe}_duree_secondes_bucket{{operation="{nom}",le="+Inf"}} {histogramme.nombre}')
+                lignes.append(f'{prefixe}_duree_secondes_sum{{operation="{nom}"}} {histogramme.somme}')
+                lignes.append(f'{prefixe}_duree_secondes_count{{operation="{nom}"}} {histogramme.nombre}')
+            lignes.append(f"# TYPE {prefixe}_total counter")
+            for nom, valeur in sorted(self._compteurs.items()):
+                lignes.append(f'{prefixe}_total{{compteur="{nom}"}} {valeur}')
+        return "\n".join(lignes) + "\n"
+
+    def reinitialiser(self):
+        with self._lock:
+            self._durees.clear()
+            self._compteurs.clear()
+
+
+# Registre partagé par les modules du processus; METRIQUES=0 le désactive
+metriques = Metrics(actif=os.environ.get("METRIQUES", "1") != "0")
@@ -0,0 +1,274 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain
+from pathlib import Path
+
+from product_table import ProductTable
+
+
+# En-tête fixe: signature, version du format, réservé, taille de l'en-tête JSON
+MAGIQUE = b'GCAT'
+VERSION = 1
+PREFIXE = struct.Struct('<4sHHI')
+ALIGNEMENT = 8
+
+# Types de colonnes: entiers et flottants sur 8 octets, textes dans un tas
+# indexé par offsets, et textes répétés encodés par un dictionnaire
+TYPES_FIXES = {'q': 8, 'd': 8}
+SCHEMA_PRODUIT = [
+    ('id', 'q'),
+    ('nom', 'texte'),
+    ('prix', 'd'),
+    ('quantite', 'q'),
+    ('categorie', 'code'),
+    ('date_ajout', 'code')
+]
+
+
+def est_catalogue(chemin):
+    """Indique si le fichier commence par la signature d'un catalogue binaire"""
+    try:
+        with open(chemin, 'rb') as f:
+            return f.read(len(MAGIQUE)) == MAGIQUE
+    except OSError:
+        return False
+
+
+def _octets(valeurs, type_code):
+    """Sérialise des valeurs en petit-boutiste, l'ordre du format"""
+    donnees = valeurs if isinstance(valeurs, array) and valeurs.typecode == type_code else array(type_code, valeurs)
+    if sys.byteorder != 'little':
+        donnees = array(type_code, donnees)
+        donnees.byteswap()
+    return donnees
+
+
+def ecrire_catalogue(chemin, colonnes, schema=SCHEMA_PRODUIT, meta=None):
+    """Écrit un catalogue binaire, remplacé de façon atomique
+
+    colonnes associe chaque colonne du schéma à ses valeurs: une séquence de
+    nombres pour 'q' et 'd', de chaînes pour 'texte', et un couple (codes,
+    valeurs) pour 'code'. meta est gardé tel quel dans l'en-tête JSON.
+    """
+    sections = []
+    taille = 0
+
+    def ajouter(donnees):
+        nonlocal taille
+        debut = taille
+        sections.append(donnees)
+        taille += len(donnees) * getattr(donnees, 'itemsize', 1)
+        bourrage = -taille % ALIGNEMENT
+        if bourrage:
+            sections.append(bytes(bourrage))
+            taille += bourrage
+        return debut
+
+    def ajouter_textes(textes):
+        encodes = [texte.encode('utf-8') for texte in textes]
+        offsets = _octets(accumulate((len(e) for e in encodes), initial=0), 'Q')
+        return {'offsets': ajouter(offsets), 'tas': ajouter(b''.join(encodes)), 'nombre': len(encodes)}
+
+    nombre = None
+    descriptions = []
+    for nom, type_colonne in schema:
+        valeurs = colonnes[nom]
+        description = {'nom': nom, 'type': type_colonne}
+        if type_colonne in TYPES_FIXES:
+            description['debut'] = ajouter(_octets(valeurs, type_colonne))
+            longueur = len(valeurs)
+        elif type_colonne == 'texte':
+            description.update(ajouter_textes(valeurs))
+            longueur = len(valeurs)
+        elif type_colonne == 'code':
+            codes, dictionnaire = valeurs
+            description['debut'] = ajouter(_octets(codes, 'i'))
+            description['dictionnaire'] = ajouter_textes(dictionnaire)
+            longueur = len(codes)
+        else:
+            raise ValueError(f"Type de colonne inconnu: {type_colonne}")
+        if nombre is not None and longueur != nombre:
+            raise ValueError(f"La colonne {nom} a {longueur} valeurs au lieu de {nombre}")
+        nombre = longueur
+        descriptions.append(description)
+
+    entete = json.dumps({
+        'nombre': nombre or 0,
+        'colonnes': descriptions,
+        'taille': taille,
+        'meta': meta or {}
+    }, ensure_ascii=False).encode('utf-8')
+    entete += b' ' * (-(PREFIXE.size + len(entete)) % ALIGNEMENT)
+
+    chemin = Path(chemin)
+    # Nom propre au processus: deux processus peuvent écrire le même catalogue
+    tmp = chemin.with_name(f"{chemin.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(PREFIXE.pack(MAGIQUE, VERSION, 0, len(entete)))
+            f.write(entete)
+            for section in sections:
+                f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, chemin)
+    finally:
+        if tmp.exists():
+            os.remove(tmp)
+
+
+class BinaryCatalog:
+    """Catalogue binaire ouvert par mmap, en lecture seule
+
+    Les colonnes numériques sont des memoryview sur le fichier projeté: rien
+    n'est lu ni converti avant d'être utilisé, et plusieurs processus qui
+    ouvrent le même catalogue partagent ses pages dans le cache du système.
+    Les vues renvoyées ne sont valables que jusqu'à fermer().
+    """
+
+    def __init__(self, chemin):
+        self.chemin = Path(chemin)
+        with open(self.chemin, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._vues = []
+        try:
+            self._lire_entete()
+        except Exception:
+            self.fermer()
+            raise
+
+    def _lire_entete(self):
+        if len(self._mmap) < PREFIXE.size:
+            raise ValueError(f"{self.chemin} n'est pas un catalogue binaire")
+        magique, version, _, taille_entete = PREFIXE.unpack_from(self._mmap)
+        if magique != MAGIQUE:
+            raise ValueError(f"{self.chemin} n'est pas un catalogue binaire")
+        if version != VERSION:
+            raise ValueError(f"Version de catalogue non prise en charge: {version}")
+        self._donnees = PREFIXE.size + taille_entete
+        entete = json.loads(self._mmap[PREFIXE.size:self._donnees])
+        if len(self._mmap) < self._donnees + entete['taille']:
+            raise ValueError(f"Catalogue tronqué: {self.chemin}")
+        self.nombre = entete['nombre']
+        self.meta = entete['meta']
+        self.colonnes = {description['nom']: description for description in entete['colonnes']}
+        self.schema = [(description['nom'], description['type']) for description in entete['colonnes']]
+
+    def __len__(self):
+        return self.nombre
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+    def _vue(self, debut, nombre, type_code):
+        """Renvoie nombre valeurs typées à partir de debut, sans copie si l'ordre des octets le permet"""
+        debut += self._donnees
+        taille = nombre * array(type_code).itemsize
+        if sys.byteorder != 'little':
+            valeurs = array(type_code, self._mmap[debut:debut + taille])
+            valeurs.byteswap()
+            return memoryview(valeurs)
+        octets = memoryview(self._mmap)[debut:debut + taille]
+        vue = octets.cast(type_code)
+        # Les vues sont libérées avant la fermeture du mmap, qui sinon échoue
+        self._vues += [vue, octets]
+        return vue
+
+    def _textes(self, description):
+        offsets = self._vue(description['offsets'], description['nombre'] + 1, 'Q')
+        debut = self._donnees + description['tas']
+        tas = self._mmap[debut:debut + offsets[-1]]
+        return [tas[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(description['nombre'])]
+
+    def colonne(self, nom):
+        """Renvoie une colonne numérique, ou les codes d'une colonne encodée par dictionnaire"""
+        description = self.colonnes[nom]
+        if description['type'] in TYPES_FIXES:
+            return self._vue(description['debut'], self.nombre, description['type'])
+        if description['type'] == 'code':
+            return self._vue(description['debut'], self.nombre, 'i')
+        raise ValueError(f"La colonne {nom} n'est pas numérique")
+
+    def dictionnaire(self, nom):
+        """Renvoie les valeurs distinctes d'une colonne encodée, dans l'ordre des codes"""
+        return self._textes(self.colonnes[nom]['dictionnaire'])
+
+    def textes(self, nom):
+        """Décode toutes les chaînes d'une colonne texte ou encodée"""
+        description = self.colonnes[nom]
+        if description['type'] == 'texte':
+            return self._textes(description)
+        if description['type'] == 'code':
+            dictionnaire = self.dictionnaire(nom)
+            return [dictionnaire[code] for code in self.colonne(nom)]
+        raise ValueError(f"La colonne {nom} n'est pas textuelle")
+
+    def __iter__(self):
+        """Parcourt les lignes sous forme de dictionnaires, dans l'ordre du fichier"""
+        colonnes = [
+            (nom, self.textes(nom) if type_colonne in ('texte', 'code') else self.colonne(nom))
+            for nom, type_colonne in self.schema
+        ]
+        for position in range(self.nombre):
+            yield {nom: valeurs[position] for nom, valeurs in colonnes}
+
+    def fermer(self):
+        for vue in self._vues:
+            vue.release()
+        self._vues = []
+        self._mmap.close()
+
+
+def lire_catalogue(chemin):
+    """Parcourt les produits d'un catalogue binaire, un dictionnaire par produit"""
+    with BinaryCatalog(chemin) as catalogue:
+        yield from catalogue
+
+
+def lire_produits(chemin):
+    """Parcourt les produits d'un catalogue binaire ou d'un fichier CSV"""
+    if est_catalogue(chemin):
+        return lire_catalogue(chemin)
+    from product_store import lire_produits_csv
+
+    return lire_produits_csv(chemin)
+
+
+def csv_vers_catalogue(source, destination):
+    """Convertit un CSV de produits en catalogue binaire; renvoie le nombre de produits"""
+    from product_store import lire_produits_csv
+
+    table = ProductTable(lire_produits_csv(source))
+    ecrire_catalogue(destination, table.exporter())
+    return len(table)
+
+
+def catalogue_vers_csv(source, destination):
+    """Convertit un catalogue binaire en CSV de produits; renvoie le nombre de produits"""
+    from maincreatorcsv import write_csv_stream
+    from product_store import CHAMPS_PRODUIT
+
+    with BinaryCatalog(source) as catalogue:
+        lignes = ([produit[champ] for champ in CHAMPS_PRODUIT] for produit in catalogue)
+        write_csv_stream(destination, chain([CHAMPS_PRODUIT], lignes))
+        return len(catalogue)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion entre CSV de produits et catalogue binaire")
+    parser.add_argument('source', help="fichier CSV ou catalogue binaire")
+    parser.add_argument('destination', help="fichier à écrire, dans l'autre format")
+    args = parser.parse_args()
+
+    if est_catalogue(args.source):
+        print(f"{catalogue_vers_csv(args.source, args.destination)} produits écrits dans {args.destination}")
+    else:
+        print(f"{csv_vers_catalogue(args.source, args.destination)} produits écrits dans {args.destination}")
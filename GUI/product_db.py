@@ -0,0 +1,420 @@
+import os
+import sys
+from concurrent.futures import Future
+from datetime import datetime
+from itertools import islice
+
+from aggregates import resumer
+from product_catalog import lire_produits
+from product_store import CHAMPS_INDEXES, ProductStore
+
+
+TAILLE_LOT = 1000
+STOCKAGES = ('fichier', 'mysql')
+
+COLONNES = "id, nom, prix, quantite, categorie, date_ajout"
+
+
+def _vers_produit(row):
+    """Convertit une ligne MySQL au format attendu par le pont JavaScript"""
+    id_produit, nom, prix, quantite, categorie, date_ajout = row
+    return {
+        'id': id_produit,
+        'nom': nom,
+        'prix': float(prix),
+        'quantite': quantite,
+        'categorie': categorie,
+        'date_ajout': date_ajout.strftime("%Y-%m-%d %H:%M:%S") if date_ajout else ''
+    }
+
+
+def _vers_ligne(produit):
+    return (
+        produit['id'],
+        produit['nom'],
+        produit['prix'],
+        produit['quantite'],
+        produit['categorie'],
+        produit.get('date_ajout') or None
+    )
+
+
+def stockage_configure():
+    """Stockage des produits choisi par STOCKAGE_PRODUITS, le même pour le bureau et Flask
+
+    fichier (par défaut): journal produits.log; mysql: table products.
+    """
+    stockage = os.environ.get("STOCKAGE_PRODUITS", "fichier")
+    if stockage not in STOCKAGES:
+        raise ValueError(f"Stockage inconnu: {stockage}")
+    return stockage
+
+
+def _par_lots(iterable, taille):
+    iterateur = iter(iterable)
+    while True:
+        lot = list(islice(iterateur, taille))
+        if not lot:
+            return
+        yield lot
+
+
+class MySQLProductStore:
+    """Stockage des produits dans la table products, partagé entre postes
+
+    Expose les mêmes méthodes que ProductStore. Les écritures multiples
+    passent par des requêtes paramétrées groupées, une transaction par lot.
+
+    instance et version viennent de la ligne de products_version, que chaque
+    transaction d'écriture incrémente: tous les processus connectés à la
+    base voient la même version, comme le journal partagé entre le bureau
+    et Flask. Elles sont lues par rafraichir() et après chaque écriture.
+    """
+
+    def __init__(self, pool, taille_lot=TAILLE_LOT):
+        self.pool = pool
+        self.taille_lot = taille_lot
+        self._instance = None
+        self._version = None
+
+    @property
+    def instance(self):
+        if self._instance is None:
+            self.rafraichir()
+        return self._instance
+
+    @property
+    def version(self):
+        if self._version is None:
+            self.rafraichir()
+        return self._version
+
+    def rafraichir(self):
+        """Relit la version de la table, changée par les écritures des autres processus"""
+        rows = self._executer("SELECT instance, version FROM products_version WHERE id = 1")
+        # Aucune écriture encore: la ligne est créée par la première
+        self._instance, self._version = rows[0] if rows else ('', 0)
+
+    def _incrementer_version(self, cursor):
+        """Incrémente la version dans la transaction en cours et renvoie (instance, version)
+
+        La ligne reste verrouillée jusqu'au commit: deux écritures
+        simultanées reçoivent deux versions distinctes.
+        """
+        cursor.execute(
+            "INSERT INTO products_version (id, instance, version) VALUES (1, LEFT(MD5(UUID()), 12), 1) "
+            "ON DUPLICATE KEY UPDATE version = version + 1"
+        )
+        cursor.execute("SELECT instance, version FROM products_version WHERE id = 1")
+        return cursor.fetchone()
+
+    def _executer(self, requete, parametres=()):
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(requete, parametres)
+                return cursor.fetchall() if cursor.with_rows else cursor.rowcount
+            finally:
+                cursor.close()
+
+    def __len__(self):
+        return self._executer("SELECT COUNT(*) FROM products")[0][0]
+
+    def __contains__(self, id_produit):
+        return bool(self._executer("SELECT 1 FROM products WHERE id = %s", (id_produit,)))
+
+    def creer(self, nom, prix, quantite, categorie=""):
+        """Insère un produit; l'id vient de l'AUTO_INCREMENT, jamais réutilisé"""
+        return self.creer_lot([{'nom': nom, 'prix': prix, 'quantite': quantite, 'categorie': categorie}])[0]
+
+    def creer_lot(self, elements):
+        """Insère plusieurs produits dans une seule transaction, dans l'ordre donné
+
+        Un INSERT par produit pour lire chaque id AUTO_INCREMENT: avec
+        innodb_autoinc_lock_mode=2, les ids d'un INSERT multiple ne sont pas
+        forcément consécutifs.
+        """
+        date_ajout = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        crees = []
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction()
+                for element in elements:
+                    produit = {
+                        'nom': element['nom'],
+                        'prix': float(element['prix']),
+                        'quantite': int(element['quantite']),
+                        'categorie': element.get('categorie', ''),
+                        'date_ajout': date_ajout
+                    }
+                    cursor.execute(
+                        "INSERT INTO products (nom, prix, quantite, categorie, date_ajout) "
+                        "VALUES (%s, %s, %s, %s, %s)",
+                        (produit['nom'], produit['prix'], produit['quantite'],
+                         produit['categorie'], produit['date_ajout'])
+                    )
+                    crees.append(dict(produit, id=cursor.lastrowid))
+                version = self._incrementer_version(cursor)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        self._instance, self._version = version
+        return crees
+
+    def ajouter(self, produit):
+        """Ajoute ou remplace un produit dont l'id est connu"""
+        self.ajouter_lot([produit])
+        return produit
+
+    def ajouter_lot(self, produits):
+        """Ajoute ou remplace des produits par lots, une transaction par lot"""
+        total = 0
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                for lot in _par_lots(produits, self.taille_lot):
+                    connection.start_transaction()
+                    cursor.executemany(
+                        f"REPLACE INTO products ({COLONNES}) VALUES (%s, %s, %s, %s, %s, %s)",
+                        [_vers_ligne(p) for p in lot]
+                    )
+                    version = self._incrementer_version(cursor)
+                    connection.commit()
+                    self._instance, self._version = version
+                    total += len(lot)
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return total
+
+    def supprimer(self, id_produit):
+        return self.supprimer_lot([id_produit])[0]
+
+    def supprimer_lot(self, ids):
+        """Supprime des produits par DELETE ... WHERE id IN (...) dans une seule transaction
+
+        Renvoie un booléen par id, faux si le produit n'existait pas.
+        """
+        ids = list(ids)
+        supprimes = set()
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction()
+                for lot in _par_lots(ids, self.taille_lot):
+                    marqueurs = ", ".join(["%s"] * len(lot))
+                    cursor.execute(f"SELECT id FROM products WHERE id IN ({marqueurs}) FOR UPDATE", tuple(lot))
+                    supprimes.update(row[0] for row in cursor.fetchall())
+                    cursor.execute(f"DELETE FROM products WHERE id IN ({marqueurs})", tuple(lot))
+                version = self._incrementer_version(cursor) if supprimes else None
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        if version:
+            self._instance, self._version = version
+        resultats = []
+        for id_produit in ids:
+            # Un id répété n'est supprimé qu'une fois
+            resultats.append(id_produit in supprimes)
+            supprimes.discard(id_produit)
+        return resultats
+
+    def modifier_lot(self, modifications):
+        """Modifie plusieurs produits dans une seule transaction
+
+        Renvoie pour chaque modification le produit modifié, ou None si l'id
+        n'existe pas.
+        """
+        modifications = list(modifications)
+        resultats = []
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction()
+                produits = {}
+                ids = list({m['id'] for m in modifications})
+                for lot in _par_lots(ids, self.taille_lot):
+                    marqueurs = ", ".join(["%s"] * len(lot))
+                    cursor.execute(
+                        f"SELECT {COLONNES} FROM products WHERE id IN ({marqueurs}) FOR UPDATE", tuple(lot)
+                    )
+                    for row in cursor.fetchall():
+                        produits[row[0]] = _vers_produit(row)
+                for modification in modifications:
+                    produit = produits.get(modification['id'])
+                    if produit is None:
+                        resultats.append(None)
+                        continue
+                    produit = produits[produit['id']] = dict(produit, **modification)
+                    resultats.append(produit)
+                # Une seule mise à jour par produit, avec son état final
+                lignes = [
+                    (p['nom'], p['prix'], p['quantite'], p['categorie'], p['id'])
+                    for p in {p['id']: p for p in resultats if p is not None}.values()
+                ]
+                version = None
+                if lignes:
+                    cursor.executemany(
+                        "UPDATE products SET nom = %s, prix = %s, quantite = %s, categorie = %s WHERE id = %s",
+                        lignes
+                    )
+                    version = self._incrementer_version(cursor)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        if version:
+            self._instance, self._version = version
+        return resultats
+
+    def get(self, id_produit):
+        rows = self._executer(f"SELECT {COLONNES} FROM products WHERE id = %s", (id_produit,))
+        return _vers_produit(rows[0]) if rows else None
+
+    def changements_depuis(self, version):
+        """La table ne garde pas l'historique des changements: renvoie toujours un instantané complet"""
+        self.rafraichir()
+        return {'version': self.version, 'complet': True, 'produits': self.tous(), 'supprimes': []}
+
+    def agregats(self, recalculer=False):
+        """Calcule les totaux par catégorie avec un GROUP BY; recalculer est sans objet"""
+        rows = self._executer(
+            "SELECT categorie, COUNT(*), SUM(quantite), SUM(prix * quantite), MIN(prix), MAX(prix) "
+            "FROM products GROUP BY categorie"
+        )
+        return resumer({
+            categorie: (nombre, int(quantite), float(valeur), float(prix_min), float(prix_max))
+            for categorie, nombre, quantite, valeur, prix_min, prix_max in rows
+        })
+
+    def rechercher(self, requete, limit=20):
+        """Recherche par LIKE; la collation utf8mb4_unicode_ci ignore déjà accents et casse"""
+        termes = requete.split()
+        if not termes or limit <= 0:
+            return []
+        conditions = []
+        parametres = []
+        for terme in termes:
+            motif = terme.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("(nom LIKE %s OR nom LIKE %s OR categorie LIKE %s OR categorie LIKE %s)")
+            parametres += [f"{motif}%", f"% {motif}%"] * 2
+        rows = self._executer(
+            f"SELECT {COLONNES} FROM products WHERE {' AND '.join(conditions)} ORDER BY id LIMIT %s",
+            tuple(parametres) + (int(limit),)
+        )
+        return [_vers_produit(row) for row in rows]
+
+    def tous(self):
+        return list(self.iterer())
+
+    def iterer(self):
+        """Parcourt les produits par paquets de fetchmany, sans tout charger"""
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT {COLONNES} FROM products ORDER BY id")
+                while True:
+                    rows = cursor.fetchmany(self.taille_lot)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield _vers_produit(row)
+            finally:
+                cursor.close()
+
+    def remplacer(self, produits):
+        """Remplace tout le catalogue dans une seule transaction"""
+        with self.pool.connexion() as connection:
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction()
+                cursor.execute("DELETE FROM products")
+                for lot in _par_lots(produits, self.taille_lot):
+                    cursor.executemany(
+                        f"INSERT INTO products ({COLONNES}) VALUES (%s, %s, %s, %s, %s, %s)",
+                        [_vers_ligne(p) for p in lot]
+                    )
+                version = self._incrementer_version(cursor)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        self._instance, self._version = version
+
+    def requeter(self, offset=0, limit=50, filtres=None, tri='id', decroissant=False):
+        """Renvoie une page de produits filtrés et triés, servie par les index SQL"""
+        filtres = filtres or {}
+        if tri not in ('id',) + tuple(CHAMPS_INDEXES):
+            raise ValueError(f"Tri impossible sur le champ {tri}")
+
+        conditions = []
+        parametres = []
+        for champ, (minimum, maximum) in filtres.items():
+            if champ not in CHAMPS_INDEXES:
+                raise ValueError(f"Filtre impossible sur le champ {champ}")
+            if minimum is not None and minimum == maximum:
+                conditions.append(f"{champ} = %s")
+                parametres.append(minimum)
+                continue
+            if minimum is not None:
+                conditions.append(f"{champ} >= %s")
+                parametres.append(minimum)
+            if maximum is not None:
+                conditions.append(f"{champ} <= %s")
+                parametres.append(maximum)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        ordre = "DESC" if decroissant else "ASC"
+
+        total = self._executer(f"SELECT COUNT(*) FROM products{where}", tuple(parametres))[0][0]
+        rows = self._executer(
+            f"SELECT {COLONNES} FROM products{where} ORDER BY {tri} {ordre}, id {ordre} "
+            f"LIMIT %s OFFSET %s",
+            tuple(parametres) + (int(limit), int(offset))
+        )
+        return {'total': total, 'produits': [_vers_produit(row) for row in rows]}
+
+
+    def synchroniser(self):
+        """Chaque lot est validé par son commit: rien n'est jamais en attente"""
+        future = Future()
+        future.set_result(True)
+        return future
+
+    def fermer(self):
+        pass
+
+
+def migrer(pool, source, taille_lot=TAILLE_LOT):
+    """Charge en masse un CSV de produits, un catalogue binaire ou un journal produits.log dans MySQL"""
+    if str(source).endswith('.log'):
+        journal = ProductStore(source)
+        produits = journal.iterer()
+    else:
+        journal = None
+        produits = lire_produits(source)
+    try:
+        return MySQLProductStore(pool, taille_lot).ajouter_lot(produits)
+    finally:
+        if journal is not None:
+            journal.fermer()
+
+
+if __name__ == "__main__":
+    from data_access import creer_pool
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "caca.csv"
+    pool = creer_pool(1)
+    print(f"{migrer(pool, source)} produits importés depuis {source}")
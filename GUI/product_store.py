@@ -0,0 +1,1173 @@
+import bisect
+import csv
+import gc
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import uuid
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from aggregates import InventoryAggregates
+from file_lock import FileLock
+from metrics import metriques
+from product_catalog import SCHEMA_PRODUIT, BinaryCatalog, ecrire_catalogue, lire_produits
+from product_table import ProductTable
+from search_index import SearchIndex
+
+
+CHAMPS_PRODUIT = ['id', 'nom', 'prix', 'quantite', 'categorie', 'date_ajout']
+CHAMPS_INDEXES = ['categorie', 'prix', 'quantite']
+# Bornes des colonnes array('q') de la table, pour les ids et les quantités
+ENTIER_MIN, ENTIER_MAX = -2 ** 63, 2 ** 63 - 1
+# Type des valeurs de chaque index secondaire; None pour les chaînes
+TYPES_INDEXES = {'id': 'q', 'categorie': None, 'prix': 'd', 'quantite': 'q'}
+# Parcourir ou croiser les ids d'un index coûte environ ce rapport de fois
+# moins par id que lire la valeur d'un produit dans la table
+RAPPORT_CROISEMENT = 8
+# Colonnes de l'instantané binaire: le catalogue, l'offset de chaque produit
+# dans le journal, les mots de son nom pour l'index de recherche, et chaque
+# index secondaire sous forme de deux colonnes parallèles (ids et valeurs)
+SCHEMA_INSTANTANE = SCHEMA_PRODUIT + [('offset', 'q'), ('mots', 'texte')] + [
+    colonne
+    for champ in CHAMPS_INDEXES
+    for colonne in ((f'ordre_{champ}', 'q'), (f'index_{champ}', TYPES_INDEXES[champ] or 'code'))
+]
+
+
+def lire_produits_csv(chemin):
+    """Parcourt un fichier CSV de produits au format de charger_produits, ligne par ligne"""
+    chemin = Path(chemin)
+    if not chemin.exists():
+        return
+
+    with open(chemin, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        # Un fichier avec un autre en-tête n'est pas un catalogue de produits
+        if not reader.fieldnames or 'id' not in reader.fieldnames:
+            return
+        for row in reader:
+            yield {
+                'id': int(row['id']),
+                'nom': row['nom'],
+                'prix': float(row['prix']),
+                'quantite': int(row['quantite']),
+                'categorie': row['categorie'],
+                'date_ajout': row.get('date_ajout', '')
+            }
+
+
+def _texte(valeur, champ):
+    """Convertit un champ texte venu de JSON; None donne une chaîne vide, une liste ou un objet est refusé"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, (list, dict)):
+        raise TypeError(f"Le champ {champ} doit être un texte")
+    return str(valeur)
+
+
+def convertir_entier(valeur, champ):
+    """Convertit un id ou une quantité; ValueError s'il ne tient pas sur 64 bits"""
+    valeur = int(valeur)
+    if not ENTIER_MIN <= valeur <= ENTIER_MAX:
+        raise ValueError(f"Le champ {champ} dépasse la limite des entiers 64 bits")
+    return valeur
+
+
+def convertir_prix(valeur):
+    """Convertit un prix; ValueError s'il n'est pas fini (NaN ou infini)"""
+    valeur = float(valeur)
+    if not math.isfinite(valeur):
+        raise ValueError("Le prix doit être un nombre fini")
+    return valeur
+
+
+def _verifier_nombres(enregistrement):
+    """Lève ValueError si un enregistrement relu ne tient pas dans les colonnes de la table"""
+    convertir_entier(enregistrement['id'], 'id')
+    convertir_entier(enregistrement.get('quantite', 0), 'quantite')
+    convertir_prix(enregistrement.get('prix', 0))
+
+
+def _normaliser(produit):
+    """Renvoie le produit avec les champs et les types du journal; KeyError, TypeError ou ValueError sinon"""
+    return {
+        'id': convertir_entier(produit['id'], 'id'),
+        'nom': _texte(produit.get('nom'), 'nom'),
+        'prix': convertir_prix(produit.get('prix', 0)),
+        'quantite': convertir_entier(produit.get('quantite', 0), 'quantite'),
+        'categorie': _texte(produit.get('categorie'), 'categorie'),
+        'date_ajout': _texte(produit.get('date_ajout'), 'date_ajout')
+    }
+
+
+@contextmanager
+def _sans_ramasse_miettes():
+    """Suspend le ramasse-miettes cyclique pendant une reconstruction complète
+
+    Les millions de petits conteneurs créés ne forment pas de cycles, mais
+    chaque collection les reparcourrait tous.
+    """
+    actif = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if actif:
+            gc.enable()
+
+
+def _tableau(type_code, valeurs):
+    if isinstance(valeurs, memoryview):
+        tableau = array(type_code)
+        tableau.frombytes(valeurs.cast('B'))
+        return tableau
+    return array(type_code, valeurs)
+
+
+class SortedIndex:
+    """Index secondaire trié de paires (valeur, id) interrogé par bisection
+
+    Les valeurs et les ids sont gardés dans deux séquences parallèles, triées
+    par valeur puis par id, sans tuple par produit: des array pour les
+    nombres (type_code) et, sans type_code, une liste de chaînes partagées
+    avec la table.
+    """
+
+    def __init__(self, type_code=None, valeurs=(), ids=()):
+        """valeurs et ids sont parallèles et déjà dans l'ordre de l'index
+
+        Des memoryview typées, comme les colonnes d'un BinaryCatalog, sont
+        copiées d'un bloc.
+        """
+        self._valeurs = _tableau(type_code, valeurs) if type_code else list(valeurs)
+        self._ids = _tableau('q', ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _position(self, valeur, id_produit):
+        debut = bisect.bisect_left(self._valeurs, valeur)
+        fin = bisect.bisect_right(self._valeurs, valeur, debut)
+        return bisect.bisect_left(self._ids, id_produit, debut, fin)
+
+    def ajouter(self, valeur, id_produit):
+        i = self._position(valeur, id_produit)
+        self._valeurs.insert(i, valeur)
+        self._ids.insert(i, id_produit)
+
+    def retirer(self, valeur, id_produit):
+        i = self._position(valeur, id_produit)
+        if i < len(self._ids) and self._ids[i] == id_produit and self._valeurs[i] == valeur:
+            del self._valeurs[i]
+            del self._ids[i]
+
+    def plage(self, minimum=None, maximum=None):
+        """Renvoie les positions (debut, fin) des valeurs dans [minimum, maximum]"""
+        debut = 0 if minimum is None else bisect.bisect_left(self._valeurs, minimum)
+        fin = len(self._ids) if maximum is None else bisect.bisect_right(self._valeurs, maximum)
+        return debut, max(debut, fin)
+
+    def ids(self, debut, fin, decroissant=False):
+        """Parcourt les ids entre deux positions dans l'ordre de l'index"""
+        ids = self._ids
+        positions = range(fin - 1, debut - 1, -1) if decroissant else range(debut, fin)
+        for i in positions:
+            yield ids[i]
+
+    def tranche(self, debut, fin):
+        """Renvoie les ids entre deux positions, en un array"""
+        return self._ids[debut:fin]
+
+    def colonnes(self):
+        """Renvoie (valeurs, ids) dans l'ordre de l'index, sans copie, pour l'instantané"""
+        return self._valeurs, self._ids
+
+    def remplacer(self, ids, valeur):
+        """Remet à jour en un seul parcours les entrées des ids donnés
+
+        valeur(id) donne la valeur actuelle d'un id, ou None s'il n'existe
+        plus. Les entrées de ces ids sont retirées puis réinsérées à leur
+        place: le coût est celui d'une copie de l'index, au lieu d'un
+        décalage des array par id.
+        """
+        garder = [i not in ids for i in self._ids]
+        if isinstance(self._valeurs, array):
+            valeurs = array(self._valeurs.typecode, itertools.compress(self._valeurs, garder))
+        else:
+            valeurs = list(itertools.compress(self._valeurs, garder))
+        ids_gardes = array('q', itertools.compress(self._ids, garder))
+        nouvelles = sorted((v, i) for i, v in ((i, valeur(i)) for i in ids) if v is not None)
+        self._valeurs, self._ids = valeurs[:0], ids_gardes[:0]
+        debut = 0
+        for v, i in nouvelles:
+            fin = bisect.bisect_left(valeurs, v, debut)
+            fin = bisect.bisect_left(ids_gardes, i, fin, bisect.bisect_right(valeurs, v, fin))
+            self._valeurs.extend(valeurs[debut:fin])
+            self._ids.extend(ids_gardes[debut:fin])
+            self._valeurs.append(v)
+            self._ids.append(i)
+            debut = fin
+        self._valeurs.extend(valeurs[debut:])
+        self._ids.extend(ids_gardes[debut:])
+
+
+class ProductStore:
+    """Stockage des produits en journal append-only avec index id -> offset
+
+    Chaque ajout écrit une ligne JSON à la fin du journal, chaque suppression
+    écrit une pierre tombale. L'index en mémoire donne l'offset du dernier
+    enregistrement vivant de chaque produit, utilisé par le compactage et les
+    parcours du journal. Les valeurs des produits vivants sont gardées en
+    colonnes dans une ProductTable: les lectures ne touchent pas au fichier et
+    ne construisent un dictionnaire que pour les produits renvoyés. Un
+    enregistrement de séquence en tête du journal conserve le dernier id
+    attribué, pour ne jamais réutiliser l'id d'un produit supprimé. Le journal
+    est compacté en arrière-plan quand les enregistrements morts dépassent les
+    vivants.
+
+    L'index est aussi gardé dans un catalogue binaire à côté du journal
+    (produits.log.bin), avec les index secondaires triés et les mots des noms,
+    réécrit après un compactage, et à l'ouverture ou à la fermeture dès que
+    seuil_instantane enregistrements, ou autant que de produits, ont été
+    relus ou écrits depuis le dernier. Une ouverture ne relit alors que les
+    lignes écrites après lui, sans retrier les index ni redécouper les noms.
+
+    version augmente à chaque modification; avec instance, propre à cette
+    ouverture du journal, elle identifie un état du catalogue pour les caches.
+    Les taille_changements derniers ids modifiés sont gardés avec leur
+    version, ce qui permet à changements_depuis() de ne renvoyer que l'écart
+    avec une version déjà connue du client.
+
+    Les écritures sont rendues durables par lots: un thread regroupe toutes
+    celles arrivées pendant fenetre_commit secondes en un seul fsync, et
+    synchroniser() renvoie le Future résolu quand ce fsync est terminé. Les
+    réécritures complètes passent par un fichier temporaire, fsync puis
+    renommage atomique, si bien qu'un arrêt brutal laisse l'ancien journal
+    ou le nouveau, jamais un mélange des deux.
+
+    Plusieurs processus (le bureau et l'application Flask) peuvent ouvrir le
+    même journal. Les écrivains se succèdent sous un verrou de fichier annexe
+    (produits.log.lock) et rattrapent d'abord ce que les autres ont ajouté.
+    Les lecteurs ne prennent aucun verrou: ils lisent un instantané fait de
+    lignes complètes et, si le fichier a été remplacé par un compactage
+    ailleurs, rechargent le nouveau.
+    """
+
+    def __init__(self, chemin, source_csv=None, seuil_compactage=1000, fenetre_commit=0.01,
+                 taille_changements=10000, seuil_instantane=10000):
+        self.chemin = Path(chemin)
+        self.chemin_instantane = self.chemin.with_name(self.chemin.name + '.bin')
+        self.seuil_compactage = seuil_compactage
+        self.seuil_instantane = seuil_instantane
+        self._depuis_instantane = 0
+        self._retouches = None
+        self._lock = threading.RLock()
+        self._index = {}
+        self._table = ProductTable()
+        self._secondaires = None
+        self._agregats = InventoryAggregates()
+        self._recherche = SearchIndex()
+        self._morts = 0
+        self._taille = 0
+        self._dernier_id = 0
+        self._compactage = None
+        self._generation = 0
+        self.instance = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.taille_changements = taille_changements
+        self._changements = None
+        self._debut_changements = 0
+
+        # Ordre de verrouillage: _verrou, puis _sync_lock, puis _lock. Le verrou
+        # inter-processus n'est jamais attendu en tenant _lock, celui des lecteurs
+        self.fenetre_commit = fenetre_commit
+        self._sync_lock = threading.Lock()
+        self._sale = threading.Event()
+        self._arret = threading.Event()
+        self._lot = Future()
+        self._dernier_lot = Future()
+        self._dernier_lot.set_result(True)
+
+        self._verrou = FileLock(str(self.chemin) + '.lock')
+        with self._verrou.exclusif():
+            if not self.chemin.exists():
+                # source_csv peut aussi être un catalogue binaire écrit par product_catalog
+                self._creer(lire_produits(source_csv) if source_csv else [])
+            self._ouvrir()
+
+        self._synchroniseur = threading.Thread(target=self._boucle_synchronisation, daemon=True)
+        self._synchroniseur.start()
+
+    @metriques.chronometre('store.ecriture_complete')
+    def _ecrire_temporaire(self, produits, dernier_id=0):
+        """Écrit un journal complet dans un fichier temporaire rendu durable et renvoie son chemin
+
+        produits peut être un générateur: il n'est parcouru qu'une fois et la
+        séquence est écrite après les produits. Un produit invalide fait
+        échouer l'écriture, et le fichier temporaire est supprimé.
+        """
+        tmp = self.chemin.with_name(self.chemin.name + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                for produit in produits:
+                    produit = _normaliser(produit)
+                    dernier_id = max(dernier_id, produit['id'])
+                    f.write(self._encoder('+', produit))
+                f.write(self._encoder('#', {'id': dernier_id}))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return tmp
+
+    def _creer(self, produits, dernier_id=0):
+        """Écrit un nouveau journal contenant uniquement les produits donnés"""
+        os.replace(self._ecrire_temporaire(produits, dernier_id), self.chemin)
+        self._fsync_dossier()
+
+    def _fsync_dossier(self):
+        """Rend durable un renommage dans le dossier du journal (sans objet sous Windows)"""
+        if os.name == 'nt':
+            return
+        fd = os.open(self.chemin.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @metriques.chronometre('store.chargement')
+    def _ouvrir(self):
+        """Ouvre le journal et reconstruit l'index en un seul parcours
+
+        L'index est repris de l'instantané binaire s'il correspond à ce
+        journal: seule la fin du journal est alors relue. Une ligne finale
+        incomplète est ignorée; elle ne sera tronquée que par un écrivain,
+        sous le verrou inter-processus.
+        """
+        self._index = {}
+        self._table = ProductTable()
+        # Les index secondaires sont triés en une fois après le chargement
+        self._secondaires = None
+        self._recherche = SearchIndex()
+        # Un rechargement complet ne s'exprime pas en changements
+        self._changements = None
+        self._morts = 0
+        self._reader = open(self.chemin, 'rb')
+        self._identite = self._identifier(os.fstat(self._reader.fileno()))
+        with _sans_ramasse_miettes():
+            offset, secondaires = self._charger_instantane()
+            self._depuis_instantane = 0
+            # Produits modifiés après l'instantané, à replacer dans ses index secondaires
+            self._retouches = set()
+            self._reader.seek(offset)
+            for ligne in self._reader:
+                if not ligne.endswith(b'\n'):
+                    # Écriture interrompue ou en cours: on ignore la ligne incomplète
+                    break
+                self._rejouer(ligne, offset)
+                offset += len(ligne)
+            self._taille = offset
+            self._construire_secondaires(secondaires, self._retouches)
+            self._retouches = None
+        self._writer = open(self.chemin, 'ab')
+        self.version += 1
+        self._changements = deque(maxlen=self.taille_changements)
+        self._debut_changements = self.version
+        if self._instantane_perime():
+            self._ecrire_instantane()
+
+    def _instantane_perime(self):
+        """Indique si assez d'enregistrements ont été relus ou écrits pour réécrire l'instantané
+
+        Un petit catalogue en a un dès que ce qu'une ouverture relirait égale
+        son nombre de produits, sans attendre seuil_instantane.
+        """
+        return self._depuis_instantane >= min(self.seuil_instantane, max(1, len(self._index)))
+
+    def _empreinte(self, taille):
+        """Empreinte des 4 premiers et des 4 derniers Ko parmi les taille premiers octets du journal
+
+        Le reste n'est pas relu: le journal n'est qu'allongé, ou remplacé par
+        renommage, ce que l'identité du fichier détecte déjà. L'empreinte
+        écarte un journal réécrit en place, par une copie ou une restauration.
+        """
+        empreinte = hashlib.sha256()
+        self._reader.seek(0)
+        empreinte.update(self._reader.read(min(taille, 4096)))
+        self._reader.seek(max(0, taille - 4096))
+        empreinte.update(self._reader.read(min(taille, 4096)))
+        return empreinte.hexdigest()
+
+    def _charger_instantane(self):
+        """Reprend l'index de l'instantané binaire; renvoie l'offset où reprendre la lecture et ses index secondaires
+
+        L'instantané n'est utilisé que s'il décrit un début de ce même
+        journal, sans quoi la lecture reprend à 0 et les index secondaires
+        renvoyés valent None. Les colonnes sont copiées en mémoire depuis le
+        fichier projeté; les index secondaires y sont déjà triés et les noms
+        déjà découpés en mots. Le chargement reste proportionnel au nombre de
+        produits: les noms sont décodés, et le dictionnaire des offsets comme
+        les mots de chaque produit sont reconstruits en Python.
+        """
+        try:
+            with BinaryCatalog(self.chemin_instantane) as catalogue:
+                meta = catalogue.meta
+                taille = meta['taille']
+                if (tuple(meta['journal']) != self._identite
+                        or taille > os.fstat(self._reader.fileno()).st_size
+                        or meta['empreinte'] != self._empreinte(taille)):
+                    return 0, None
+                table = ProductTable.depuis_catalogue(catalogue)
+                index = dict(zip(table.ids, catalogue.colonne('offset')))
+                secondaires = {
+                    champ: SortedIndex(
+                        TYPES_INDEXES[champ],
+                        catalogue.colonne(f'index_{champ}') if TYPES_INDEXES[champ]
+                        else catalogue.textes(f'index_{champ}'),
+                        catalogue.colonne(f'ordre_{champ}')
+                    )
+                    for champ in CHAMPS_INDEXES
+                }
+                mots = catalogue.textes('mots')
+        except FileNotFoundError:
+            return 0, None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Instantané du journal ignoré: {e}")
+            return 0, None
+        self._table = table
+        self._index = index
+        self._morts = meta['morts']
+        self._dernier_id = max(self._dernier_id, meta['dernier_id'])
+        categories = table.categories.valeurs
+        self._recherche.charger(zip(
+            table.ids,
+            (tuple(map(sys.intern, texte.split())) for texte in mots),
+            (categories[code] for code in table.categories.codes)
+        ))
+        return taille, secondaires
+
+    def _ecrire_instantane(self):
+        """Écrit l'index dans un catalogue binaire, pour que la prochaine ouverture ne relise que la fin du journal"""
+        colonnes = self._table.exporter()
+        colonnes['offset'] = array('q', (self._index[i] for i in colonnes['id']))
+        colonnes['mots'] = [' '.join(self._recherche.mots_produit(i)) for i in colonnes['id']]
+        for champ in CHAMPS_INDEXES:
+            valeurs, ids = self._secondaires[champ].colonnes()
+            colonnes[f'ordre_{champ}'] = ids
+            if TYPES_INDEXES[champ] is None:
+                # Chaînes encodées par le dictionnaire de la colonne de la table
+                dictionnaire = self._table.categories
+                valeurs = (array('i', map(dictionnaire.coder, valeurs)), dictionnaire.valeurs)
+            colonnes[f'index_{champ}'] = valeurs
+        meta = {
+            'journal': list(self._identite),
+            'taille': self._taille,
+            'empreinte': self._empreinte(self._taille),
+            'morts': self._morts,
+            'dernier_id': self._dernier_id
+        }
+        try:
+            ecrire_catalogue(self.chemin_instantane, colonnes, SCHEMA_INSTANTANE, meta)
+        except OSError as e:
+            print(f"Impossible d'écrire l'instantané du journal: {e}")
+            return
+        self._depuis_instantane = 0
+
+    @staticmethod
+    def _identifier(stat):
+        return stat.st_ino, stat.st_dev
+
+    def _rafraichir(self):
+        """Rattrape les écritures faites par d'autres processus depuis le dernier appel"""
+        try:
+            stat = os.stat(self.chemin)
+        except FileNotFoundError:
+            return
+        if self._identifier(stat) != self._identite:
+            # Journal remplacé ailleurs (compactage ou remplacement complet)
+            self._fermer_fichiers()
+            self._ouvrir()
+            self._generation += 1
+            return
+        if stat.st_size <= self._taille:
+            return
+        self._reader.seek(self._taille)
+        donnees = self._reader.read(stat.st_size - self._taille)
+        # Seules les lignes complètes sont prises en compte
+        donnees = donnees[:donnees.rfind(b'\n') + 1]
+        if not donnees:
+            return
+        offset = self._taille
+        for ligne in donnees.splitlines(keepends=True):
+            self._rejouer(ligne, offset)
+            offset += len(ligne)
+        self._taille = offset
+
+    def rafraichir(self):
+        """Met l'index à jour avec les écritures des autres processus"""
+        with self._lock:
+            self._rafraichir()
+
+    @contextmanager
+    def _ecriture(self):
+        """Section d'écriture: verrou inter-processus, journal à jour, lignes complètes en sortie"""
+        with self._verrou.exclusif(), self._lock:
+            self._rafraichir()
+            if os.fstat(self._writer.fileno()).st_size > self._taille:
+                # Reste d'une écriture interrompue par un arrêt brutal
+                self._writer.truncate(self._taille)
+            try:
+                yield
+            finally:
+                # Les autres processus ne doivent jamais lire une ligne partielle
+                self._writer.flush()
+
+    def _construire_secondaires(self, instantane=None, retouches=()):
+        """Trie les index secondaires, ou reprend ceux de l'instantané en y replaçant les produits retouchés depuis"""
+        ids = sorted(self._index)
+        self._secondaires = {'id': SortedIndex(TYPES_INDEXES['id'], ids, ids)}
+        for champ in CHAMPS_INDEXES:
+            valeur = self._table.lecteur(champ)
+            if instantane is not None:
+                index = self._secondaires[champ] = instantane[champ]
+                if retouches:
+                    index.remplacer(retouches, lambda i: valeur(i) if i in self._index else None)
+                continue
+            # Tri stable: à valeur égale, les ids restent croissants
+            ordre = sorted(ids, key=valeur)
+            self._secondaires[champ] = SortedIndex(TYPES_INDEXES[champ], map(valeur, ordre), ordre)
+        self._agregats.reconstruire_colonnes(*self._table.colonnes())
+        self._recherche.trier()
+
+    def _indexer(self, produit):
+        id_produit = produit['id']
+        self._table.ajouter(produit)
+        valeurs = self._table.valeurs(id_produit)
+        self._recherche.ajouter(id_produit, produit.get('nom', ''), valeurs[CHAMPS_INDEXES.index('categorie')])
+        if self._secondaires is not None:
+            self._secondaires['id'].ajouter(id_produit, id_produit)
+            for champ, valeur in zip(CHAMPS_INDEXES, valeurs):
+                self._secondaires[champ].ajouter(valeur, id_produit)
+            self._agregats.ajouter(*valeurs)
+
+    def _desindexer(self, id_produit):
+        valeurs = self._table.valeurs(id_produit) if id_produit in self._table else None
+        self._table.retirer(id_produit)
+        self._recherche.retirer(id_produit)
+        if valeurs is not None and self._secondaires is not None:
+            self._secondaires['id'].retirer(id_produit, id_produit)
+            for champ, valeur in zip(CHAMPS_INDEXES, valeurs):
+                self._secondaires[champ].retirer(valeur, id_produit)
+            self._agregats.retirer(*valeurs)
+
+    def _fermer_fichiers(self):
+        self._writer.close()
+        self._reader.close()
+
+    @staticmethod
+    def _encoder(op, produit):
+        enregistrement = {'op': op}
+        enregistrement.update(produit)
+        return json.dumps(enregistrement, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def _rejouer(self, ligne, offset):
+        """Applique une ligne relue du journal; une ligne illisible ou hors limites est signalée et ignorée"""
+        try:
+            self._appliquer(json.loads(ligne), offset)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Enregistrement ignoré à l'offset {offset} de {self.chemin}: {e}")
+
+    def _appliquer(self, enregistrement, offset):
+        """Met à jour l'index pour un enregistrement situé à offset
+
+        Les nombres d'un ajout sont vérifiés avant toute modification: un
+        enregistrement refusé laisse l'index intact.
+        """
+        if enregistrement['op'] == '+':
+            _verifier_nombres(enregistrement)
+        id_produit = enregistrement['id']
+        self._dernier_id = max(self._dernier_id, id_produit)
+        self._depuis_instantane += 1
+        if enregistrement['op'] == '#':
+            self._morts += 1
+            return
+        if self._retouches is not None:
+            self._retouches.add(id_produit)
+        if id_produit in self._index:
+            self._morts += 1
+            self._desindexer(id_produit)
+        if enregistrement['op'] == '-':
+            if self._index.pop(id_produit, None) is not None:
+                # La pierre tombale est elle-même un enregistrement mort
+                self._morts += 1
+        else:
+            self._index[id_produit] = offset
+            self._indexer(enregistrement)
+        if self._changements is not None:
+            self._noter(id_produit)
+
+    def _noter(self, id_produit):
+        """Attribue une nouvelle version au changement d'un produit"""
+        self.version += 1
+        if len(self._changements) == self._changements.maxlen:
+            # Le plus ancien changement va sortir: les versions antérieures ne sont plus couvertes
+            self._debut_changements = self._changements[0][0]
+        self._changements.append((self.version, id_produit))
+
+    def _ecrire(self, op, produit):
+        """Ajoute un enregistrement au tampon d'écriture, rendu durable au prochain lot"""
+        donnees = self._encoder(op, produit)
+        offset = self._taille
+        self._writer.write(donnees)
+        self._taille += len(donnees)
+        self._sale.set()
+        return offset
+
+    def _boucle_synchronisation(self):
+        """Rend durables, par un seul fsync, les écritures de chaque fenêtre"""
+        while not self._arret.is_set():
+            self._sale.wait()
+            # Laisser les écritures de la fenêtre rejoindre le même lot
+            self._arret.wait(self.fenetre_commit)
+            self._synchroniser_lot()
+
+    def _synchroniser_lot(self):
+        with self._sync_lock:
+            with self._lock:
+                if not self._sale.is_set():
+                    return
+                self._sale.clear()
+                lot, self._lot = self._lot, Future()
+                self._dernier_lot = lot
+                self._writer.flush()
+                # Copie du descripteur: le journal peut être rouvert pendant le fsync
+                fd = os.dup(self._writer.fileno())
+            # Hors de _lock: les écritures continuent pendant le fsync
+            try:
+                with metriques.mesurer('store.fsync'):
+                    os.fsync(fd)
+            except OSError as e:
+                lot.set_exception(e)
+            else:
+                lot.set_result(True)
+            finally:
+                os.close(fd)
+
+    def synchroniser(self):
+        """Renvoie un Future résolu quand toutes les écritures faites jusqu'ici sont sur disque"""
+        with self._lock:
+            return self._lot if self._sale.is_set() else self._dernier_lot
+
+    @staticmethod
+    def _decoder(ligne):
+        enregistrement = json.loads(ligne)
+        del enregistrement['op']
+        return enregistrement
+
+    def __len__(self):
+        with self._lock:
+            self._rafraichir()
+            return len(self._index)
+
+    def __contains__(self, id_produit):
+        with self._lock:
+            self._rafraichir()
+            return id_produit in self._index
+
+    def allouer_id(self):
+        """Réserve un nouvel id, jamais utilisé auparavant, même supprimé
+
+        La réservation est écrite dans le journal pour qu'un autre processus
+        ne puisse pas attribuer le même id.
+        """
+        with self._ecriture():
+            id_produit = self._dernier_id + 1
+            offset = self._ecrire('#', {'id': id_produit})
+            self._appliquer({'op': '#', 'id': id_produit}, offset)
+            return id_produit
+
+    def ajouter(self, produit):
+        """Ajoute ou remplace un produit en écrivant un seul enregistrement"""
+        produit = _normaliser(produit)
+        with self._ecriture():
+            offset = self._ecrire('+', produit)
+            self._appliquer(dict(produit, op='+'), offset)
+        self._peut_etre_compacter()
+        return produit
+
+    def ajouter_lot(self, produits):
+        """Ajoute ou remplace plusieurs produits sous un seul verrou, pour un seul fsync
+
+        Renvoie le nombre de produits écrits, comme MySQLProductStore. Tous
+        les produits sont validés avant d'écrire: un produit invalide fait
+        échouer tout le lot, sans rien écrire.
+        """
+        produits = [_normaliser(produit) for produit in produits]
+        total = 0
+        with self._ecriture():
+            for produit in produits:
+                offset = self._ecrire('+', produit)
+                self._appliquer(dict(produit, op='+'), offset)
+                total += 1
+        self._peut_etre_compacter()
+        return total
+
+    @staticmethod
+    def _nouveau(id_produit, nom, prix, quantite, categorie):
+        # Mêmes règles que pour l'interface: le journal ne contient que des textes et des nombres
+        nom = _texte(nom, 'nom').strip()
+        if not nom:
+            raise ValueError("Le nom est vide")
+        return {
+            'id': convertir_entier(id_produit, 'id'),
+            'nom': nom,
+            'prix': convertir_prix(prix),
+            'quantite': convertir_entier(quantite, 'quantite'),
+            'categorie': _texte(categorie, 'categorie'),
+            'date_ajout': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def creer(self, nom, prix, quantite, categorie=""):
+        """Crée un produit avec un nouvel id et la date du jour, puis l'ajoute"""
+        # Sous _ecriture: l'id suivant ne peut pas être pris ailleurs
+        with self._ecriture():
+            return self.ajouter(self._nouveau(self._dernier_id + 1, nom, prix, quantite, categorie))
+
+    def creer_lot(self, elements):
+        """Crée plusieurs produits sous un seul verrou, pour un seul fsync
+
+        elements est une liste de dictionnaires nom, prix, quantite et
+        categorie; les produits créés sont renvoyés dans le même ordre. Un
+        élément invalide fait échouer tout le lot, sans rien écrire.
+        """
+        with self._ecriture():
+            crees = [
+                self._nouveau(id_produit, element['nom'], element['prix'], element['quantite'],
+                              element.get('categorie', ''))
+                for id_produit, element in enumerate(elements, self._dernier_id + 1)
+            ]
+            for produit in crees:
+                offset = self._ecrire('+', produit)
+                self._appliquer(dict(produit, op='+'), offset)
+        self._peut_etre_compacter()
+        return crees
+
+    def modifier_lot(self, modifications):
+        """Modifie plusieurs produits sous un seul verrou, pour un seul fsync
+
+        Chaque modification donne l'id et les champs à changer. Renvoie pour
+        chacune le produit modifié, ou None si l'id n'existe pas. Une
+        modification invalide fait échouer tout le lot, sans rien écrire.
+        """
+        resultats = []
+        with self._ecriture():
+            # Un id modifié deux fois dans le lot part de sa première modification
+            en_attente = {}
+            for modification in modifications:
+                produit = en_attente.get(modification['id']) or self._lire(modification['id'])
+                if produit is not None:
+                    produit = en_attente[modification['id']] = _normaliser(dict(produit, **modification))
+                resultats.append(produit)
+            for produit in resultats:
+                if produit is not None:
+                    offset = self._ecrire('+', produit)
+                    self._appliquer(dict(produit, op='+'), offset)
+        self._peut_etre_compacter()
+        return resultats
+
+    def supprimer(self, id_produit):
+        """Supprime un produit en écrivant une pierre tombale"""
+        with self._ecriture():
+            if id_produit not in self._index:
+                return False
+            offset = self._ecrire('-', {'id': id_produit})
+            self._appliquer({'op': '-', 'id': id_produit}, offset)
+        self._peut_etre_compacter()
+        return True
+
+    def supprimer_lot(self, ids):
+        """Supprime plusieurs produits sous un seul verrou; renvoie un booléen par id"""
+        resultats = []
+        with self._ecriture():
+            for id_produit in ids:
+                if id_produit not in self._index:
+                    resultats.append(False)
+                    continue
+                offset = self._ecrire('-', {'id': id_produit})
+                self._appliquer({'op': '-', 'id': id_produit}, offset)
+                resultats.append(True)
+        self._peut_etre_compacter()
+        return resultats
+
+    def get(self, id_produit):
+        """Renvoie un produit depuis la table en mémoire, sans lire le journal"""
+        with self._lock:
+            self._rafraichir()
+            return self._lire(id_produit)
+
+    def _lire(self, id_produit):
+        return self._table.en_dict(id_produit)
+
+    def changements_depuis(self, version):
+        """Renvoie ce qui a changé depuis une version renvoyée par un appel précédent
+
+        Le coût dépend du nombre de changements, pas de la taille du
+        catalogue. Si la version n'est plus couverte (journal des changements
+        dépassé, rechargement complet, autre instance), la réponse est un
+        instantané complet marqué 'complet': True.
+        """
+        with self._lock:
+            self._rafraichir()
+            if version is None or not self._debut_changements <= version <= self.version:
+                index_id = self._secondaires['id']
+                return {
+                    'version': self.version,
+                    'complet': True,
+                    'produits': self._table.en_dicts(index_id.ids(*index_id.plage())),
+                    'supprimes': []
+                }
+            ids = {}
+            for version_changement, id_produit in reversed(self._changements):
+                if version_changement <= version:
+                    break
+                ids[id_produit] = None
+            ids = sorted(ids)
+            return {
+                'version': self.version,
+                'complet': False,
+                'produits': self._table.en_dicts(ids),
+                'supprimes': [i for i in ids if i not in self._index]
+            }
+
+    def agregats(self, recalculer=False):
+        """Renvoie nombre, quantité, valeur du stock et prix min/max, au total et par catégorie
+
+        Les totaux sont tenus à jour à chaque écriture; recalculer force une
+        reconstruction complète à partir de l'index.
+        """
+        with self._lock:
+            self._rafraichir()
+            if recalculer:
+                self._agregats.reconstruire_colonnes(*self._table.colonnes())
+            prix = self._table.lecteur('prix')
+            for categorie in self._agregats.perimes():
+                debut, fin = self._secondaires['categorie'].plage(categorie, categorie)
+                self._agregats.recalculer(categorie, (
+                    prix(i)
+                    for i in self._secondaires['categorie'].ids(debut, fin)
+                ))
+            return self._agregats.resume()
+
+    def rechercher(self, requete, limit=20):
+        """Renvoie les produits dont le nom ou la catégorie contient chaque terme de la requête
+
+        Chaque terme peut n'être que le début d'un mot, et les accents et la
+        casse sont ignorés: 'cafe ara' trouve 'Café Arabica'.
+        """
+        with self._lock:
+            self._rafraichir()
+            return self._table.en_dicts(self._recherche.rechercher(requete, limit))
+
+    def tous(self):
+        """Renvoie tous les produits vivants dans l'ordre du journal, depuis la table en mémoire"""
+        with self._lock:
+            self._rafraichir()
+            return self._table.en_dicts(sorted(self._index, key=self._index.get))
+
+    def iterer(self):
+        """Parcourt les produits vivants dans l'ordre du journal, un à un
+
+        Les offsets vivants sont figés à l'appel et la lecture se fait sur un
+        descripteur séparé: les écritures ne sont pas bloquées pendant le
+        parcours, qui ne voit pas celles arrivées après son début. Si un
+        autre processus a remplacé le journal entre le rattrapage et
+        l'ouverture, les offsets ne le décrivent pas: le journal est rattrapé
+        et rouvert.
+        """
+        while True:
+            with self._lock:
+                self._rafraichir()
+                f = open(self.chemin, 'rb')
+                if self._identifier(os.fstat(f.fileno())) == self._identite:
+                    vivants = set(self._index.values())
+                    fin = self._taille
+                    break
+            f.close()
+        with f:
+            offset = 0
+            for ligne in f:
+                if offset >= fin:
+                    break
+                if offset in vivants:
+                    yield self._decoder(ligne)
+                offset += len(ligne)
+
+    def requeter(self, offset=0, limit=50, filtres=None, tri='id', decroissant=False):
+        """Renvoie une page de produits filtrés et triés via les index secondaires
+
+        filtres associe un champ indexé à un couple (minimum, maximum), l'une
+        des bornes pouvant valoir None. Le parcours part de l'index le plus
+        sélectif, si bien qu'une page coûte de l'ordre de sa taille plus le
+        nombre de candidats de ce filtre, jamais la taille du catalogue. Avec
+        un seul filtre peu sélectif et un autre tri, l'index de tri est
+        parcouru dans l'ordre jusqu'à remplir la page. Avec plusieurs filtres,
+        les ids de leurs plages sont croisés pour compter les produits
+        retenus; selon leur sélectivité combinée, la page est ensuite prise en
+        parcourant l'index de tri ou en triant les produits retenus.
+        """
+        filtres = filtres or {}
+        if tri not in ('id',) + tuple(CHAMPS_INDEXES):
+            raise ValueError(f"Tri impossible sur le champ {tri}")
+        for champ in filtres:
+            if champ not in CHAMPS_INDEXES:
+                raise ValueError(f"Filtre impossible sur le champ {champ}")
+
+        with self._lock:
+            self._rafraichir()
+            plages = {
+                champ: self._secondaires[champ].plage(*bornes)
+                for champ, bornes in filtres.items()
+            }
+            plages.setdefault(tri, self._secondaires[tri].plage())
+            champ_pilote = min(plages, key=lambda c: plages[c][1] - plages[c][0])
+            autres = [
+                (self._table.lecteur(c), bornes) for c, bornes in filtres.items()
+                if c != champ_pilote
+            ]
+
+            def correspond(id_produit, conditions=autres):
+                for lecteur, (minimum, maximum) in conditions:
+                    valeur = lecteur(id_produit)
+                    if minimum is not None and valeur < minimum:
+                        return False
+                    if maximum is not None and valeur > maximum:
+                        return False
+                return True
+
+            debut, fin = plages[champ_pilote]
+            if champ_pilote == tri and not autres:
+                # Cas direct: la page est une tranche de l'index de tri
+                total = fin - debut
+                if decroissant:
+                    debut, fin = max(debut, fin - offset - limit), fin - offset
+                else:
+                    debut, fin = debut + offset, min(fin, debut + offset + limit)
+                ids = list(self._secondaires[tri].ids(debut, fin, decroissant))
+            elif not autres and (offset + limit) * len(self._secondaires[tri]) < (fin - debut) ** 2:
+                # Filtre unique peu sélectif: parcourir l'index de tri jusqu'à remplir
+                # la page coûte (offset + limit) / sélectivité, moins que trier les candidats
+                total = fin - debut
+                conditions = [(self._table.lecteur(champ_pilote), filtres[champ_pilote])]
+                ids = []
+                a_sauter = offset
+                for i in self._secondaires[tri].ids(*plages[tri], decroissant):
+                    if len(ids) >= limit:
+                        break
+                    if not correspond(i, conditions):
+                        continue
+                    if a_sauter > 0:
+                        a_sauter -= 1
+                        continue
+                    ids.append(i)
+            else:
+                total, candidats, exclus = self._correspondants(filtres, plages, champ_pilote)
+                debut_tri, fin_tri = plages[tri]
+                # Parcourir l'index de tri coûte (offset + limit) / sélectivité ids, trier
+                # les candidats de l'ordre de leur nombre lectures dans la table
+                if exclus is not None or (
+                        (offset + limit) * (fin_tri - debut_tri) < RAPPORT_CROISEMENT * total ** 2):
+                    parcours = self._secondaires[tri].ids(debut_tri, fin_tri, decroissant)
+                    if exclus is None:
+                        page = filter(candidats.__contains__, parcours)
+                    else:
+                        page = itertools.filterfalse(exclus.__contains__, parcours)
+                    ids = list(itertools.islice(page, offset, offset + limit))
+                else:
+                    # Trier d'abord par id puis, de façon stable, par valeur ordonne par (valeur, id)
+                    ids = sorted(candidats, reverse=decroissant)
+                    if tri != 'id':
+                        ids.sort(key=self._table.lecteur(tri), reverse=decroissant)
+                    ids = ids[offset:offset + limit]
+
+            return {'total': total, 'produits': self._table.en_dicts(ids)}
+
+    def _correspondants(self, filtres, plages, champ_pilote):
+        """Produits qui passent tous les filtres de requeter
+
+        Renvoie (total, candidats, exclus): les ids retenus ou, quand tous les
+        filtres sont larges, les ids écartés, moins nombreux. Partant de la
+        plage pilote, chaque autre filtre est appliqué de la façon la moins
+        coûteuse: croiser les ids de sa plage, retirer ceux qui sont hors de
+        sa plage, ou lire la valeur des candidats restants dans la table quand
+        sa plage est bien plus large qu'eux.
+        """
+        taille = len(self._secondaires[champ_pilote])
+        largeurs = {champ: plages[champ][1] - plages[champ][0] for champ in filtres}
+        if sum(taille - largeur for largeur in largeurs.values()) < largeurs[champ_pilote]:
+            exclus = set()
+            for champ in filtres:
+                index = self._secondaires[champ]
+                debut, fin = plages[champ]
+                exclus.update(index.tranche(0, debut))
+                exclus.update(index.tranche(fin, taille))
+            return taille - len(exclus), None, exclus
+
+        candidats = set(self._secondaires[champ_pilote].tranche(*plages[champ_pilote]))
+        for champ in sorted(filtres, key=largeurs.get):
+            if champ == champ_pilote:
+                continue
+            index = self._secondaires[champ]
+            debut, fin = plages[champ]
+            budget = RAPPORT_CROISEMENT * len(candidats)
+            if taille - largeurs[champ] < min(largeurs[champ], budget):
+                candidats.difference_update(index.tranche(0, debut))
+                candidats.difference_update(index.tranche(fin, taille))
+            elif largeurs[champ] <= budget:
+                candidats = candidats.intersection(index.tranche(debut, fin))
+            else:
+                valeur = self._table.lecteur(champ)
+                minimum, maximum = filtres[champ]
+                candidats = {
+                    i for i in candidats
+                    if (minimum is None or valeur(i) >= minimum) and (maximum is None or valeur(i) <= maximum)
+                }
+        return len(candidats), candidats, None
+
+    def remplacer(self, produits):
+        """Remplace tout le catalogue par la liste donnée
+
+        Le nouveau journal est écrit à côté de l'ancien, qui reste ouvert: si
+        l'écriture échoue, par exemple sur un produit sans id, le catalogue
+        est inchangé et l'erreur remonte à l'appelant. Les lectures continuent
+        pendant l'écriture du nouveau journal.
+        """
+        with self._verrou.exclusif():
+            # Le verrou inter-processus bloque les autres écrivains: le journal ne bouge plus
+            with self._lock:
+                self._rafraichir()
+                dernier_id = self._dernier_id
+            tmp = self._ecrire_temporaire(produits, dernier_id)
+            with self._sync_lock, self._lock:
+                self._fermer_fichiers()
+                try:
+                    os.replace(tmp, self.chemin)
+                    self._fsync_dossier()
+                finally:
+                    # Nouveau journal, ou l'ancien si le renommage a échoué
+                    tmp.unlink(missing_ok=True)
+                    self._ouvrir()
+                self._generation += 1
+                # Le nouveau journal est déjà sur disque: le lot en attente est durable
+                if self._sale.is_set():
+                    self._sale.clear()
+                    self._dernier_lot, self._lot = self._lot, Future()
+                    self._dernier_lot.set_result(True)
+
+    def _peut_etre_compacter(self):
+        if self._morts < self.seuil_compactage or self._morts < len(self._index):
+            return
+        with self._lock:
+            if self._compactage is not None and self._compactage.is_alive():
+                return
+            self._compactage = threading.Thread(target=self.compacter, daemon=True)
+            self._compactage.start()
+
+    @metriques.chronometre('store.compactage')
+    def compacter(self):
+        """Réécrit le journal avec uniquement les enregistrements vivants
+
+        La copie se fait hors verrou à partir d'un instantané de l'index; les
+        écritures arrivées pendant la copie, y compris celles des autres
+        processus, sont rejouées à la fin sous le verrou inter-processus.
+        """
+        with self._lock:
+            self._rafraichir()
+            generation = self._generation
+            fin = self._taille
+            dernier_id = self._dernier_id
+            vivants = sorted(self._index.items(), key=lambda item: item[1])
+
+        # Nom propre au processus: deux processus peuvent compacter en même temps
+        tmp = self.chemin.with_name(f"{self.chemin.name}.compact.{os.getpid()}")
+        nouvel_index = {}
+        src = open(self.chemin, 'rb')
+        dst = open(tmp, 'wb')
+        try:
+            # Les pierres tombales disparaissent: la séquence garde le dernier id
+            dst.write(self._encoder('#', {'id': dernier_id}))
+            for id_produit, offset in vivants:
+                src.seek(offset)
+                nouvel_index[id_produit] = dst.tell()
+                dst.write(src.readline())
+
+            with self._verrou.exclusif():
+                with self._lock:
+                    self._rafraichir()
+                    if generation != self._generation:
+                        # Le journal a été remplacé pendant la copie
+                        return
+                    taille_source = self._taille
+                morts = 0
+                src.seek(fin)
+                for ligne in src.read(taille_source - fin).splitlines(keepends=True):
+                    offset = dst.tell()
+                    dst.write(ligne)
+                    enregistrement = json.loads(ligne)
+                    id_produit = enregistrement['id']
+                    if enregistrement['op'] == '#':
+                        morts += 1
+                        continue
+                    if id_produit in nouvel_index:
+                        morts += 1
+                    if enregistrement['op'] == '-':
+                        if nouvel_index.pop(id_produit, None) is not None:
+                            morts += 1
+                    else:
+                        nouvel_index[id_produit] = offset
+                dst.flush()
+                os.fsync(dst.fileno())
+                taille = dst.tell()
+                dst.close()
+                src.close()
+
+                with self._sync_lock, self._lock:
+                    self._fermer_fichiers()
+                    os.replace(tmp, self.chemin)
+                    self._fsync_dossier()
+                    self._index = nouvel_index
+                    self._morts = morts
+                    self._taille = taille
+                    self._writer = open(self.chemin, 'ab')
+                    self._reader = open(self.chemin, 'rb')
+                    self._identite = self._identifier(os.fstat(self._reader.fileno()))
+                    # L'instantané précédent décrit l'ancien journal
+                    self._ecrire_instantane()
+        finally:
+            src.close()
+            dst.close()
+            if tmp.exists():
+                os.remove(tmp)
+
+    def fermer(self):
+        """Attend la fin d'un compactage éventuel, rend tout durable et ferme le journal"""
+        if self._compactage is not None:
+            self._compactage.join()
+        self._arret.set()
+        self._sale.set()
+        self._synchroniseur.join()
+        self._synchroniser_lot()
+        with self._lock:
+            if self._instantane_perime():
+                self._ecrire_instantane()
+            self._fermer_fichiers()
+        self._verrou.fermer()
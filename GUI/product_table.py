@@ -0,0 +1,246 @@
+import sys
+from array import array
+
+
+class StringColumn:
+    """Colonne de chaînes encodée par dictionnaire: chaque valeur distincte n'est gardée qu'une fois
+
+    Les lignes ne stockent qu'un code entier dans un tableau typé; adapté
+    aux colonnes à peu de valeurs distinctes comme la catégorie ou la date.
+    """
+
+    def __init__(self):
+        self.codes = array('i')
+        self.valeurs = []
+        self._code_de = {}
+
+    def coder(self, valeur):
+        code = self._code_de.get(valeur)
+        if code is None:
+            code = self._code_de[valeur] = len(self.valeurs)
+            self.valeurs.append(valeur)
+        return code
+
+    def __getitem__(self, position):
+        return self.valeurs[self.codes[position]]
+
+    def __setitem__(self, position, valeur):
+        self.codes[position] = self.coder(valeur)
+
+    def append(self, valeur):
+        self.codes.append(self.coder(valeur))
+
+
+class ProductRow:
+    """Vue sur une ligne de ProductTable, sans copie des valeurs"""
+
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, table, position):
+        self._table = table
+        self._position = position
+
+    @property
+    def id(self):
+        return self._table.ids[self._position]
+
+    @property
+    def nom(self):
+        return self._table.noms[self._position]
+
+    @property
+    def prix(self):
+        return self._table.prix[self._position]
+
+    @property
+    def quantite(self):
+        return self._table.quantites[self._position]
+
+    @property
+    def categorie(self):
+        return self._table.categories[self._position]
+
+    @property
+    def date_ajout(self):
+        return self._table.dates[self._position]
+
+    def en_dict(self):
+        """Renvoie le produit au format attendu par JavaScript et l'API Flask"""
+        return self._table._dict(self._position)
+
+
+class ProductTable:
+    """Produits rangés en colonnes: tableaux typés pour les nombres, chaînes partagées
+
+    Les ids, prix et quantités sont dans des array, la catégorie et la date
+    encodées par dictionnaire, les noms internés. Une ligne supprimée laisse
+    un emplacement libre, réutilisé par l'ajout suivant. Les dictionnaires
+    produit ne sont construits qu'à la demande, pour les lignes renvoyées.
+    """
+
+    def __init__(self, produits=()):
+        self.ids = array('q')
+        self.prix = array('d')
+        self.quantites = array('q')
+        self.noms = []
+        self.categories = StringColumn()
+        self.dates = StringColumn()
+        self._positions = {}
+        self._libres = []
+        for produit in produits:
+            self.ajouter(produit)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, id_produit):
+        return id_produit in self._positions
+
+    def __iter__(self):
+        """Parcourt les lignes vivantes par ordre d'emplacement"""
+        for position in sorted(self._positions.values()):
+            yield ProductRow(self, position)
+
+    def ajouter(self, produit):
+        """Ajoute un produit ou remplace celui de même id
+
+        Toutes les valeurs sont converties avant la première affectation: un
+        entier hors des 64 bits lève OverflowError sans laisser de ligne à
+        moitié écrite.
+        """
+        id_produit, quantite = array('q', (produit['id'], int(produit.get('quantite', 0))))
+        nom = sys.intern(str(produit.get('nom', '')))
+        prix = float(produit.get('prix', 0))
+        categorie = str(produit.get('categorie', ''))
+        date = str(produit.get('date_ajout', ''))
+
+        position = self._positions.get(id_produit)
+        if position is None and self._libres:
+            position = self._libres.pop()
+        if position is None:
+            self._positions[id_produit] = len(self.ids)
+            self.ids.append(id_produit)
+            self.prix.append(prix)
+            self.quantites.append(quantite)
+            self.noms.append(nom)
+            self.categories.append(categorie)
+            self.dates.append(date)
+            return
+        self._positions[id_produit] = position
+        self.ids[position] = id_produit
+        self.prix[position] = prix
+        self.quantites[position] = quantite
+        self.noms[position] = nom
+        self.categories[position] = categorie
+        self.dates[position] = date
+
+    def retirer(self, id_produit):
+        """Retire un produit; renvoie False s'il n'existait pas"""
+        position = self._positions.pop(id_produit, None)
+        if position is None:
+            return False
+        # Le nom n'est plus référencé; les colonnes numériques seront écrasées à la réutilisation
+        self.noms[position] = ''
+        self._libres.append(position)
+        return True
+
+    def ligne(self, id_produit):
+        """Renvoie la vue sur un produit, ou None"""
+        position = self._positions.get(id_produit)
+        return None if position is None else ProductRow(self, position)
+
+    def _dict(self, position):
+        return {
+            'id': self.ids[position],
+            'nom': self.noms[position],
+            'prix': self.prix[position],
+            'quantite': self.quantites[position],
+            'categorie': self.categories[position],
+            'date_ajout': self.dates[position]
+        }
+
+    def en_dict(self, id_produit):
+        """Renvoie un produit au format dictionnaire, ou None"""
+        position = self._positions.get(id_produit)
+        return None if position is None else self._dict(position)
+
+    def en_dicts(self, ids):
+        """Convertit en dictionnaires les seuls produits demandés, dans l'ordre donné"""
+        positions = self._positions
+        return [self._dict(positions[i]) for i in ids if i in positions]
+
+    def valeurs(self, id_produit):
+        """Renvoie (categorie, prix, quantite), les champs des index secondaires"""
+        position = self._positions[id_produit]
+        return self.categories[position], self.prix[position], self.quantites[position]
+
+    def lecteur(self, champ):
+        """Renvoie une fonction id -> valeur du champ, pour les filtres et tris en boucle"""
+        positions = self._positions
+        if champ == 'categorie':
+            valeurs, codes = self.categories.valeurs, self.categories.codes
+            return lambda id_produit: valeurs[codes[positions[id_produit]]]
+        colonnes = {'id': self.ids, 'prix': self.prix, 'quantite': self.quantites}
+        if champ not in colonnes:
+            raise ValueError(f"Champ non indexé: {champ}")
+        colonne = colonnes[champ]
+        return lambda id_produit: colonne[positions[id_produit]]
+
+    def colonnes(self):
+        """Renvoie (categories, codes, prix, quantites) des produits vivants, en tableaux typés
+
+        Sans emplacement libre, les colonnes sont renvoyées telles quelles, sans copie.
+        """
+        codes = self.categories.codes
+        if not self._libres:
+            return self.categories.valeurs, codes, self.prix, self.quantites
+        positions = sorted(self._positions.values())
+        return (
+            self.categories.valeurs,
+            array('i', (codes[p] for p in positions)),
+            array('d', (self.prix[p] for p in positions)),
+            array('q', (self.quantites[p] for p in positions))
+        )
+
+    def exporter(self):
+        """Renvoie les colonnes des produits vivants, sans emplacement libre, pour ecrire_catalogue"""
+        positions = sorted(self._positions.values())
+        if len(positions) == len(self.ids):
+            selection = lambda colonne: colonne
+        else:
+            selection = lambda colonne: array(colonne.typecode, (colonne[p] for p in positions))
+        return {
+            'id': selection(self.ids),
+            'nom': [self.noms[p] for p in positions],
+            'prix': selection(self.prix),
+            'quantite': selection(self.quantites),
+            'categorie': (selection(self.categories.codes), self.categories.valeurs),
+            'date_ajout': (selection(self.dates.codes), self.dates.valeurs)
+        }
+
+    @classmethod
+    def depuis_catalogue(cls, catalogue):
+        """Charge une table depuis un BinaryCatalog, colonne par colonne
+
+        Les colonnes numériques sont copiées d'un bloc depuis le fichier
+        projeté; seuls les noms sont décodés un à un.
+        """
+        table = cls()
+        for colonne, nom in ((table.ids, 'id'), (table.prix, 'prix'), (table.quantites, 'quantite')):
+            colonne.frombytes(catalogue.colonne(nom).cast('B'))
+        table.noms = [sys.intern(nom) for nom in catalogue.textes('nom')]
+        for colonne, nom in ((table.categories, 'categorie'), (table.dates, 'date_ajout')):
+            colonne.codes.frombytes(catalogue.colonne(nom).cast('B'))
+            colonne.valeurs = catalogue.dictionnaire(nom)
+            colonne._code_de = {valeur: code for code, valeur in enumerate(colonne.valeurs)}
+        table._positions = dict(zip(table.ids, range(len(table.ids))))
+        return table
+
+    def taille_octets(self):
+        """Estime la mémoire des colonnes, sans les chaînes partagées des noms"""
+        return (
+            sum(colonne.itemsize * len(colonne) for colonne in (
+                self.ids, self.prix, self.quantites, self.categories.codes, self.dates.codes
+            ))
+            + sys.getsizeof(self.noms) + sys.getsizeof(self._positions)
+        )
@@ -0,0 +1,319 @@
+import bisect
+import heapq
+import re
+import sys
+import unicodedata
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
+
+_MOT = re.compile(r"\w+")
+# Accents et autres signes diacritiques séparés de leur lettre par NFKD
+_DIACRITIQUES = re.compile('[\u0300-\u036f]')
+# Ligatures que la décomposition Unicode ne sépare pas
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae'})
+
+# Poids d'un terme trouvé comme mot entier ou comme début de mot
+SCORE_NOM = (4, 2)
+SCORE_CATEGORIE = (2, 1)
+# Jusqu'à ce total de candidats, les deux termes les plus sélectifs d'une
+# requête sont d'abord croisés: seuls leurs produits communs sont notés
+INTERSECTION_MAX = 20000
+
+
+def normaliser(texte):
+    """Met un texte en minuscules sans accents: 'Crème Brûlée' -> 'creme brulee'"""
+    texte = str(texte).casefold()
+    if texte.isascii():
+        return texte
+    return _DIACRITIQUES.sub('', unicodedata.normalize('NFKD', texte.translate(_LIGATURES)))
+
+
+def mots(texte):
+    """Découpe un texte en mots normalisés"""
+    return _MOT.findall(normaliser(texte))
+
+
+@lru_cache(maxsize=1024)
+def _mots_categorie(categorie):
+    # Peu de catégories distinctes: leurs mots ne sont calculés qu'une fois
+    return frozenset(mots(categorie))
+
+
+def _inserer(ids, id_produit):
+    """Insère un id dans un array trié, sans doublon"""
+    if not ids or ids[-1] < id_produit:
+        ids.append(id_produit)
+        return
+    i = bisect.bisect_left(ids, id_produit)
+    if i == len(ids) or ids[i] != id_produit:
+        ids.insert(i, id_produit)
+
+
+def _enlever(ids, id_produit):
+    """Retire un id d'un array trié s'il y est"""
+    i = bisect.bisect_left(ids, id_produit)
+    if i < len(ids) and ids[i] == id_produit:
+        del ids[i]
+
+
+class SearchIndex:
+    """Index inversé des mots du nom et de la catégorie des produits
+
+    Chaque mot d'un nom pointe vers les ids des produits qui le contiennent,
+    et chaque catégorie vers les ids de ses produits; les mots de catégorie,
+    peu nombreux, pointent vers leurs catégories. Les ids sont gardés triés
+    dans des array, si bien qu'une recherche les parcourt par id croissant et
+    s'arrête dès que les limit meilleurs résultats sont acquis. Les mots
+    distincts sont gardés triés: les mots commençant par un préfixe forment
+    une tranche trouvée par bisection. Comme pour les index secondaires, le
+    tri est fait en une fois après le chargement; jusque-là les ids sont
+    gardés dans des ensembles.
+    """
+
+    def __init__(self):
+        self._noms = {}
+        self._categories = {}
+        self._mots_categories = {}
+        self._mots_produit = {}
+        self._tries = None
+
+    def __len__(self):
+        return len(self._mots_produit)
+
+    def trier(self):
+        if self._tries is not None:
+            # Déjà trié: les ajouts suivants ont gardé les array dans l'ordre
+            return
+        self._noms = {mot: array('q', sorted(ids)) for mot, ids in self._noms.items()}
+        self._categories = {categorie: array('q', sorted(ids)) for categorie, ids in self._categories.items()}
+        self._tries = sorted(self._noms.keys() | self._mots_categories.keys())
+
+    def _connu(self, mot):
+        return mot in self._noms or mot in self._mots_categories
+
+    def _nouveau_mot(self, mot):
+        if self._tries is not None and not self._connu(mot):
+            bisect.insort(self._tries, mot)
+
+    def _mot_retire(self, mot):
+        if self._tries is not None and not self._connu(mot):
+            del self._tries[bisect.bisect_left(self._tries, mot)]
+
+    def _ajouter_id(self, postings, cle, id_produit):
+        ids = postings.get(cle)
+        if self._tries is None:
+            if ids is None:
+                ids = postings[cle] = set()
+            ids.add(id_produit)
+            return
+        if ids is None:
+            ids = postings[cle] = array('q')
+        _inserer(ids, id_produit)
+
+    def _retirer_id(self, postings, cle, id_produit):
+        """Retire un id des postings de cle; renvoie True si cle n'a plus d'ids"""
+        ids = postings[cle]
+        if self._tries is None:
+            ids.discard(id_produit)
+        else:
+            _enlever(ids, id_produit)
+        if ids:
+            return False
+        del postings[cle]
+        return True
+
+    def ajouter(self, id_produit, nom, categorie):
+        if id_produit in self._mots_produit:
+            self.retirer(id_produit)
+        # Quelques mots par nom: un tuple de mots partagés suffit et coûte moins qu'un ensemble
+        mots_nom = tuple(dict.fromkeys(map(sys.intern, mots(nom))))
+        categorie = str(categorie)
+        self._mots_produit[id_produit] = (mots_nom, categorie)
+        for mot in mots_nom:
+            self._nouveau_mot(mot)
+            self._ajouter_id(self._noms, mot, id_produit)
+        if categorie not in self._categories:
+            for mot in _mots_categorie(categorie):
+                self._nouveau_mot(mot)
+                self._mots_categories.setdefault(mot, set()).add(categorie)
+        self._ajouter_id(self._categories, categorie, id_produit)
+
+    def charger(self, produits):
+        """Remplit d'un coup un index vide à partir de triplets (id, mots du nom, catégorie)
+
+        Les mots sont ceux que renvoie mots_produit(): le chargement d'un
+        instantané évite ainsi de redécouper chaque nom. L'index est trié à
+        la fin.
+        """
+        noms = defaultdict(list)
+        categories = defaultdict(list)
+        mots_produit = self._mots_produit
+        for id_produit, mots_nom, categorie in produits:
+            mots_produit[id_produit] = (mots_nom, categorie)
+            for mot in mots_nom:
+                noms[mot].append(id_produit)
+            categories[categorie].append(id_produit)
+        self._noms = {mot: array('q', sorted(ids)) for mot, ids in noms.items()}
+        self._categories = {categorie: array('q', sorted(ids)) for categorie, ids in categories.items()}
+        for categorie in self._categories:
+            for mot in _mots_categorie(categorie):
+                self._mots_categories.setdefault(mot, set()).add(categorie)
+        self._tries = sorted(self._noms.keys() | self._mots_categories.keys())
+
+    def mots_produit(self, id_produit):
+        """Mots normalisés du nom d'un produit indexé, pour charger()"""
+        return self._mots_produit[id_produit][0]
+
+    def retirer(self, id_produit):
+        mots_produit = self._mots_produit.pop(id_produit, None)
+        if mots_produit is None:
+            return
+        mots_nom, categorie = mots_produit
+        for mot in mots_nom:
+            if self._retirer_id(self._noms, mot, id_produit):
+                self._mot_retire(mot)
+        if self._retirer_id(self._categories, categorie, id_produit):
+            for mot in _mots_categorie(categorie):
+                categories = self._mots_categories[mot]
+                categories.discard(categorie)
+                if not categories:
+                    del self._mots_categories[mot]
+                    self._mot_retire(mot)
+
+    def _tranche(self, prefixe):
+        """Positions (debut, fin) des mots de l'index commençant par prefixe"""
+        debut = bisect.bisect_left(self._tries, prefixe)
+        return debut, bisect.bisect_left(self._tries, prefixe + '\U0010ffff', debut)
+
+    def _critere(self, terme, mots_tranche):
+        """Ce qu'il faut à un produit pour chaque poids du terme
+
+        Le terme lui-même, les mots de l'index qu'il débute, les catégories
+        dont il est un mot et celles dont il débute un mot: noter un produit
+        se résume alors à des tests d'appartenance.
+        """
+        return (
+            terme,
+            frozenset(mots_tranche),
+            self._mots_categories.get(terme, frozenset()),
+            {c for mot in mots_tranche for c in self._mots_categories.get(mot, ())},
+        )
+
+    def _score(self, id_produit, criteres):
+        """Somme, sur les termes, du meilleur poids obtenu; 0 si un terme manque"""
+        mots_nom, categorie = self._mots_produit[id_produit]
+        total = 0
+        for terme, mots_tranche, categories_mot, categories_prefixe in criteres:
+            if terme in mots_nom:
+                total += SCORE_NOM[0]
+            elif categorie in categories_mot:
+                total += max(SCORE_NOM[1], SCORE_CATEGORIE[0])
+            elif not mots_tranche.isdisjoint(mots_nom):
+                total += SCORE_NOM[1]
+            elif categorie in categories_prefixe:
+                total += SCORE_CATEGORIE[1]
+            else:
+                return 0
+        return total
+
+    def _candidats(self, mots_tranche):
+        """Nombre de produits des mots d'une tranche, compté une fois par catégorie"""
+        categories = {c for mot in mots_tranche for c in self._mots_categories.get(mot, ())}
+        return (sum(len(self._noms[mot]) for mot in mots_tranche if mot in self._noms)
+                + sum(len(self._categories[c]) for c in categories))
+
+    def _listes(self, mots_tranche):
+        """Listes d'ids des produits dont le nom ou la catégorie contient un mot de la tranche"""
+        categories = {c for mot in mots_tranche for c in self._mots_categories.get(mot, ())}
+        return ([self._noms[mot] for mot in mots_tranche if mot in self._noms]
+                + [self._categories[c] for c in categories])
+
+    def _plafond(self, terme, mots_tranche):
+        """Meilleur poids que le terme peut rapporter à un produit de l'index"""
+        if terme in self._noms:
+            return SCORE_NOM[0]
+        if terme in self._mots_categories or any(mot in self._noms for mot in mots_tranche):
+            return max(SCORE_NOM[1], SCORE_CATEGORIE[0])
+        return SCORE_CATEGORIE[1] if mots_tranche else 0
+
+    def _groupes(self, pilote, mots_pilote):
+        """Listes d'ids triés des candidats, par poids maximal décroissant du terme pilote
+
+        Un candidat absent des groupes précédents ne peut pas obtenir mieux
+        que le poids de son groupe sur ce terme.
+        """
+        prefixes = [mot for mot in mots_pilote if mot != pilote]
+        categories_prefixe = {c for mot in prefixes for c in self._mots_categories.get(mot, ())}
+        return [
+            (SCORE_NOM[0], [self._noms[pilote]] if pilote in self._noms else []),
+            (max(SCORE_NOM[1], SCORE_CATEGORIE[0]),
+             [self._noms[mot] for mot in prefixes if mot in self._noms]
+             + [self._categories[c] for c in self._mots_categories.get(pilote, ())]),
+            (SCORE_CATEGORIE[1], [self._categories[c] for c in categories_prefixe]),
+        ]
+
+    def rechercher(self, requete, limit=20):
+        """Renvoie les ids des produits dont chaque terme de la requête débute un mot
+
+        Les candidats sont les produits des mots que complète le terme le plus
+        sélectif de la requête, celui qui en donne le moins, parcourus par
+        groupe de poids décroissant sur ce terme puis par id croissant. Le parcours s'arrête dès qu'aucun
+        candidat restant ne peut entrer parmi les limit meilleurs: le coût
+        suit limit tant que les résultats sont nombreux. Les résultats sont
+        classés par score, nom avant catégorie et mot entier avant début de
+        mot, puis par id. Quand les deux termes les plus sélectifs donnent peu
+        de candidats, seuls leurs produits communs sont parcourus.
+        """
+        termes = list(dict.fromkeys(mots(requete)))
+        if not termes or limit <= 0:
+            return []
+        if self._tries is None:
+            self.trier()
+
+        tranches = {terme: self._tries[slice(*self._tranche(terme))] for terme in termes}
+        if not all(tranches.values()):
+            return []
+        candidats = {terme: self._candidats(tranches[terme]) for terme in termes}
+        # Le pilote est le terme aux candidats les moins nombreux
+        pilote = min(termes, key=candidats.get)
+        autres = sorted((terme for terme in termes if terme != pilote), key=candidats.get)
+        # Ce que les autres termes peuvent encore rapporter à un candidat
+        reste = sum(self._plafond(terme, tranches[terme]) for terme in autres)
+        # Les termes les plus sélectifs écartent d'abord un candidat; le pilote, déjà acquis, en dernier
+        criteres = [self._critere(terme, tranches[terme]) for terme in autres + [pilote]]
+        communs = None
+        if autres and candidats[pilote] + candidats[autres[0]] <= INTERSECTION_MAX:
+            communs = set(chain.from_iterable(self._listes(tranches[pilote])))
+            communs = communs.intersection(chain.from_iterable(self._listes(tranches[autres[0]])))
+            if not communs:
+                return []
+
+        # Tas des limit meilleurs (score, -id): le moins bon est en tête
+        meilleurs = []
+        vus = set()
+        for poids, listes in self._groupes(pilote, tranches[pilote]):
+            plafond = poids + reste
+            if len(meilleurs) == limit and meilleurs[0][0] > plafond:
+                continue
+            if communs is not None:
+                listes = [sorted(communs.intersection(chain.from_iterable(listes)))]
+            for id_produit in heapq.merge(*listes):
+                if len(meilleurs) == limit:
+                    pire, pire_id = meilleurs[0][0], -meilleurs[0][1]
+                    # Les ids suivants du groupe sont plus grands: aucun ne peut plus entrer
+                    if pire > plafond or (pire == plafond and pire_id < id_produit):
+                        break
+                if id_produit in vus:
+                    continue
+                vus.add(id_produit)
+                score = self._score(id_produit, criteres)
+                if not score:
+                    continue
+                if len(meilleurs) < limit:
+                    heapq.heappush(meilleurs, (score, -id_produit))
+                elif (score, -id_produit) > meilleurs[0]:
+                    heapq.heapreplace(meilleurs, (score, -id_produit))
+        return [-moins_id for _, moins_id in sorted(meilleurs, reverse=True)]
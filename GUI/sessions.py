@@ -0,0 +1,229 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from data_access import connexion, executer
+from metrics import metriques
+
+
+# Secret partagé par l'application de bureau, Flask et la CLI, sauf si SESSION_SECRET est défini
+CHEMIN_SECRET = Path(__file__).parent / ".session_secret"
+
+
+def charger_secret(chemin=CHEMIN_SECRET):
+    """Renvoie le secret de signature des jetons, créé au premier lancement"""
+    secret = os.environ.get("SESSION_SECRET")
+    if secret:
+        return secret.encode('utf-8')
+    chemin = Path(chemin)
+    try:
+        # Création exclusive: deux processus lancés ensemble gardent le même secret
+        fd = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return chemin.read_bytes()
+    with os.fdopen(fd, 'wb') as f:
+        secret = secrets.token_bytes(32)
+        f.write(secret)
+    return secret
+
+
+def _b64(donnees):
+    return base64.urlsafe_b64encode(donnees).rstrip(b'=').decode('ascii')
+
+
+class SessionCache:
+    """Cache LRU des sessions vérifiées, chaque entrée expirant après ttl secondes"""
+
+    def __init__(self, capacite=10000, ttl=60.0):
+        self.capacite = capacite
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entrees = OrderedDict()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def get(self, cle):
+        with self._lock:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            valeur, limite = entree
+            if time.monotonic() >= limite:
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return valeur
+
+    def put(self, cle, valeur, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entrees[cle] = (valeur, time.monotonic() + ttl)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.capacite:
+                self._entrees.popitem(last=False)
+
+    def retirer(self, cle):
+        with self._lock:
+            self._entrees.pop(cle, None)
+
+    def retirer_si(self, condition):
+        """Retire les entrées dont la valeur vérifie condition"""
+        with self._lock:
+            for cle in [c for c, (valeur, _) in self._entrees.items() if condition(valeur)]:
+                del self._entrees[cle]
+
+
+class SessionManager:
+    """Sessions ouvertes après une authentification bcrypt réussie
+
+    Un jeton a la forme identifiant.user_id.expiration.signature, signé par
+    HMAC-SHA256: un jeton falsifié ou expiré est rejeté sans requête. Un
+    jeton valide est cherché dans le cache, puis dans la table sessions, où
+    seule l'empreinte SHA-256 de l'identifiant est stockée. Une révocation
+    faite par un autre processus est vue au plus tard après revalidation
+    secondes, durée de vie d'une entrée du cache.
+
+    stockage est un pool ou un superviseur (méthode connexion()), une
+    connexion MySQL directe, ou None pour des sessions gardées en mémoire.
+    """
+
+    def __init__(self, stockage=None, secret=None, duree=8 * 3600, revalidation=60.0, capacite=10000):
+        self.stockage = stockage
+        self.secret = secret or charger_secret()
+        self.duree = duree
+        self.cache = SessionCache(capacite, revalidation)
+        # Sans base, le cache est la seule trace des sessions: il les garde jusqu'à expiration
+        self._memoire = {} if stockage is None else None
+
+    def _signer(self, charge):
+        return _b64(hmac.new(self.secret, charge.encode('ascii'), hashlib.sha256).digest())
+
+    @staticmethod
+    def _empreinte(identifiant):
+        return hashlib.sha256(identifiant.encode('ascii')).hexdigest()
+
+    def _decoder(self, jeton):
+        """Renvoie (identifiant, user_id, expiration) si la signature est valide, sinon None"""
+        try:
+            identifiant, user_id, expiration, signature = str(jeton).split('.')
+            user_id, expiration = int(user_id), int(expiration)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._signer(f"{identifiant}.{user_id}.{expiration}")):
+            return None
+        return identifiant, user_id, expiration
+
+    def creer(self, user_id, username):
+        """Ouvre une session et renvoie son jeton
+
+        Si la session ne peut pas être enregistrée, l'erreur est propagée et
+        aucun jeton n'est rendu: les autres processus le rejetteraient.
+        """
+        identifiant = secrets.token_urlsafe(24)
+        expiration = int(time.time()) + self.duree
+        charge = f"{identifiant}.{user_id}.{expiration}"
+        session = {'user_id': user_id, 'username': username, 'expiration': expiration}
+        if self._memoire is not None:
+            self._memoire[identifiant] = session
+        else:
+            with connexion(self.stockage) as connection:
+                executer(
+                    connection,
+                    "INSERT INTO sessions (id, user_id, expires_at) VALUES (%s, %s, %s)",
+                    (self._empreinte(identifiant), user_id, datetime.fromtimestamp(expiration))
+                )
+                connection.commit()
+        self.cache.put(identifiant, session)
+        metriques.incrementer('session.creation')
+        return f"{charge}.{self._signer(charge)}"
+
+    def verifier(self, jeton):
+        """Renvoie la session d'un jeton valide, non expiré et non révoqué, sinon None"""
+        decode = self._decoder(jeton)
+        if decode is None or decode[2] <= time.time():
+            metriques.incrementer('session.rejet')
+            return None
+        identifiant, user_id, expiration = decode
+
+        session = self.cache.get(identifiant)
+        if session is not None:
+            metriques.incrementer('session.cache.succes')
+            return session
+        metriques.incrementer('session.cache.echec')
+        if self._memoire is not None:
+            return self._memoire.get(identifiant)
+
+        try:
+            with connexion(self.stockage) as connection:
+                lignes = executer(
+                    connection,
+                    """SELECT s.user_id, u.username FROM sessions s JOIN users u ON u.id = s.user_id
+                       WHERE s.id = %s AND s.revoked_at IS NULL AND s.expires_at > NOW()""",
+                    (self._empreinte(identifiant),)
+                ).fetchall()
+        except Exception as e:
+            print(f"Impossible de vérifier la session: {e}")
+            return None
+        ligne = lignes[0] if lignes else None
+        if ligne is None or ligne['user_id'] != user_id:
+            return None
+        session = {'user_id': user_id, 'username': ligne['username'], 'expiration': expiration}
+        self.cache.put(identifiant, session)
+        return session
+
+    def _executer(self, requete, parametres):
+        try:
+            with connexion(self.stockage) as connection:
+                executer(connection, requete, parametres)
+                connection.commit()
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour des sessions: {e}")
+            return False
+        return True
+
+    def revoquer(self, jeton):
+        """Ferme la session d'un jeton; renvoie False si le jeton est invalide"""
+        decode = self._decoder(jeton)
+        if decode is None:
+            return False
+        identifiant = decode[0]
+        self.cache.retirer(identifiant)
+        metriques.incrementer('session.revocation')
+        if self._memoire is not None:
+            return self._memoire.pop(identifiant, None) is not None
+        return self._executer(
+            "UPDATE sessions SET revoked_at = NOW() WHERE id = %s AND revoked_at IS NULL",
+            (self._empreinte(identifiant),)
+        )
+
+    def revoquer_utilisateur(self, user_id):
+        """Ferme toutes les sessions d'un utilisateur, par exemple après un changement de mot de passe"""
+        self.cache.retirer_si(lambda session: session['user_id'] == user_id)
+        if self._memoire is not None:
+            for identifiant in [i for i, s in self._memoire.items() if s['user_id'] == user_id]:
+                del self._memoire[identifiant]
+            return True
+        return self._executer(
+            "UPDATE sessions SET revoked_at = NOW() WHERE user_id = %s AND revoked_at IS NULL",
+            (user_id,)
+        )
+
+    def purger(self):
+        """Supprime de la table les sessions expirées depuis plus d'un jour"""
+        if self._memoire is not None:
+            maintenant = time.time()
+            for identifiant in [i for i, s in self._memoire.items() if s['expiration'] <= maintenant]:
+                del self._memoire[identifiant]
+            return
+        self._executer(
+            "DELETE FROM sessions WHERE expires_at < %s",
+            (datetime.now() - timedelta(days=1),)
+        )
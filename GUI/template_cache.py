@@ -0,0 +1,171 @@
+import threading
+from pathlib import Path
+
+
+# Code JavaScript injecté dans chaque page pour relier les formulaires à l'API
+INJECTED_JS = """
+        <script>
+        // Gestion des clics sur les liens
+        document.addEventListener('DOMContentLoaded', function() {
+            // Gestion de la soumission du formulaire d'inscription
+            const registerForm = document.getElementById('registerForm');
+            if (registerForm) {
+                registerForm.addEventListener('submit', function(e) {
+                    e.preventDefault();
+                    const username = document.getElementById('username').value;
+                    const password = document.getElementById('password').value;
+                    
+                    window.pywebview.api.handle_register(username, password).then(function(response) {
+                        const messageDiv = document.getElementById('message');
+                        messageDiv.textContent = response.message;
+                        messageDiv.className = response.success ? 'success' : 'error';
+                        messageDiv.style.display = 'block';
+                        
+                        if (response.success) {
+                            // Rediriger vers la page de connexion après un court délai
+                            setTimeout(function() {
+                                window.pywebview.api.navigate('login');
+                            }, 1500);
+                        }
+                    });
+                });
+            }
+            
+            // Gestion de la soumission du formulaire de connexion
+            const loginForm = document.getElementById('loginForm');
+            if (loginForm) {
+                loginForm.addEventListener('submit', function(e) {
+                    e.preventDefault();
+                    const username = document.getElementById('username').value;
+                    const password = document.getElementById('password').value;
+                    const loginBtn = document.getElementById('loginBtn');
+                    const progress = document.getElementById('progress');
+                    
+                    loginBtn.disabled = true;
+                    loginBtn.textContent = 'Connexion...';
+                    progress.style.display = 'block';
+                    
+                    window.pywebview.api.handle_login(username, password).then(function(response) {
+                        const messageDiv = document.getElementById('message');
+                        messageDiv.textContent = response.message;
+                        messageDiv.style.color = response.success ? 'green' : 'red';
+                        messageDiv.style.display = 'block';
+                        
+                        loginBtn.disabled = false;
+                        loginBtn.textContent = 'Se connecter';
+                        progress.style.display = 'none';
+                        
+                        if (response.success) {
+                            // Rediriger vers la page d'accueil après connexion réussie
+                            setTimeout(function() {
+                                window.pywebview.api.navigate('dashboard');
+                            }, 1000);
+                        }
+                    }).catch(function(error) {
+                        const messageDiv = document.getElementById('message');
+                        messageDiv.textContent = 'Erreur lors de la connexion';
+                        messageDiv.style.color = 'red';
+                        messageDiv.style.display = 'block';
+                        
+                        loginBtn.disabled = false;
+                        loginBtn.textContent = 'Se connecter';
+                        progress.style.display = 'none';
+                        console.error('Login error:', error);
+                    });
+                });
+            }
+            
+            // Gestion des clics sur les liens de navigation
+            document.addEventListener('click', function(e) {
+                if (e.target.tagName === 'A') {
+                    e.preventDefault();
+                    const href = e.target.getAttribute('href');
+                    if (href.includes('login.html')) {
+                        window.pywebview.api.navigate('login');
+                    } else if (href.includes('template.html')) {
+                        window.pywebview.api.navigate('template');
+                    }
+                }
+            });
+        });
+        </script>
+        """
+
+MESSAGE_DIV = '<div id="message" style="margin: 10px 0; padding: 10px; border-radius: 4px; display: none;"></div>'
+
+
+class TemplateCache:
+    """Cache des pages HTML compilées, avec le CSS et le JavaScript déjà injectés
+
+    Chaque page est compilée une seule fois; les appels suivants renvoient la
+    chaîne en mémoire sans lire le disque. Avec verifier_mtime, les dates de
+    modification du template et du CSS sont comparées à chaque appel pour
+    recompiler une page modifiée pendant le développement.
+    """
+
+    def __init__(self, base_path, css_name="style.css", verifier_mtime=False):
+        self.base_path = Path(base_path)
+        self.css_path = self.base_path / css_name
+        self.verifier_mtime = verifier_mtime
+        self._lock = threading.Lock()
+        self._pages = {}
+
+    def __contains__(self, template_name):
+        return template_name in self._pages
+
+    def _mtimes(self, template_name):
+        template_path = self.base_path / f"{template_name}.html"
+        css_mtime = self.css_path.stat().st_mtime_ns if self.css_path.exists() else None
+        return template_path.stat().st_mtime_ns, css_mtime
+
+    def compiler(self, template_name):
+        """Lit un template HTML et y injecte le CSS et le JavaScript"""
+        template_path = self.base_path / f"{template_name}.html"
+        html_text = template_path.read_text(encoding="utf-8")
+        css_text = self.css_path.read_text(encoding="utf-8") if self.css_path.exists() else ""
+
+        # Remplacer le placeholder CSS et ajouter le JavaScript
+        html = html_text.replace(
+            "<!-- INJECT_CSS -->", 
+            f"<style>\n{css_text}\n</style>"
+        )
+        
+        # Ajouter un div pour les messages s'il n'existe pas
+        if '<main' in html and 'id="message"' not in html:
+            html = html.replace('<main', MESSAGE_DIV + '<main')
+        
+        # Insérer le JavaScript juste avant la fermeture du body
+        if "</body>" in html:
+            html = html.replace("</body>", f"{INJECTED_JS}\n</body>")
+        else:
+            html += INJECTED_JS
+            
+        return html
+
+    def get(self, template_name):
+        """Renvoie la page compilée, en la compilant au premier appel"""
+        page = self._pages.get(template_name)
+        if page is not None and not self.verifier_mtime:
+            return page[1]
+
+        with self._lock:
+            mtimes = self._mtimes(template_name) if self.verifier_mtime else None
+            page = self._pages.get(template_name)
+            if page is None or page[0] != mtimes:
+                page = (mtimes, self.compiler(template_name))
+                self._pages[template_name] = page
+            return page[1]
+
+    def prechauffer(self, template_names):
+        """Compile à l'avance les pages données, en ignorant celles absentes"""
+        for template_name in template_names:
+            if (self.base_path / f"{template_name}.html").exists():
+                self.get(template_name)
+
+    def invalider(self, template_name=None):
+        """Oublie une page compilée, ou toutes si aucune n'est précisée"""
+        with self._lock:
+            if template_name is None:
+                self._pages.clear()
+            else:
+                self._pages.pop(template_name, None)
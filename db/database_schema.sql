@@ -14,4 +14,39 @@ CREATE TABLE IF NOT EXISTS users (
 
 -- Exemple d'insertion d'un utilisateur (mot de passe: monmotdepasse123)
 INSERT INTO users (username, password_hash) 
-VALUES ('admin', '$2y$10$92IXUNpkjO0rOQ5byMi.Ye4oKoEa3Ro9llC/.og/at2.uheWG/igi');
\ No newline at end of file
+VALUES ('admin', '$2y$10$92IXUNpkjO0rOQ5byMi.Ye4oKoEa3Ro9llC/.og/at2.uheWG/igi');
+
+-- Table des produits, partagée par les postes et l'application Flask
+CREATE TABLE IF NOT EXISTS products (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nom VARCHAR(255) NOT NULL,
+    prix DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    quantite INT NOT NULL DEFAULT 0,
+    categorie VARCHAR(100) NOT NULL DEFAULT '',
+    date_ajout DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_products_categorie (categorie),
+    INDEX idx_products_prix (prix),
+    INDEX idx_products_date_ajout (date_ajout)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Version du catalogue: une seule ligne, incrémentée par chaque transaction qui écrit dans products.
+-- Avec instance, tirée à la création, elle sert d'ETag et de version commune à tous les processus
+CREATE TABLE IF NOT EXISTS products_version (
+    id TINYINT PRIMARY KEY,
+    instance CHAR(12) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO products_version (id, instance, version) VALUES (1, LEFT(MD5(UUID()), 12), 0);
+
+-- Sessions ouvertes après une connexion réussie; id est l'empreinte SHA-256 de l'identifiant du jeton
+CREATE TABLE IF NOT EXISTS sessions (
+    id CHAR(64) PRIMARY KEY,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NULL,
+    INDEX idx_sessions_user (user_id),
+    INDEX idx_sessions_expires_at (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
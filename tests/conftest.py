@@ -0,0 +1,28 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+# Les modules de GUI s'importent entre eux par leur nom, comme au lancement de l'application
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'GUI'))
+# La CLI importe de même ses propres modules (ascii) par leur nom
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent / 'CLI'))
+
+
+@pytest.fixture
+def flask_add(tmp_path, monkeypatch):
+    """Module add.py chargé sur un journal vide, avec des sessions gardées en mémoire"""
+    pytest.importorskip('flask')
+    from product_store import ProductStore
+    from sessions import SessionManager
+
+    chemin = tmp_path / 'produits.log'
+    ProductStore(chemin).fermer()
+    monkeypatch.setenv("PRODUITS_LOG", str(chemin))
+    monkeypatch.delenv("STOCKAGE_PRODUITS", raising=False)
+    add = importlib.reload(sys.modules['add']) if 'add' in sys.modules else importlib.import_module('add')
+    add._sessions = SessionManager(secret=b"tests")
+    yield add
+    add.store.fermer()
+    add.hasher.fermer()
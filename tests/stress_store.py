@@ -0,0 +1,149 @@
+"""Test de charge du journal de produits partagé entre processus
+
+Lance en parallèle des processus qui passent par l'application Flask
+(add.py, via son client de test) et d'autres qui font les mêmes appels au
+journal que WebViewApp. Tous créent, lisent, parcourent et suppriment des
+produits dans le même fichier, avec un seuil de compactage bas pour que des
+compactages se produisent pendant la charge. Vérifie ensuite qu'aucun id n'a
+été attribué deux fois, qu'aucune lecture n'a vu de ligne partielle et que
+le journal relu depuis le disque contient exactement les produits attendus.
+Une version bornée tourne avec les tests (test_stress_store.py).
+
+    python tests/stress_store.py [processus_par_entree] [operations_par_processus]
+"""
+import importlib
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'GUI'))
+
+from product_store import ProductStore
+
+
+def _charge_flask(chemin, operations, graine):
+    os.environ["PRODUITS_LOG"] = chemin
+    import add
+    if str(add.store.chemin) != chemin:
+        # Module hérité du processus parent (fork), ouvert sur un autre journal
+        add = importlib.reload(add)
+    from sessions import SessionManager
+
+    # Sessions en mémoire: la charge ne dépend pas de MySQL
+    add._sessions = SessionManager(secret=b"stress")
+    entetes = {'Authorization': f"Bearer {add._sessions.creer(graine, f'stress-{graine}')}"}
+    client = add.app.test_client()
+    alea = random.Random(graine)
+    crees, supprimes, erreurs = [], [], []
+    for i in range(operations):
+        reponse = client.post('/product', json={
+            'nom': f'flask-{graine}-{i}', 'prix': alea.uniform(1, 100),
+            'quantite': alea.randint(0, 50), 'categorie': alea.choice('abc')
+        }, headers=entetes)
+        if reponse.status_code != 201:
+            erreurs.append(f"POST {reponse.status_code}")
+            continue
+        crees.append(reponse.get_json()['id'])
+        if alea.random() < 0.4:
+            id_produit = crees[alea.randrange(len(crees))]
+            if id_produit not in supprimes:
+                if client.delete(f'/product/{id_produit}', headers=entetes).status_code == 204:
+                    supprimes.append(id_produit)
+                else:
+                    erreurs.append(f"DELETE {id_produit}")
+        if i % 50 == 0:
+            produits = client.get('/product').get_json()
+            if len({p['id'] for p in produits}) != len(produits):
+                erreurs.append("GET /product: id en double")
+    add.store.fermer()
+    return crees, supprimes, erreurs
+
+
+def _charge_bureau(chemin, operations, graine):
+    # Mêmes appels que WebViewApp.ajouter_produit, supprimer_produit,
+    # get_produit, requeter_produits et charger_produits
+    store = ProductStore(chemin, seuil_compactage=200)
+    alea = random.Random(graine)
+    crees, supprimes, erreurs = [], [], []
+    for i in range(operations):
+        produit = store.creer(f'bureau-{graine}-{i}', alea.uniform(1, 100), alea.randint(0, 50), alea.choice('abc'))
+        crees.append(produit['id'])
+        if store.get(produit['id']) != produit:
+            erreurs.append(f"get {produit['id']}")
+        if alea.random() < 0.4:
+            id_produit = crees[alea.randrange(len(crees))]
+            if id_produit not in supprimes and store.supprimer(id_produit):
+                supprimes.append(id_produit)
+        if i % 50 == 0:
+            page = store.requeter(0, 20, {'categorie': ('a', 'a')}, 'prix')
+            if any(p is None or p['categorie'] != 'a' for p in page['produits']):
+                erreurs.append("requeter: résultat incohérent")
+            produits = store.tous()
+            if len({p['id'] for p in produits}) != len(produits):
+                erreurs.append("tous: id en double")
+            # Parcours sur disque pendant que les autres processus écrivent et
+            # compactent: aucun produit de ce processus ne doit manquer
+            vus = [p['id'] for p in store.iterer()]
+            if len(set(vus)) != len(vus):
+                erreurs.append("iterer: id en double")
+            if set(crees) - set(supprimes) - set(vus):
+                erreurs.append("iterer: produits manquants")
+    store.fermer()
+    return crees, supprimes, erreurs
+
+
+def _executer(args):
+    entree, chemin, operations, graine = args
+    charge = _charge_flask if entree == 'flask' else _charge_bureau
+    return charge(chemin, operations, graine)
+
+
+def charger(dossier, processus, operations):
+    """Lance la charge dans dossier et retourne (résumé, erreurs)"""
+    chemin = str(Path(dossier) / "produits.log")
+    ProductStore(chemin).fermer()
+
+    taches = [
+        (entree, chemin, operations, graine)
+        for graine, entree in enumerate(['flask', 'bureau'] * processus)
+    ]
+    debut = time.perf_counter()
+    with multiprocessing.Pool(len(taches)) as pool:
+        resultats = pool.map(_executer, taches)
+    duree = time.perf_counter() - debut
+
+    crees = [i for c, _, _ in resultats for i in c]
+    supprimes = {i for _, s, _ in resultats for i in s}
+    erreurs = [e for _, _, e in resultats for e in e]
+    if len(set(crees)) != len(crees):
+        erreurs.append(f"{len(crees) - len(set(crees))} ids attribués deux fois")
+
+    store = ProductStore(chemin)
+    attendus = set(crees) - supprimes
+    presents = {p['id'] for p in store.tous()}
+    if presents != attendus:
+        erreurs.append(f"journal incohérent: {len(presents ^ attendus)} produits en écart")
+    store.fermer()
+
+    resume = f"{len(taches)} processus, {len(crees)} créations, {len(supprimes)} suppressions en {duree:.2f} s"
+    return resume, erreurs
+
+
+def main():
+    processus = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    resume, erreurs = charger(tempfile.mkdtemp(), processus, operations)
+    print(resume)
+    for erreur in erreurs:
+        print(f"ERREUR: {erreur}")
+    print("OK" if not erreurs else f"{len(erreurs)} erreurs")
+    return 1 if erreurs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
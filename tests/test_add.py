@@ -0,0 +1,82 @@
+import csv
+import io
+
+from product_store import CHAMPS_PRODUIT, ProductStore
+
+
+def entetes(add):
+    return {'Authorization': f"Bearer {add._sessions.creer(1, 'admin')}"}
+
+
+def test_routes_d_ecriture_exigent_une_session(flask_add):
+    client = flask_add.app.test_client()
+    produit = {'nom': "Café", 'prix': 4.5, 'quantite': 3}
+
+    assert client.post('/product', json=produit).status_code == 401
+    assert client.post('/product', json=produit, headers={'Authorization': "Bearer faux"}).status_code == 401
+    reponse = client.post('/product', json=produit, headers=entetes(flask_add))
+    assert reponse.status_code == 201
+    id_produit = reponse.get_json()['id']
+
+    assert client.delete(f'/product/{id_produit}').status_code == 401
+    assert client.get(f'/product/{id_produit}').status_code == 200
+    assert client.delete(f'/product/{id_produit}', headers=entetes(flask_add)).status_code == 204
+
+
+def remplir(add, nombre=5):
+    return add.store.creer_lot([
+        {'nom': f"Produit {i}", 'prix': float(i), 'quantite': i, 'categorie': "épicerie" if i % 2 else "thé"}
+        for i in range(1, nombre + 1)
+    ])
+
+
+def test_etag_et_304(flask_add):
+    remplir(flask_add)
+    client = flask_add.app.test_client()
+
+    reponse = client.get('/product/2')
+    assert reponse.status_code == 200 and reponse.get_json()['nom'] == "Produit 2"
+    etag = reponse.headers['ETag']
+    revalidation = client.get('/product/2', headers={'If-None-Match': etag})
+    assert revalidation.status_code == 304 and revalidation.data == b''
+    assert client.get('/product/99').status_code == 404
+
+    # Écriture d'un autre processus sur le même journal: nouvel ETag et nouvelle réponse
+    autre = ProductStore(flask_add.store.chemin)
+    try:
+        autre.modifier_lot([{'id': 2, 'nom': "Sucre"}])
+    finally:
+        autre.fermer()
+    reponse = client.get('/product/2', headers={'If-None-Match': etag})
+    assert reponse.status_code == 200 and reponse.get_json()['nom'] == "Sucre"
+    assert reponse.headers['ETag'] != etag
+
+
+def test_page_filtree(flask_add):
+    remplir(flask_add)
+    client = flask_add.app.test_client()
+
+    page = client.get('/product?categorie=épicerie&tri=prix&decroissant=1&limit=2').get_json()
+    assert page['total'] == 3
+    assert [p['id'] for p in page['produits']] == [5, 3]
+    assert client.get('/product?tri=nom').status_code == 400
+
+
+def test_catalogue_diffuse(flask_add):
+    produits = remplir(flask_add, 300)
+    client = flask_add.app.test_client()
+
+    reponse = client.get('/product')
+    assert reponse.is_streamed
+    assert reponse.get_json() == produits
+    assert client.get('/product', headers={'If-None-Match': reponse.headers['ETag']}).status_code == 304
+
+    reponse = client.get('/product?format=csv')
+    assert reponse.is_streamed and reponse.mimetype == 'text/csv'
+    lignes = list(csv.reader(io.StringIO(reponse.get_data(as_text=True))))
+    assert lignes[0] == CHAMPS_PRODUIT
+    assert lignes[1:] == [[str(p[champ]) for champ in CHAMPS_PRODUIT] for p in produits]
+
+
+def test_catalogue_vide_diffuse(flask_add):
+    assert flask_add.app.test_client().get('/product').get_json() == []
@@ -0,0 +1,103 @@
+import random
+from array import array
+
+import pytest
+
+import aggregates
+from aggregates import InventoryAggregates
+from product_store import ProductStore
+
+
+CATEGORIES = ['épicerie', 'thé', 'café', '']
+
+
+def produits_aleatoires(alea, nombre):
+    # Prix au quart près: les sommes sont exactes quel que soit l'ordre d'addition
+    return [(alea.choice(CATEGORIES), alea.randint(0, 400) / 4, alea.randint(0, 50)) for _ in range(nombre)]
+
+
+def incremental(alea):
+    """Totaux tenus par ajouter et retirer, min et max périmés recalculés comme le fait le store"""
+    agregats = InventoryAggregates()
+    vivants = []
+    for _ in range(2000):
+        if vivants and alea.random() < 0.45:
+            agregats.retirer(*vivants.pop(alea.randrange(len(vivants))))
+        else:
+            produit = produits_aleatoires(alea, 1)[0]
+            agregats.ajouter(*produit)
+            vivants.append(produit)
+    assert agregats.perimes()
+    for categorie in agregats.perimes():
+        agregats.recalculer(categorie, (prix for c, prix, _ in vivants if c == categorie))
+    return agregats, vivants
+
+
+def colonnes(vivants):
+    codes = array('i', (CATEGORIES.index(c) for c, _, _ in vivants))
+    return CATEGORIES, codes, array('d', (p for _, p, _ in vivants)), array('q', (q for _, _, q in vivants))
+
+
+def test_incremental_identique_a_la_reconstruction():
+    agregats, vivants = incremental(random.Random(5))
+
+    reconstruit = InventoryAggregates()
+    reconstruit.reconstruire(vivants)
+    assert agregats.resume() == reconstruit.resume()
+    assert agregats.perimes() == []
+
+
+def test_reconstruction_numpy_identique(monkeypatch):
+    pytest.importorskip('numpy')
+    agregats, vivants = incremental(random.Random(8))
+
+    monkeypatch.setattr(aggregates, 'SEUIL_NUMPY', 0)
+    par_tuples, par_colonnes = InventoryAggregates(), InventoryAggregates()
+    par_tuples.reconstruire(vivants)
+    par_colonnes.reconstruire_colonnes(*colonnes(vivants))
+
+    assert par_tuples.resume() == par_colonnes.resume() == agregats.resume()
+
+
+def test_sans_numpy(monkeypatch):
+    vivants = produits_aleatoires(random.Random(2), 300)
+    attendu = InventoryAggregates()
+    attendu.reconstruire(vivants)
+
+    monkeypatch.setattr(aggregates, 'SEUIL_NUMPY', 0)
+    monkeypatch.setattr(aggregates, '_numpy', lambda: None)
+    agregats = InventoryAggregates()
+    agregats.reconstruire_colonnes(*colonnes(vivants))
+
+    assert agregats.resume() == attendu.resume()
+
+
+def test_categorie_videe_disparait():
+    agregats = InventoryAggregates()
+    agregats.ajouter('thé', 2.0, 3)
+    agregats.ajouter('café', 1.0, 1)
+    agregats.retirer('thé', 2.0, 3)
+
+    assert list(agregats.resume()['categories']) == ['café']
+    assert agregats.perimes() == []
+
+
+def test_agregats_du_store(tmp_path):
+    store = ProductStore(tmp_path / 'produits.log')
+    try:
+        store.creer_lot([
+            {'nom': "Café", 'prix': 2.5, 'quantite': 4, 'categorie': "boissons"},
+            {'nom': "Thé", 'prix': 1.0, 'quantite': 10, 'categorie': "boissons"},
+            {'nom': "Sucre", 'prix': 0.75, 'quantite': 2, 'categorie': "épicerie"},
+        ])
+        # Le prix minimal disparaît par modification puis par suppression: min et max relus
+        store.modifier_lot([{'id': 2, 'prix': 3.0}])
+        store.supprimer(3)
+        resume = store.agregats()
+
+        assert resume == store.agregats(recalculer=True)
+        assert resume['categories'] == {'boissons': {
+            'nombre': 2, 'quantite': 14, 'valeur': 40.0, 'prix_min': 2.5, 'prix_max': 3.0
+        }}
+    finally:
+        store.fermer()
@@ -0,0 +1,43 @@
+import json
+
+from db_test import lire_utilisateurs
+
+
+def test_lire_utilisateurs_csv_ignore_les_lignes_invalides(tmp_path, capsys):
+    chemin = tmp_path / 'utilisateurs.csv'
+    chemin.write_text(
+        "username,password\n"
+        "alice,secret1\n"
+        "bob\n"
+        ",secret3\n"
+        "\"carol\",\"mot de passe,\n sur deux lignes\"\n"
+        "dave,secret5\n",
+        encoding='utf-8'
+    )
+    rejets = []
+
+    assert list(lire_utilisateurs(str(chemin), rejets)) == [
+        ("alice", "secret1"), ("carol", "mot de passe,\n sur deux lignes"), ("dave", "secret5")
+    ]
+    assert [(numero, str(raison)) for numero, raison in rejets] == [
+        (3, "password manquant"), (4, "username manquant")
+    ]
+    assert "Ligne 3 ignorée: password manquant" in capsys.readouterr().out
+
+
+def test_lire_utilisateurs_jsonl_ignore_les_lignes_invalides(tmp_path):
+    chemin = tmp_path / 'utilisateurs.jsonl'
+    lignes = [
+        json.dumps({'username': "alice", 'password': "secret1"}),
+        json.dumps({'username': "bob"}),
+        "",
+        "{pas du json",
+        json.dumps(["carol", "secret"]),
+        json.dumps({'username': "dave", 'password': 5}),
+        json.dumps({'username': "eve", 'password': "secret7", 'role': "admin"}),
+    ]
+    chemin.write_text("\n".join(lignes) + "\n", encoding='utf-8')
+    rejets = []
+
+    assert list(lire_utilisateurs(str(chemin), rejets)) == [("alice", "secret1"), ("eve", "secret7")]
+    assert [numero for numero, _ in rejets] == [2, 4, 5, 6]
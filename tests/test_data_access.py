@@ -0,0 +1,154 @@
+import pytest
+from mysql.connector import Error
+
+from data_access import ERREUR_DOUBLON, UserRepository, curseur_prepare, executer, iterer
+
+
+class FausseConnexion:
+    """Connexion sans serveur: table users en mémoire, autocommit comme les connexions du pool
+
+    Hors de start_transaction(), chaque insertion est validée aussitôt.
+    """
+
+    def __init__(self, lignes=()):
+        self.connection_id = 1
+        self.curseurs = []
+        self.users = {}
+        self.transaction = None
+        self.lignes = list(lignes)
+
+    def cursor(self, prepared=False, dictionary=False, buffered=None):
+        curseur = FauxCurseur(self, prepared)
+        self.curseurs.append(curseur)
+        return curseur
+
+    @property
+    def in_transaction(self):
+        return self.transaction is not None
+
+    def start_transaction(self):
+        self.transaction = {}
+
+    def commit(self):
+        if self.transaction is not None:
+            self.users.update(self.transaction)
+        self.transaction = None
+
+    def rollback(self):
+        self.transaction = None
+
+    def inserer(self, username, password_hash):
+        if username in self.users or username in (self.transaction or {}):
+            raise Error(msg=f"Duplicate entry '{username}'", errno=ERREUR_DOUBLON)
+        if len(username) > 50:
+            raise Error(msg="Data too long for column 'username'", errno=1406)
+        (self.users if self.transaction is None else self.transaction)[username] = password_hash
+
+
+class ConnexionEmpruntee:
+    """Comme PooledMySQLConnection: enveloppe rendue au pool après chaque emprunt"""
+
+    def __init__(self, cnx):
+        self._cnx = cnx
+
+    def __getattr__(self, nom):
+        return getattr(self._cnx, nom)
+
+
+class FauxCurseur:
+    def __init__(self, connexion, prepared):
+        self.connexion = connexion
+        self.prepared = prepared
+        self.executions = []
+        self.restantes = []
+        self.ferme = False
+        self.lastrowid = None
+
+    def execute(self, requete, parametres=()):
+        self.executions.append(parametres)
+        if requete == UserRepository.CREER:
+            self.connexion.inserer(*parametres)
+            self.lastrowid = len(self.connexion.users)
+        else:
+            self.restantes = list(self.connexion.lignes)
+
+    def executemany(self, requete, lot):
+        for parametres in lot:
+            self.execute(requete, parametres)
+
+    def fetchmany(self, taille):
+        lot, self.restantes = self.restantes[:taille], self.restantes[taille:]
+        return lot
+
+    def close(self):
+        self.ferme = True
+
+
+def test_curseur_prepare_reutilise_par_connexion():
+    cnx = FausseConnexion()
+    premier = curseur_prepare(cnx, "SELECT 1")
+
+    assert curseur_prepare(cnx, "SELECT 1") is premier and premier.prepared
+    assert curseur_prepare(cnx, "SELECT 2") is not premier
+    # Gardé sur la connexion sous-jacente: un nouvel emprunt au pool le retrouve
+    assert curseur_prepare(ConnexionEmpruntee(cnx), "SELECT 1") is premier
+    assert len(cnx.curseurs) == 2
+
+
+def test_curseur_prepare_oublie_apres_reconnexion():
+    cnx = FausseConnexion()
+    premier = curseur_prepare(cnx, "SELECT 1")
+
+    # Nouvelle session serveur: l'instruction préparée n'existe plus
+    cnx.connection_id = 2
+    second = curseur_prepare(cnx, "SELECT 1")
+    assert second is not premier
+    assert curseur_prepare(cnx, "SELECT 1") is second
+
+
+def test_executer_passe_les_parametres():
+    cnx = FausseConnexion()
+
+    curseur = executer(cnx, "SELECT id FROM users WHERE username = %s", ("admin",))
+    executer(cnx, "SELECT id FROM users WHERE username = %s", ("autre",))
+
+    assert curseur.executions == [("admin",), ("autre",)]
+
+
+def test_iterer_par_lots_et_interrompu():
+    cnx = FausseConnexion(lignes=[{'id': i} for i in range(25)])
+    assert [ligne['id'] for ligne in iterer(cnx, "SELECT id FROM users", taille_lot=10)] == list(range(25))
+    assert cnx.curseurs[-1].ferme
+
+    parcours = iterer(cnx, "SELECT id FROM users", taille_lot=10)
+    assert next(parcours) == {'id': 0}
+    parcours.close()
+    # Le reste du résultat a été lu avant de rendre la connexion
+    assert cnx.curseurs[-1].restantes == [] and cnx.curseurs[-1].ferme
+
+
+def test_creer_lot_sans_doublon():
+    cnx = FausseConnexion()
+
+    assert UserRepository(cnx).creer_lot([("alice", "h1"), ("bob", "h2")]) == (2, [])
+    assert cnx.users == {"alice": "h1", "bob": "h2"}
+
+
+def test_creer_lot_autre_erreur_propagee():
+    cnx = FausseConnexion()
+
+    with pytest.raises(Error) as erreur:
+        UserRepository(cnx).creer_lot([("alice", "h1"), ("x" * 60, "h2")])
+    assert erreur.value.errno == 1406
+
+
+def test_creer_lot_isole_les_doublons():
+    cnx = FausseConnexion()
+    cnx.users["bob"] = "ancien"
+
+    ajoutes, doublons = UserRepository(cnx).creer_lot([("alice", "h1"), ("bob", "h2"), ("carol", "h3"), ("alice", "h4")])
+
+    # Le lot rejeté est annulé en entier avant d'être rejoué ligne par ligne
+    assert (ajoutes, doublons) == (2, ["bob", "alice"])
+    assert cnx.users == {"bob": "ancien", "alice": "h1", "carol": "h3"}
+    assert not cnx.in_transaction
@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import Error
+
+from db_pool import BaseIndisponible, ConnectionSupervisor
+
+
+class FauxPool:
+    """Pool sans serveur: chaque emprunt échoue comme un serveur injoignable tant que panne est vrai"""
+
+    def __init__(self):
+        self.panne = False
+
+    @contextmanager
+    def connexion(self):
+        if self.panne:
+            raise Error(msg="Can't connect to MySQL server", errno=2003)
+        yield object()
+
+    def statistiques(self):
+        return {}
+
+
+DELAI = 0.05
+
+
+@pytest.fixture
+def pool():
+    return FauxPool()
+
+
+@pytest.fixture
+def disjoncteur(pool):
+    disjoncteur = ConnectionSupervisor(lambda: pool, seuil_echecs=2, delai_min=DELAI, delai_max=DELAI)
+    # Sans minuteur: les essais ne viennent que des requêtes du test
+    disjoncteur.fermer()
+    return disjoncteur
+
+
+def requete(disjoncteur):
+    with disjoncteur.connexion():
+        pass
+
+
+def ouvrir(disjoncteur, pool):
+    pool.panne = True
+    for _ in range(disjoncteur.seuil_echecs):
+        with pytest.raises(Error):
+            requete(disjoncteur)
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.OUVERT
+
+
+def test_s_ouvre_apres_seuil_echecs(disjoncteur, pool):
+    pool.panne = True
+    with pytest.raises(Error):
+        requete(disjoncteur)
+    assert disjoncteur.disponible()
+
+    with pytest.raises(Error):
+        requete(disjoncteur)
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.OUVERT
+    assert disjoncteur.etat()['etat'] == 'erreur'
+
+    pool.panne = False
+    with pytest.raises(BaseIndisponible):
+        requete(disjoncteur)
+    assert disjoncteur.statistiques()['rejets'] == 1
+
+
+def test_requete_refusee_ne_compte_pas(disjoncteur, pool):
+    for _ in range(5):
+        with pytest.raises(Error):
+            with disjoncteur.connexion():
+                raise Error(msg="Duplicate entry", errno=1062)
+    assert disjoncteur.disponible()
+
+
+def test_essai_reussi_referme(disjoncteur, pool):
+    ouvrir(disjoncteur, pool)
+    pool.panne = False
+    time.sleep(DELAI)
+
+    with disjoncteur.connexion():
+        assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.SEMI_OUVERT
+        # Un seul essai à la fois: les autres requêtes échouent sans attendre
+        with pytest.raises(BaseIndisponible):
+            requete(disjoncteur)
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.FERME
+    assert disjoncteur.etat()['etat'] == 'connecte'
+
+
+def test_essai_echoue_rouvre(disjoncteur, pool):
+    ouvrir(disjoncteur, pool)
+    time.sleep(DELAI)
+
+    with pytest.raises(Error) as erreur:
+        requete(disjoncteur)
+    assert not isinstance(erreur.value, BaseIndisponible)
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.OUVERT
+    assert disjoncteur.statistiques()['ouvertures'] == 2
+    with pytest.raises(BaseIndisponible):
+        requete(disjoncteur)
+
+
+def test_essai_interrompu_rend_sa_place(disjoncteur, pool):
+    ouvrir(disjoncteur, pool)
+    pool.panne = False
+    time.sleep(DELAI)
+
+    with pytest.raises(RuntimeError):
+        with disjoncteur.connexion():
+            raise RuntimeError("erreur de l'appelant")
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.OUVERT
+
+    # L'essai suivant part aussitôt, sans nouveau délai
+    requete(disjoncteur)
+    assert disjoncteur.disponible()
+
+
+def test_essai_abandonne_rend_sa_place(disjoncteur, pool):
+    ouvrir(disjoncteur, pool)
+    pool.panne = False
+    time.sleep(DELAI)
+
+    contexte = disjoncteur.connexion()
+    contexte.__enter__()
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.SEMI_OUVERT
+    contexte.gen.close()
+    assert disjoncteur.etat_disjoncteur == ConnectionSupervisor.OUVERT
+
+    requete(disjoncteur)
+    assert disjoncteur.disponible()
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+pytest.importorskip('webview')
+
+from gui import WebViewApp
+from product_store import ProductStore
+
+
+@pytest.fixture
+def app(tmp_path):
+    # Sans fenêtre ni MySQL: seules les méthodes de l'API JavaScript sur les produits sont appelées
+    app = WebViewApp.__new__(WebViewApp)
+    app.store = ProductStore(tmp_path / 'produits.log')
+    yield app
+    app.store.fermer()
+
+
+def test_ajouter_produits_un_resultat_par_element(app):
+    resultats = app.ajouter_produits([
+        {'nom': " Café ", 'prix': "4.5", 'quantite': "3", 'categorie': None},
+        {'nom': "", 'prix': 1, 'quantite': 1},
+        {'nom': "Sans prix", 'quantite': 1},
+        {'nom': "Thé", 'prix': "nan", 'quantite': 1},
+        {'nom': "Sucre", 'prix': 2, 'quantite': 2 ** 70},
+        {'nom': "Sel", 'prix': 1, 'quantite': 1},
+    ])
+
+    assert [r['ok'] for r in resultats] == [True, False, False, False, False, True]
+    assert "nom est vide" in resultats[1]['erreur'] and "prix" in resultats[2]['erreur']
+    # Les éléments valides sont écrits ensemble, à la suite
+    assert [(r['produit']['id'], r['produit']['nom']) for r in resultats if r['ok']] == [(1, "Café"), (2, "Sel")]
+    assert resultats[0]['produit']['prix'] == 4.5 and resultats[0]['produit']['categorie'] == ""
+    assert [p['nom'] for p in app.charger_produits()] == ["Café", "Sel"]
+
+
+def test_supprimer_produits(app):
+    app.ajouter_produits([{'nom': "Café", 'prix': 1, 'quantite': 1}] * 2)
+
+    resultats = app.supprimer_produits([1, "2", "abc", 99, 1])
+
+    assert resultats[:2] == [{'ok': True, 'produit': {'id': 1}}, {'ok': True, 'produit': {'id': 2}}]
+    assert not resultats[2]['ok']
+    assert resultats[3] == resultats[4] == {'ok': False, 'erreur': "Produit introuvable"}
+    assert app.charger_produits() == []
+
+
+def test_modifier_produits(app):
+    app.ajouter_produits([{'nom': "Café", 'prix': 1, 'quantite': 1}])
+
+    resultats = app.modifier_produits([
+        {'id': "1", 'prix': "9.5"},
+        {'id': 42, 'nom': "Thé"},
+        {'nom': "Sans id"},
+        {'id': 1, 'quantite': "beaucoup"},
+    ])
+
+    assert resultats[0]['ok'] and resultats[0]['produit']['prix'] == 9.5
+    assert resultats[1] == {'ok': False, 'erreur': "Produit introuvable"}
+    assert "id" in resultats[2]['erreur']
+    assert not resultats[3]['ok']
+    assert app.store.get(1)['quantite'] == 1
+
+
+def test_echec_de_l_ecriture_groupee(app, monkeypatch):
+    def en_panne(elements):
+        raise OSError("disque plein")
+    monkeypatch.setattr(app.store, 'creer_lot', en_panne)
+
+    resultats = app.ajouter_produits([{'nom': "Café", 'prix': 1, 'quantite': 1}, {'nom': ""}])
+
+    assert resultats[0] == {'ok': False, 'erreur': "disque plein"}
+    assert not resultats[1]['ok'] and resultats[1]['erreur'] != "disque plein"
+
+
+def appliquer_changements(catalogue, changements):
+    """Ce que fait le tableau de bord avec une réponse de changements_depuis"""
+    if changements['complet']:
+        catalogue.clear()
+    for produit in changements['produits']:
+        catalogue[produit['id']] = produit
+    for id_produit in changements['supprimes']:
+        catalogue.pop(id_produit, None)
+    return str(changements['version'])
+
+
+def test_changements_depuis_reconstruit_le_catalogue(app):
+    alea = random.Random(3)
+    catalogue = {}
+    # La page garde la version reçue, renvoyée telle quelle par JavaScript
+    version = appliquer_changements(catalogue, app.changements_depuis())
+    complets = 0
+    for tour in range(60):
+        for _ in range(alea.randint(0, 4)):
+            ids = [p['id'] for p in app.charger_produits()]
+            choix = alea.random()
+            if choix < 0.5 or not ids:
+                app.ajouter_produits([{'nom': f"Produit {tour}", 'prix': alea.randint(1, 9), 'quantite': 1}])
+            elif choix < 0.8:
+                app.modifier_produits([{'id': alea.choice(ids), 'quantite': alea.randint(0, 9)}])
+            else:
+                app.supprimer_produits([alea.choice(ids)])
+        if tour % 20 == 19:
+            # Compactage par un autre processus: l'historique ne couvre plus la version du client
+            autre = ProductStore(app.store.chemin)
+            autre.compacter()
+            autre.fermer()
+        changements = app.changements_depuis(version)
+        complets += changements['complet']
+        version = appliquer_changements(catalogue, changements)
+
+        assert catalogue == {p['id']: p for p in app.charger_produits()}
+    assert complets == 3
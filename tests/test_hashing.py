@@ -0,0 +1,37 @@
+import pytest
+
+from hashing import _hacher, cout_du_hash, doit_rehacher
+
+
+def faux_hash(cout, prefixe='$2b$'):
+    return f"{prefixe}{cout:02d}$" + "a" * 53
+
+
+@pytest.mark.parametrize('cout_stocke, attendu', [
+    (12, False),
+    (11, False),
+    (13, False),
+    # Trop faible: le hash est renforcé
+    (10, True),
+    # Trop élevé, venu d'un poste plus rapide: le hash est allégé
+    (14, True),
+])
+def test_doit_rehacher_dans_les_deux_sens(cout_stocke, attendu):
+    assert doit_rehacher(faux_hash(cout_stocke), 12) is attendu
+
+
+def test_doit_rehacher_ancien_format():
+    assert doit_rehacher(faux_hash(12, '$2y$'), 12)
+
+
+def test_doit_rehacher_sans_marge():
+    assert doit_rehacher(faux_hash(13), 12, marge=0)
+    assert not doit_rehacher(faux_hash(12), 12, marge=0)
+
+
+def test_doit_rehacher_vrai_hash():
+    stocke = _hacher("motdepasse", 4)
+
+    assert cout_du_hash(stocke) == 4
+    assert not doit_rehacher(stocke, 5)
+    assert doit_rehacher(stocke, 6)
@@ -0,0 +1,93 @@
+import re
+
+import pytest
+
+from metrics import BORNES, Metrics
+
+
+def lire_prometheus(texte):
+    """Valeurs du texte exporté, par nom de série avec ses étiquettes"""
+    valeurs = {}
+    for ligne in texte.splitlines():
+        if ligne.startswith('#'):
+            continue
+        serie, valeur = ligne.rsplit(' ', 1)
+        valeurs[serie] = float(valeur)
+    return valeurs
+
+
+def test_resume_et_quantiles():
+    metriques = Metrics()
+    for _ in range(90):
+        metriques.enregistrer('lecture', 0.001)
+    for _ in range(10):
+        metriques.enregistrer('lecture', 0.02)
+
+    resume = metriques.resume()['durees']['lecture']
+    assert resume['nombre'] == 100
+    assert resume['total_ms'] == pytest.approx(290.0)
+    # Quantiles estimés par la borne de leur classe, sans dépasser le maximum observé
+    assert resume['p50_ms'] == 1.0
+    assert resume['p95_ms'] == resume['p99_ms'] == resume['max_ms'] == 20.0
+
+
+def test_export_prometheus():
+    metriques = Metrics()
+    # Une durée égale à une borne compte dans sa classe (le = inférieur ou égal)
+    for duree in (0.001, 0.0011, 0.3, 42.0):
+        metriques.enregistrer('http.get_produit', duree)
+    metriques.incrementer('http.statut.200', 3)
+
+    texte = metriques.texte_prometheus()
+    valeurs = lire_prometheus(texte)
+    assert "# TYPE guardia_duree_secondes histogram" in texte
+
+    def bucket(le):
+        return valeurs[f'guardia_duree_secondes_bucket{{operation="http.get_produit",le="{le}"}}']
+
+    cumuls = [bucket(borne) for borne in BORNES]
+    assert cumuls == sorted(cumuls)
+    assert bucket(0.0005) == 0 and bucket(0.001) == 1 and bucket(0.0025) == 2
+    assert bucket(0.5) == 3 and bucket(10.0) == 3
+    # Au-delà de la dernière borne: seulement dans +Inf
+    assert bucket('+Inf') == valeurs['guardia_duree_secondes_count{operation="http.get_produit"}'] == 4
+    assert valeurs['guardia_duree_secondes_sum{operation="http.get_produit"}'] == pytest.approx(42.3021)
+    assert valeurs['guardia_total{compteur="http.statut.200"}'] == 3
+
+
+def test_erreurs_comptees_et_durees_enregistrees():
+    metriques = Metrics()
+
+    @metriques.chronometre('api.echec')
+    def echec():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        echec()
+    with pytest.raises(KeyError):
+        with metriques.mesurer('bloc'):
+            raise KeyError
+
+    resume = metriques.resume()
+    assert resume['compteurs'] == {'api.echec.erreurs': 1, 'bloc.erreurs': 1}
+    assert resume['durees']['api.echec']['nombre'] == resume['durees']['bloc']['nombre'] == 1
+
+
+def test_desactive():
+    metriques = Metrics(actif=False)
+
+    assert metriques.chronometre('api')(lambda: 7)() == 7
+    with metriques.mesurer('bloc'):
+        pass
+    metriques.incrementer('compteur')
+
+    assert metriques.resume() == {'durees': {}, 'compteurs': {}}
+
+
+def test_route_metrics(flask_add):
+    client = flask_add.app.test_client()
+    client.get('/product/1')
+
+    texte = client.get('/metrics').get_data(as_text=True)
+    assert re.search(r'guardia_duree_secondes_count\{operation="http.get_produit"\} [1-9]', texte)
+    assert client.get('/metrics?format=json').get_json()['compteurs']['http.statut.404'] >= 1
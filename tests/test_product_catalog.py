@@ -0,0 +1,33 @@
+import csv
+
+from product_catalog import catalogue_vers_csv, csv_vers_catalogue, est_catalogue, lire_produits
+from product_store import CHAMPS_PRODUIT, lire_produits_csv
+
+
+PRODUITS = [
+    {'id': 3, 'nom': "Crème brûlée", 'prix': 4.5, 'quantite': 12, 'categorie': "crèmerie",
+     'date_ajout': "2024-01-01 10:00:00"},
+    {'id': 1, 'nom': "Café, \"moulu\"", 'prix': 0.1, 'quantite': 0, 'categorie': "épicerie",
+     'date_ajout': "2024-01-02 11:00:00"},
+    {'id': 2 ** 40, 'nom': "", 'prix': 1e9, 'quantite': -3, 'categorie': "",
+     'date_ajout': ""},
+    {'id': 7, 'nom': "Thé\nvert", 'prix': 2.0, 'quantite': 2 ** 62, 'categorie': "épicerie",
+     'date_ajout': "2024-01-01 10:00:00"},
+]
+
+
+def test_csv_binaire_csv_aller_retour(tmp_path):
+    source = tmp_path / 'produits.csv'
+    with open(source, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CHAMPS_PRODUIT)
+        writer.writeheader()
+        writer.writerows(PRODUITS)
+
+    binaire = tmp_path / 'produits.bin'
+    assert csv_vers_catalogue(source, binaire) == len(PRODUITS)
+    assert est_catalogue(binaire) and not est_catalogue(source)
+    assert list(lire_produits(binaire)) == PRODUITS
+
+    retour = tmp_path / 'retour.csv'
+    assert catalogue_vers_csv(binaire, retour) == len(PRODUITS)
+    assert list(lire_produits_csv(retour)) == PRODUITS
@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+
+import pytest
+
+from product_db import MySQLProductStore, stockage_configure
+
+
+class FausseBase:
+    """Tables products et products_version en mémoire, partagées par plusieurs stockages
+
+    Ne comprend que les requêtes de creer_lot, supprimer_lot et rafraichir.
+    """
+
+    def __init__(self):
+        self.produits = {}
+        self.ligne_version = None
+        self.prochain_id = 1
+
+    @contextmanager
+    def connexion(self):
+        yield self
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cursor(self):
+        return FauxCurseur(self)
+
+
+class FauxCurseur:
+    def __init__(self, base):
+        self.base = base
+        self.lignes = []
+        self.with_rows = False
+        self.lastrowid = None
+
+    def execute(self, requete, parametres=()):
+        base = self.base
+        self.with_rows = requete.startswith("SELECT")
+        if requete.startswith("INSERT INTO products_version"):
+            instance, version = base.ligne_version or ("a1b2c3d4e5f6", 0)
+            base.ligne_version = (instance, version + 1)
+        elif requete.startswith("SELECT instance, version FROM products_version"):
+            self.lignes = [base.ligne_version] if base.ligne_version else []
+        elif requete.startswith("INSERT INTO products"):
+            self.lastrowid = base.prochain_id
+            base.prochain_id += 1
+            base.produits[self.lastrowid] = parametres
+        elif requete.startswith("SELECT id FROM products WHERE id IN"):
+            self.lignes = [(i,) for i in parametres if i in base.produits]
+        elif requete.startswith("DELETE FROM products WHERE id IN"):
+            for i in parametres:
+                base.produits.pop(i, None)
+        else:
+            raise AssertionError(requete)
+
+    def fetchall(self):
+        return self.lignes
+
+    def fetchone(self):
+        return self.lignes[0]
+
+    def close(self):
+        pass
+
+
+def test_version_commune_aux_processus():
+    base = FausseBase()
+    bureau, flask = MySQLProductStore(base), MySQLProductStore(base)
+    assert bureau.version == flask.version == 0
+
+    bureau.creer("Café", 4.5, 3)
+    assert bureau.version == 1
+    # L'autre processus voit la même version après rafraichir(), sans avoir écrit
+    flask.rafraichir()
+    assert (flask.instance, flask.version) == (bureau.instance, 1)
+
+    assert flask.supprimer_lot([1, 99]) == [True, False]
+    bureau.rafraichir()
+    assert bureau.version == flask.version == 2
+
+
+def test_suppression_sans_effet_garde_la_version():
+    base = FausseBase()
+    store = MySQLProductStore(base)
+    store.creer("Café", 4.5, 3)
+
+    assert not store.supprimer(42)
+    assert store.version == 1
+
+
+def test_stockage_configure(monkeypatch):
+    monkeypatch.delenv("STOCKAGE_PRODUITS", raising=False)
+    assert stockage_configure() == 'fichier'
+    monkeypatch.setenv("STOCKAGE_PRODUITS", 'mysql')
+    assert stockage_configure() == 'mysql'
+    monkeypatch.setenv("STOCKAGE_PRODUITS", 'csv')
+    with pytest.raises(ValueError):
+        stockage_configure()
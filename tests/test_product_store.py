@@ -0,0 +1,360 @@
+import json
+import os
+
+import pytest
+
+import product_store
+from product_store import ProductStore
+
+
+def produit(id_produit, nom="Produit", prix=1.0, quantite=1, categorie=""):
+    return {'id': id_produit, 'nom': nom, 'prix': prix, 'quantite': quantite,
+            'categorie': categorie, 'date_ajout': "2024-01-01 00:00:00"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProductStore(tmp_path / 'produits.log')
+    store.ajouter_lot([produit(1, "Café"), produit(2, "Thé")])
+    yield store
+    store.fermer()
+
+
+def temporaires(store):
+    return [f.name for f in store.chemin.parent.iterdir() if f.name.endswith('.tmp')]
+
+
+def test_remplacer(store):
+    store.remplacer([produit(7, "Sucre")])
+
+    assert store.tous() == [produit(7, "Sucre")]
+    assert store.allouer_id() == 8
+    assert temporaires(store) == []
+
+
+@pytest.mark.parametrize('invalide, erreur', [
+    ({'nom': "sans id"}, KeyError),
+    ({'id': 3, 'prix': "gratuit"}, ValueError),
+    ({'id': 3, 'nom': ["liste"]}, TypeError),
+])
+def test_remplacer_produit_invalide_garde_le_catalogue(store, invalide, erreur):
+    avant = store.tous()
+
+    with pytest.raises(erreur):
+        store.remplacer([produit(5), invalide])
+
+    assert store.tous() == avant
+    assert temporaires(store) == []
+    # Le journal est toujours ouvert en écriture
+    store.ajouter(produit(3, "Chocolat"))
+    assert store.get(3)['nom'] == "Chocolat"
+
+
+def test_remplacer_renommage_echoue_rouvre_l_ancien_journal(store, monkeypatch):
+    avant = store.tous()
+
+    def echec(source, destination):
+        raise OSError("disque plein")
+
+    monkeypatch.setattr(os, 'replace', echec)
+    with pytest.raises(OSError):
+        store.remplacer([produit(5)])
+    monkeypatch.undo()
+
+    assert store.tous() == avant
+    assert temporaires(store) == []
+    store.ajouter(produit(3, "Chocolat"))
+    store.synchroniser().result(timeout=5)
+
+    relu = ProductStore(store.chemin)
+    try:
+        assert [p['id'] for p in relu.tous()] == [1, 2, 3]
+    finally:
+        relu.fermer()
+
+
+@pytest.mark.parametrize('prix, quantite', [
+    (2.0, 10 ** 20),
+    (2.0, -2 ** 63 - 1),
+    (float('nan'), 1),
+    (float('inf'), 1),
+    ("nan", 1),
+])
+def test_creer_hors_limites_n_ecrit_rien(store, prix, quantite):
+    taille = store.chemin.stat().st_size
+
+    with pytest.raises(ValueError):
+        store.creer("Thé", prix, quantite, "x")
+
+    assert store.chemin.stat().st_size == taille
+    assert [p['id'] for p in store.tous()] == [1, 2]
+    assert store.creer("Thé", 2.0, 10, "x")['id'] == 3
+
+
+def test_lot_invalide_n_ecrit_rien(store):
+    taille = store.chemin.stat().st_size
+
+    with pytest.raises(ValueError):
+        store.ajouter_lot([produit(3), produit(2 ** 63)])
+    with pytest.raises(ValueError):
+        store.creer_lot([{'nom': "a", 'prix': 1, 'quantite': 1}, {'nom': "b", 'prix': 1, 'quantite': 2 ** 64}])
+    with pytest.raises(ValueError):
+        store.modifier_lot([{'id': 1, 'prix': 5.0}, {'id': 2, 'prix': float('nan')}])
+
+    assert store.chemin.stat().st_size == taille
+    assert store.get(1) == produit(1, "Café")
+
+
+def test_modifier_lot_meme_id_deux_fois(store):
+    resultats = store.modifier_lot([{'id': 1, 'prix': 5.0}, {'id': 1, 'quantite': 9}, {'id': 99, 'prix': 1.0}])
+
+    assert resultats[2] is None
+    assert store.get(1)['prix'] == 5.0 and store.get(1)['quantite'] == 9
+
+
+def test_journal_avec_enregistrement_hors_limites_se_rouvre(store, capsys):
+    # Journal écrit avant la validation: la relecture ignore l'enregistrement fautif
+    with open(store.chemin, 'ab') as f:
+        f.write(b'{"op": "+", "id": 3, "nom": "Th\\u00e9", "prix": 2.0, "quantite": 100000000000000000000}\n')
+        f.write(b'{"op": "+", "id": 2, "nom": "Th\\u00e9", "prix": NaN, "quantite": 1}\n')
+        f.write(b'{"op": "+", "id": 4, "nom": "Sel", "prix": 1.0, "quantite": 1}\n')
+
+    relu = ProductStore(store.chemin)
+    try:
+        assert [p['id'] for p in relu.tous()] == [1, 2, 4]
+        assert relu.get(2)['nom'] == "Thé" and relu.get(2)['prix'] == 1.0
+        assert relu.requeter(tri='prix')['total'] == 3
+    finally:
+        relu.fermer()
+    assert "Enregistrement ignoré" in capsys.readouterr().out
+
+
+def catalogue(nombre):
+    return [produit(i, f"Café {i % 11} crème", prix=float(i % 7), quantite=i % 5, categorie=f"rayon {i % 3}")
+            for i in range(1, nombre + 1)]
+
+
+def etat(store):
+    """Ce que les index donnent du catalogue: pages triées sur chaque champ et recherche"""
+    return (
+        store.tous(),
+        [store.requeter(0, 1000, None, tri)['produits'] for tri in ('id', 'categorie', 'prix', 'quantite')],
+        store.requeter(0, 1000, {'prix': (2.0, 5.0), 'categorie': ("rayon 1", "rayon 1")}, 'quantite'),
+        [store.rechercher(requete, 1000) for requete in ("cafe", "creme 3", "rayon", "sucre")],
+    )
+
+
+def relire(chemin, sans_instantane=False):
+    if sans_instantane:
+        chemin.with_name(chemin.name + '.bin').unlink(missing_ok=True)
+    store = ProductStore(chemin)
+    try:
+        return etat(store)
+    finally:
+        store.fermer()
+
+
+def test_instantane_ecrit_pour_un_petit_catalogue(tmp_path):
+    store = ProductStore(tmp_path / 'produits.log')
+    store.ajouter_lot(catalogue(20))
+    store.fermer()
+
+    assert store.chemin_instantane.exists()
+
+
+def test_instantane_puis_fin_du_journal(tmp_path, monkeypatch):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin)
+    store.ajouter_lot(catalogue(60))
+    store.fermer()
+
+    # Quelques écritures après l'instantané, trop peu pour le réécrire
+    store = ProductStore(chemin, seuil_instantane=10 ** 9)
+    store.modifier_lot([{'id': 4, 'prix': 0.5}, {'id': 9, 'categorie': "rayon 2", 'nom': "Sucre"}])
+    store.supprimer(17)
+    store.creer("Sucre roux", 3.0, 2, "rayon 1")
+    store.fermer()
+    date_instantane = store.chemin_instantane.stat().st_mtime_ns
+
+    remplacements = []
+    remplacer = product_store.SortedIndex.remplacer
+    monkeypatch.setattr(product_store.SortedIndex, 'remplacer',
+                        lambda index, ids, valeur: remplacements.append(set(ids)) or remplacer(index, ids, valeur))
+    depuis_instantane = relire(chemin)
+
+    # Les index de l'instantané ont servi, avec les produits retouchés replacés
+    assert remplacements and remplacements[0] == {4, 9, 17, 61}
+    assert store.chemin_instantane.stat().st_mtime_ns == date_instantane
+    assert depuis_instantane == relire(chemin, sans_instantane=True)
+
+
+@pytest.mark.parametrize('nombre', [5, 200])
+def test_instantane_d_un_journal_reecrit_en_place_ignore(tmp_path, nombre):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin)
+    store.ajouter_lot(catalogue(60))
+    store.fermer()
+    assert store.chemin_instantane.exists()
+
+    # Restauration par copie dans le même fichier: l'identité ne change pas
+    autre = ProductStore(tmp_path / 'autre.log')
+    autre.ajouter_lot([produit(i, "Sucre", prix=9.0) for i in range(1, nombre + 1)])
+    autre.fermer()
+    with open(chemin, 'r+b') as f:
+        f.write((tmp_path / 'autre.log').read_bytes())
+        f.truncate()
+
+    assert relire(chemin) == relire(chemin, sans_instantane=True)
+    assert relire(chemin)[0] == [produit(i, "Sucre", prix=9.0) for i in range(1, nombre + 1)]
+
+
+
+def test_iterer_apres_compactage_par_un_autre_processus(tmp_path):
+    chemin = tmp_path / 'produits.log'
+    lecteur = ProductStore(chemin)
+    lecteur.ajouter_lot(catalogue(30))
+    autre = ProductStore(chemin)
+    autre.supprimer_lot(range(1, 21))
+
+    # Le journal est remplacé entre le rattrapage et l'ouverture du parcours
+    rafraichir = lecteur._rafraichir
+    compactages = []
+
+    def rafraichir_puis_compacter():
+        rafraichir()
+        if not compactages:
+            compactages.append(autre.compacter())
+
+    lecteur._rafraichir = rafraichir_puis_compacter
+    try:
+        assert list(lecteur.iterer()) == catalogue(30)[20:]
+        assert compactages
+    finally:
+        autre.fermer()
+        lecteur.fermer()
+
+
+def lignes(chemin):
+    return chemin.read_bytes().splitlines(keepends=True)
+
+
+def test_journal_rejoue_a_l_ouverture(tmp_path):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin, seuil_compactage=10 ** 9)
+    crees = store.creer_lot([{'nom': f"Produit {i}", 'prix': i, 'quantite': i} for i in range(1, 6)])
+    store.modifier_lot([{'id': 2, 'prix': 20.0}])
+    store.supprimer(3)
+    attendus = store.tous()
+    store.fermer()
+
+    # Séquence des ids, puis cinq ajouts, une modification et une pierre tombale dans l'ordre des appels
+    assert [json.loads(ligne)['op'] for ligne in lignes(chemin)] == ['#'] + ['+'] * 6 + ['-']
+    assert [p['id'] for p in crees] == [1, 2, 3, 4, 5]
+    for sans_instantane in (False, True):
+        assert relire(chemin, sans_instantane)[0] == attendus
+    # Dans l'ordre du journal: le produit modifié est réécrit à la fin
+    assert [p['id'] for p in attendus] == [1, 4, 5, 2]
+    assert attendus[-1]['prix'] == 20.0
+
+
+def test_pierre_tombale_garde_la_sequence_des_ids(tmp_path):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin)
+    store.creer_lot([{'nom': "Café", 'prix': 1, 'quantite': 1}] * 3)
+    store.supprimer_lot([2, 3])
+    store.fermer()
+
+    store = ProductStore(chemin)
+    try:
+        # L'id 3 n'existe plus mais ne doit pas être réattribué, même après compactage
+        assert store.creer("Thé", 2, 2)['id'] == 4
+        store.supprimer(4)
+        store.compacter()
+        assert store.creer("Sucre", 3, 3)['id'] == 5
+    finally:
+        store.fermer()
+
+
+def test_compactage_ne_garde_que_les_vivants(tmp_path):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin, seuil_compactage=10 ** 9)
+    store.ajouter_lot(catalogue(20))
+    store.modifier_lot([{'id': i, 'quantite': 9} for i in range(1, 11)])
+    store.supprimer_lot(range(11, 16))
+    attendus = store.tous()
+
+    store.compacter()
+    try:
+        # L'enregistrement '#' garde le dernier id attribué, puis un ajout par produit vivant
+        assert [json.loads(ligne)['op'] for ligne in lignes(chemin)] == ['#'] + ['+'] * 15
+        assert store.tous() == attendus
+    finally:
+        store.fermer()
+    assert relire(chemin, sans_instantane=True)[0] == attendus
+
+
+def test_ligne_tronquee_par_un_arret_brutal(tmp_path):
+    chemin = tmp_path / 'produits.log'
+    store = ProductStore(chemin, seuil_compactage=10 ** 9)
+    store.ajouter_lot(catalogue(5))
+    store.fermer()
+    complet = chemin.read_bytes()
+    with open(chemin, 'ab') as f:
+        f.write(b'{"op": "+", "id": 6, "nom": "Interrom')
+
+    store = ProductStore(chemin, seuil_compactage=10 ** 9)
+    try:
+        assert store.tous() == catalogue(5)
+        # La première écriture coupe le reste avant d'écrire à la suite
+        assert store.creer("Thé", 2, 2)['id'] == 6
+        assert chemin.read_bytes().startswith(complet) and chemin.read_bytes().endswith(b'\n')
+        store.supprimer(6)
+    finally:
+        store.fermer()
+
+    with open(chemin, 'ab') as f:
+        f.write(b'{"op": "-", "i')
+    store = ProductStore(chemin, seuil_compactage=10 ** 9)
+    try:
+        store.compacter()
+        assert all(ligne.endswith(b'\n') for ligne in lignes(chemin))
+        assert store.tous() == catalogue(5)
+    finally:
+        store.fermer()
+    assert relire(chemin, sans_instantane=True)[0] == catalogue(5)
+
+
+def test_changements_depuis(tmp_path):
+    store = ProductStore(tmp_path / 'produits.log', taille_changements=4)
+    try:
+        store.ajouter_lot(catalogue(5))
+        depart = store.changements_depuis(None)
+        assert depart['complet'] and depart['produits'] == catalogue(5)
+
+        store.modifier_lot([{'id': 2, 'nom': "Sucre"}, {'id': 4, 'prix': 9.0}])
+        store.supprimer(3)
+        ecart = store.changements_depuis(depart['version'])
+        assert not ecart['complet']
+        assert [p['id'] for p in ecart['produits']] == [2, 4]
+        assert ecart['supprimes'] == [3]
+        assert store.changements_depuis(ecart['version'])['produits'] == []
+
+        # Plus de changements que taille_changements: la version de départ n'est plus couverte
+        store.modifier_lot([{'id': i, 'quantite': 0} for i in (1, 2, 4, 5)])
+        assert store.changements_depuis(depart['version'])['complet']
+        assert not store.changements_depuis(ecart['version'] + 1)['complet']
+        # Version inconnue, par exemple d'une autre instance: instantané complet
+        assert store.changements_depuis(store.version + 1)['complet']
+    finally:
+        store.fermer()
+
+
+def test_resultats_des_lots(store):
+    assert store.supprimer_lot([1, 99, 1]) == [True, False, False]
+    assert store.modifier_lot([{'id': 2, 'prix': 3.0}, {'id': 1, 'prix': 3.0}]) == [
+        produit(2, "Thé", prix=3.0), None
+    ]
+    assert store.ajouter_lot([produit(5), produit(6)]) == 2
+    crees = store.creer_lot([{'nom': "A", 'prix': 1, 'quantite': 1}, {'nom': "B", 'prix': 2, 'quantite': 2}])
+    assert [(p['id'], p['nom']) for p in crees] == [(7, "A"), (8, "B")]
+    assert store.creer_lot([]) == []
@@ -0,0 +1,18 @@
+import pytest
+
+from product_table import ProductTable
+
+
+def test_ajouter_hors_limites_laisse_la_table_intacte():
+    table = ProductTable([{'id': 1, 'nom': "Café", 'prix': 2.0, 'quantite': 1}])
+    table.retirer(1)
+    table.ajouter({'id': 2, 'nom': "Thé", 'prix': 3.0, 'quantite': 4})
+
+    with pytest.raises(OverflowError):
+        table.ajouter({'id': 2, 'nom': "Thé", 'prix': 9.0, 'quantite': 10 ** 20})
+    with pytest.raises(OverflowError):
+        table.ajouter({'id': 3, 'nom': "Sel", 'prix': 1.0, 'quantite': 10 ** 20})
+
+    assert table.en_dict(2)['prix'] == 3.0
+    assert 3 not in table
+    assert len(table) == 1
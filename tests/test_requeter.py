@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+import product_store
+from product_store import ProductStore
+
+
+CATEGORIES = ['café', 'thé', 'épicerie', 'boissons', '']
+
+
+def page_attendue(produits, offset, limit, filtres, tri, decroissant):
+    """Référence par force brute: filtrer tout le catalogue, trier par (valeur, id), découper"""
+    retenus = [
+        p for p in produits
+        if all((minimum is None or p[champ] >= minimum) and (maximum is None or p[champ] <= maximum)
+               for champ, (minimum, maximum) in filtres.items())
+    ]
+    retenus.sort(key=lambda p: (p[tri], p['id']), reverse=decroissant)
+    return len(retenus), [p['id'] for p in retenus[offset:offset + limit]]
+
+
+def filtres_aleatoires(alea):
+    filtres = {}
+    if alea.random() < 0.5:
+        categorie = alea.choice(CATEGORIES)
+        filtres['categorie'] = (categorie, categorie)
+    for champ, maximum in (('prix', 50), ('quantite', 20)):
+        if alea.random() < 0.6:
+            debut = alea.choice([None, alea.randint(0, maximum)])
+            fin = alea.choice([None, alea.randint(0, maximum)])
+            filtres[champ] = (debut, fin)
+    return filtres
+
+
+# 0: les filtres sont lus dans la table et les candidats triés; très grand: plages croisées
+# et index de tri parcouru; entre les deux, le choix dépend de la sélectivité
+@pytest.mark.parametrize('rapport', [0, product_store.RAPPORT_CROISEMENT, 10 ** 9])
+def test_requeter_identique_a_la_force_brute(tmp_path, monkeypatch, rapport):
+    monkeypatch.setattr(product_store, 'RAPPORT_CROISEMENT', rapport)
+    alea = random.Random(11)
+    store = ProductStore(tmp_path / 'produits.log')
+    try:
+        # Peu de valeurs distinctes: beaucoup d'égalités à départager par id
+        store.creer_lot([
+            {'nom': f"Produit {i}", 'prix': float(alea.randint(0, 50)),
+             'quantite': alea.randint(0, 20), 'categorie': alea.choice(CATEGORIES)}
+            for i in range(600)
+        ])
+        store.supprimer_lot(alea.sample(range(1, 601), 100))
+
+        for _ in range(300):
+            filtres = filtres_aleatoires(alea)
+            tri = alea.choice(['id', 'categorie', 'prix', 'quantite'])
+            decroissant = alea.random() < 0.5
+            offset, limit = alea.choice([0, 0, 7, 150]), alea.choice([1, 10, 50])
+
+            page = store.requeter(offset, limit, filtres, tri, decroissant)
+
+            total, ids = page_attendue(store.tous(), offset, limit, filtres, tri, decroissant)
+            assert page['total'] == total, (filtres, tri, decroissant)
+            assert [p['id'] for p in page['produits']] == ids, (filtres, tri, decroissant, offset, limit)
+    finally:
+        store.fermer()
+
+
+def test_requeter_champ_inconnu(tmp_path):
+    store = ProductStore(tmp_path / 'produits.log')
+    try:
+        with pytest.raises(ValueError):
+            store.requeter(tri='nom')
+        with pytest.raises(ValueError):
+            store.requeter(filtres={'nom': ('a', 'b')})
+    finally:
+        store.fermer()
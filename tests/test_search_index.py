@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+import search_index
+from search_index import SCORE_CATEGORIE, SCORE_NOM, SearchIndex, mots, normaliser
+
+
+def test_normaliser():
+    assert normaliser("Crème Brûlée") == "creme brulee"
+    assert normaliser("Œuf") == "oeuf"
+
+
+def test_nom_avant_categorie_meme_trouvee_plus_tot():
+    index = SearchIndex()
+    for id_produit in range(1, 50):
+        index.ajouter(id_produit, f"Produit {id_produit}", "café")
+    index.ajouter(50, "Café Arabica", "boisson")
+    index.ajouter(51, "Café moulu", "café")
+
+    assert index.rechercher("cafe", 5) == [50, 51, 1, 2, 3]
+
+
+def test_mot_entier_avant_debut_de_mot():
+    index = SearchIndex()
+    for id_produit in range(1, 30):
+        index.ajouter(id_produit, f"Cafetière {id_produit}", "")
+    index.ajouter(40, "Café", "")
+
+    resultats = index.rechercher("caf", 3)
+    assert len(resultats) == 3
+    assert index.rechercher("cafe", 1) == [40]
+
+
+def test_tous_les_termes_requis():
+    index = SearchIndex()
+    index.ajouter(1, "Café moulu", "")
+    index.ajouter(2, "Café en grains", "")
+    index.ajouter(3, "Sel moulu", "")
+
+    assert index.rechercher("moulu cafe") == [1]
+    assert index.rechercher("cafe poivre") == []
+
+
+def test_retirer():
+    index = SearchIndex()
+    index.ajouter(1, "Café", "")
+    index.ajouter(2, "Café", "")
+    index.rechercher("cafe")
+    index.retirer(1)
+
+    assert index.rechercher("cafe") == [2]
+    assert len(index) == 1
+
+
+def score_attendu(nom, categorie, termes):
+    """Référence directe du classement: meilleur poids de chaque terme, sommé"""
+    mots_nom, mots_categorie = set(mots(nom)), set(mots(categorie))
+    total = 0
+    for terme in termes:
+        poids = [0]
+        if terme in mots_nom:
+            poids.append(SCORE_NOM[0])
+        elif any(mot.startswith(terme) for mot in mots_nom):
+            poids.append(SCORE_NOM[1])
+        if terme in mots_categorie:
+            poids.append(SCORE_CATEGORIE[0])
+        elif any(mot.startswith(terme) for mot in mots_categorie):
+            poids.append(SCORE_CATEGORIE[1])
+        if max(poids) == 0:
+            return 0
+        total += max(poids)
+    return total
+
+
+# 0: aucun croisement préalable, les candidats du pilote sont tous parcourus
+@pytest.mark.parametrize('intersection_max', [search_index.INTERSECTION_MAX, 0])
+def test_classement_identique_a_la_force_brute(intersection_max, monkeypatch):
+    monkeypatch.setattr(search_index, 'INTERSECTION_MAX', intersection_max)
+    alea = random.Random(7)
+    syllabes = ['ca', 'fé', 'lait', 'thé', 'mou', 'lu', 'ara', 'bi', 'sucre', 'cho', 'co']
+    categories = ['café', 'thé', 'épicerie sucrée', 'lait', '', 'cacao']
+
+    def nom_aleatoire():
+        return ' '.join(
+            ''.join(alea.choice(syllabes) for _ in range(alea.randint(1, 2)))
+            for _ in range(alea.randint(0, 3))
+        )
+
+    index = SearchIndex()
+    produits = {}
+    for id_produit in range(1, 800):
+        produits[id_produit] = (nom_aleatoire(), alea.choice(categories))
+        index.ajouter(id_produit, *produits[id_produit])
+        if alea.random() < 0.1:
+            # Retrait avant le tri, pendant le chargement
+            retire = alea.choice(list(produits))
+            del produits[retire]
+            index.retirer(retire)
+    index.trier()
+
+    for _ in range(250):
+        # Modifications après le tri: les postings restent triés
+        for _ in range(5):
+            id_produit = alea.randint(1, 1000)
+            if id_produit in produits and alea.random() < 0.5:
+                del produits[id_produit]
+                index.retirer(id_produit)
+            else:
+                produits[id_produit] = (nom_aleatoire(), alea.choice(categories))
+                index.ajouter(id_produit, *produits[id_produit])
+        requete = ' '.join(alea.choice(syllabes)[:alea.randint(1, 4)] for _ in range(alea.randint(1, 3)))
+        termes = list(dict.fromkeys(mots(requete)))
+        limit = alea.choice([1, 5, 20])
+        attendu = sorted(
+            (-score, id_produit) for id_produit, (nom, categorie) in produits.items()
+            if (score := score_attendu(nom, categorie, termes))
+        )[:limit]
+        assert index.rechercher(requete, limit) == [id_produit for _, id_produit in attendu], requete
+    assert len(index) == len(produits)
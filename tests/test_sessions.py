@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import Error
+
+from sessions import SessionManager
+
+
+class BaseEnPanne:
+    @contextmanager
+    def connexion(self):
+        raise Error(msg="Can't connect to MySQL server", errno=2003)
+        yield
+
+
+def test_creer_sans_base_ne_rend_pas_de_jeton():
+    sessions = SessionManager(BaseEnPanne(), secret=b"tests")
+
+    with pytest.raises(Error):
+        sessions.creer(1, "admin")
+    assert len(sessions.cache) == 0
+
+
+def test_creer_puis_verifier_en_memoire():
+    sessions = SessionManager(secret=b"tests")
+    jeton = sessions.creer(1, "admin")
+
+    assert sessions.verifier(jeton)['username'] == "admin"
+    assert sessions.verifier(jeton[:-1]) is None
+    assert sessions.revoquer(jeton)
+    assert sessions.verifier(jeton) is None
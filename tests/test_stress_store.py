@@ -0,0 +1,13 @@
+import pytest
+
+pytest.importorskip('flask')
+
+import stress_store
+
+
+def test_charge_multiprocessus(tmp_path):
+    # Version bornée de stress_store.py: un processus par entrée, assez
+    # d'opérations pour dépasser le seuil de compactage de la charge bureau
+    resume, erreurs = stress_store.charger(tmp_path, 1, 300)
+
+    assert erreurs == [], resume
@@ -0,0 +1,62 @@
+import os
+
+from template_cache import INJECTED_JS, MESSAGE_DIV, TemplateCache
+
+
+def ecrire(chemin, texte, mtime_ns):
+    chemin.write_text(texte, encoding='utf-8')
+    # Dates fixées: deux écritures rapprochées peuvent tomber dans le même tick du système de fichiers
+    os.utime(chemin, ns=(mtime_ns, mtime_ns))
+
+
+def test_compilation(tmp_path):
+    ecrire(tmp_path / 'login.html', "<head><!-- INJECT_CSS --></head><body><main>Connexion</main></body>", 1)
+    ecrire(tmp_path / 'nu.html', "<p>Sans body</p>", 1)
+    ecrire(tmp_path / 'style.css', "body { color: red; }", 1)
+    cache = TemplateCache(tmp_path)
+
+    page = cache.get('login')
+    assert "<style>\nbody { color: red; }\n</style>" in page
+    assert MESSAGE_DIV + "<main>" in page
+    assert page.endswith(f"{INJECTED_JS}\n</body>")
+    assert cache.get('nu') == "<p>Sans body</p>" + INJECTED_JS
+
+
+def test_compilee_une_seule_fois(tmp_path, monkeypatch):
+    ecrire(tmp_path / 'login.html', "<body>v1</body>", 1)
+    cache = TemplateCache(tmp_path)
+    compilations = []
+    compiler = cache.compiler
+    monkeypatch.setattr(cache, 'compiler', lambda nom: compilations.append(nom) or compiler(nom))
+
+    premiere = cache.get('login')
+    # Sans verifier_mtime, une modification sur disque n'est vue qu'après invalider()
+    ecrire(tmp_path / 'login.html', "<body>v2</body>", 2)
+    assert cache.get('login') is premiere
+    assert compilations == ['login']
+
+    cache.invalider('login')
+    assert 'login' not in cache
+    assert "v2" in cache.get('login')
+
+
+def test_verifier_mtime_recompile_apres_modification(tmp_path):
+    ecrire(tmp_path / 'login.html', "<body>v1</body>", 1)
+    cache = TemplateCache(tmp_path, verifier_mtime=True)
+    assert "v1" in cache.get('login')
+
+    ecrire(tmp_path / 'login.html', "<body>v2</body>", 2)
+    assert "v2" in cache.get('login')
+    # Le CSS compte aussi, y compris quand il apparaît
+    ecrire(tmp_path / 'style.css', "p {}", 3)
+    ecrire(tmp_path / 'login.html', "<!-- INJECT_CSS --><body>v2</body>", 2)
+    assert "p {}" in cache.get('login')
+
+
+def test_prechauffer_ignore_les_pages_absentes(tmp_path):
+    ecrire(tmp_path / 'dashboard.html', "<body></body>", 1)
+    cache = TemplateCache(tmp_path)
+
+    cache.prechauffer(['dashboard', 'absente'])
+
+    assert 'dashboard' in cache and 'absente' not in cache